@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict, deque
+
+import aiohttp
+
+from extraction import DEFAULT_NOT_FOUND_TEXT, CnsNaoCadastradoError
+from http_engine import (
+    URL_ALVO,
+    USER_AGENT,
+    HttpEngineError,
+    build_postback,
+    extract_panel_html,
+    parse_form_state,
+    parse_panel,
+)
+from job_queue import claim_batch, mark_not_found, record_failure, release_claims
+from log_setup import fields
+from metrics import METRICS
+from rate_limit import AdaptiveTokenBucket
+from retry_scheduler import CircuitBreaker, RetryScheduler, classify_failure
+from write_buffer import WriteBehindBuffer
+
+# --- Configurações ---
+DEFAULT_CONCURRENCY = 200
+REQUEST_TIMEOUT = 15  # segundos
+INITIAL_RATE = 2.0  # req/s; o token bucket ajusta a partir daqui
+MAX_RATE = 20.0
+
+
+class AsyncHttpEngine:
+    """
+    Versão asyncio do HttpEngine: um único `aiohttp.ClientSession` com
+    keep-alive atende todas as consultas em andamento.
+
+    O VIEWSTATE é compartilhado entre as consultas; quando ele expira, apenas
+    uma corrotina recarrega a página enquanto as demais aguardam.
+    """
+
+    def __init__(self, url=URL_ALVO, concurrency=DEFAULT_CONCURRENCY):
+        self.url = url
+        self._connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(
+            connector=self._connector,
+            headers={"User-Agent": USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+        )
+        self._hidden_fields = {}
+        self._script_manager = None
+        self._update_panel = None
+        self._form_lock = asyncio.Lock()
+
+    async def _ensure_form(self):
+        async with self._form_lock:
+            if self._hidden_fields:
+                return
+            logging.info("HTTP async: carregando a página para obter o VIEWSTATE.")
+            try:
+                async with self.session.get(self.url) as response:
+                    response.raise_for_status()
+                    html = await response.text()
+            except aiohttp.ClientError as e:
+                raise HttpEngineError(f"Falha ao carregar a página: {e}") from e
+            self._hidden_fields, self._script_manager, self._update_panel = (
+                parse_form_state(html)
+            )
+
+    async def fetch_panel_html(self, cns):
+        """Consulta um CNS e retorna o HTML do painel de resultados."""
+        await self._ensure_form()
+        form, headers = build_postback(
+            self.url, self._hidden_fields, self._script_manager, self._update_panel, cns
+        )
+        try:
+            async with self.session.post(
+                self.url, data=form, headers=headers
+            ) as response:
+                response.raise_for_status()
+                text = await response.text()
+        except aiohttp.ClientError as e:
+            raise HttpEngineError(f"Falha no postback: {e}") from e
+        return extract_panel_html(text, cns, self._hidden_fields)
+
+    async def scrape(self, cns):
+        """Retorna o mesmo dicionário `data` que `scrape_cns_data`."""
+        return parse_panel(await self.fetch_panel_html(cns))
+
+    async def close(self):
+        await self.session.close()
+
+
+async def fetch_data(engine, bucket, cache, cns, breaker=None):
+    """
+    Retorna (data, consultou_o_site) do CNS, lendo do cache quando possível.
+
+    Sem uma entrada válida no cache, consulta o site (respeitando o circuit
+    breaker e o token bucket) e guarda o HTML bruto do painel para
+    reprocessamentos futuros.
+    """
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, cns)
+        if cached is not None:
+            logging.info(
+                f"CNS {cns}: HTML encontrado no cache, sem consulta ao site.",
+                extra=fields(cns, "cache"),
+            )
+            METRICS.inc("cache_hits")
+            with METRICS.timer("extract"):
+                return parse_panel(cached), False
+    if breaker is not None:
+        await breaker.wait_async()
+    await bucket.acquire()
+    with METRICS.timer("scrape"):
+        with METRICS.timer("http_request"):
+            html = await engine.fetch_panel_html(cns)
+        with METRICS.timer("extract"):
+            data = parse_panel(html)
+    # Só guarda painéis completos, para não fixar no cache uma página truncada.
+    nome = data.get("NomeCartorio")
+    if cache is not None and nome and nome != DEFAULT_NOT_FOUND_TEXT:
+        await asyncio.to_thread(cache.put, cns, html)
+    return data, True
+
+
+async def process_cns(
+    engine, bucket, writer, cns, max_retries, cache, retries, retry_counts, breaker
+):
+    """
+    Faz uma tentativa para um CNS, com as mesmas regras do loop síncrono: até
+    `max_retries` tentativas e nenhuma nova tentativa para "CNS não cadastrado".
+
+    Uma falha não ocupa a vaga de concorrência esperando: o CNS vai para o
+    `retries` (RetryScheduler) com backoff por categoria e o loop principal o
+    relança quando a espera vence. Timeouts também desaceleram o token bucket,
+    e o `breaker` (CircuitBreaker) pausa tudo se o site inteiro cair.
+    """
+    attempt = retry_counts[cns] + 1
+    started = time.perf_counter()
+    logging.info(
+        f"--- Processando CNS {cns} (Tentativa {attempt}) ---",
+        extra=fields(cns, "start", attempt),
+    )
+    network = True
+    try:
+        data, network = await fetch_data(engine, bucket, cache, cns, breaker)
+    except CnsNaoCadastradoError:
+        logging.warning(
+            f"CNS {cns}: O site informou 'CNS não cadastrado'. Pulando.",
+            extra=fields(cns, "not_found", attempt, time.perf_counter() - started),
+        )
+        METRICS.inc("not_found")
+        breaker.record_success()
+        await asyncio.to_thread(mark_not_found, cns)
+        return
+    except asyncio.TimeoutError as e:
+        bucket.on_timeout()
+        error = e
+        message = f"Timeout na consulta. Taxa reduzida para {bucket.rate:.2f} req/s."
+    except HttpEngineError as e:
+        error = e
+        message = f"Falha no processamento. Causa: {e}"
+    except Exception as e:
+        # Qualquer outro erro também passa pela fila de novas tentativas, em
+        # vez de matar a tarefa e deixar o CNS PENDENTE sem tentativa registrada.
+        error = e
+        message = f"Erro crítico. Causa: {e!r}"
+    else:
+        if network:
+            bucket.on_success()
+            breaker.record_success()
+        nome = data.get("NomeCartorio")
+        if nome and nome != DEFAULT_NOT_FOUND_TEXT:
+            # Não bloqueia o loop: o buffer grava em lote numa thread própria.
+            writer.add(cns, data)
+            METRICS.inc("scraped")
+            elapsed = time.perf_counter() - started
+            logging.info(
+                f"CNS {cns}: Dados extraídos em {elapsed:.2f}s.",
+                extra=fields(cns, "done", attempt, elapsed),
+            )
+            return
+        error = ValueError("Extração falhou, Nome do Cartório não encontrado.")
+        message = str(error)
+
+    category = classify_failure(error)
+    elapsed = time.perf_counter() - started
+    logging.error(f"CNS {cns}: {message}")
+    METRICS.inc("retries")
+    METRICS.inc(f"failure_{category}")
+    if network:
+        breaker.record_failure(category)
+    db_attempts = await asyncio.to_thread(
+        record_failure, cns, f"[{category}] {message}", max_retries
+    )
+    retry_counts[cns] = (
+        db_attempts if db_attempts is not None else retry_counts[cns] + 1
+    )
+    if retry_counts[cns] >= max_retries:
+        logging.critical(
+            f"CNS {cns}: Excedeu o limite de {max_retries} tentativas. Pulando permanentemente.",
+            extra=fields(cns, "gave_up", retry_counts[cns], elapsed, category),
+        )
+        return
+    delay = retries.schedule(cns, category, retry_counts[cns])
+    logging.info(
+        f"CNS {cns}: Falha '{category}'. Nova tentativa em {delay:.1f}s.",
+        extra=fields(cns, "retry", retry_counts[cns], elapsed, category),
+    )
+
+
+def log_task_error(task):
+    """Done-callback: registra a exceção de uma tarefa que escapou de process_cns."""
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logging.critical(
+            f"Tarefa de scraping terminou com erro não tratado: {error!r}",
+            exc_info=error,
+        )
+
+
+async def run_async_engine(
+    url=URL_ALVO,
+    concurrency=DEFAULT_CONCURRENCY,
+    max_retries=3,
+    initial_rate=INITIAL_RATE,
+    max_rate=MAX_RATE,
+    cache=None,
+    journal=None,
+    retry_scale=1.0,
+    refresh=False,
+):
+    """
+    Loop assíncrono equivalente ao `main_scraper.main()`.
+
+    Reivindica lotes no banco (mesmo mecanismo do worker pool) e mantém até
+    `concurrency` CNS em andamento, limitados por um semáforo. CNS cuja nova
+    tentativa já venceu têm prioridade sobre os recém-reivindicados. Com um
+    `cache` (HtmlCache), CNS com HTML recente não geram consulta ao site.
+    Com um `journal` (CheckpointJournal), os resultados sobrevivem a uma
+    queda do banco sem novo scraping. Com `refresh`, reconsulta as linhas
+    concluídas cuja data de reconsulta venceu.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    engine = AsyncHttpEngine(url=url, concurrency=concurrency)
+    bucket = AdaptiveTokenBucket(initial_rate, max_rate=max_rate)
+    writer = WriteBehindBuffer(journal=journal)
+    retries = RetryScheduler(retry_scale)
+    retry_counts = defaultdict(int)
+    breaker = CircuitBreaker()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+    backlog = deque()
+    queue_empty = False
+    logging.info(
+        f"Iniciando execução async {run_id} (concorrência={concurrency}, "
+        f"taxa inicial={initial_rate} req/s, teto={max_rate} req/s)."
+    )
+
+    try:
+        while True:
+            cns = retries.pop_due()
+            if cns is None and not backlog and not queue_empty:
+                backlog.extend(
+                    await asyncio.to_thread(
+                        claim_batch, run_id, "async", concurrency, refresh
+                    )
+                )
+                queue_empty = not backlog
+            if cns is None and backlog:
+                cns = backlog.popleft()
+            if cns is None:
+                if not tasks and not len(retries):
+                    break
+                # Só restam tarefas em andamento e novas tentativas agendadas.
+                await asyncio.sleep(min(retries.next_due_in() or 0.1, 0.1))
+                continue
+            await semaphore.acquire()
+            task = asyncio.create_task(
+                process_cns(
+                    engine,
+                    bucket,
+                    writer,
+                    cns,
+                    max_retries,
+                    cache,
+                    retries,
+                    retry_counts,
+                    breaker,
+                )
+            )
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(log_task_error)
+            task.add_done_callback(lambda _: semaphore.release())
+    finally:
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await engine.close()
+        await asyncio.to_thread(writer.close)
+        await asyncio.to_thread(release_claims, run_id)
+    logging.info("--- FIM DO PROCESSAMENTO ---")
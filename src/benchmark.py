@@ -0,0 +1,188 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# O benchmark roda sobre o backend SQLite em memória, sem o SQL Server.
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.makedirs("logs", exist_ok=True)  # Resultados vão para logs/benchmark.json
+
+import main_scraper  # noqa: E402
+from metrics import METRICS  # noqa: E402
+from storage import STATUS_CONCLUIDO, STATUS_NAO_ENCONTRADO, use_storage  # noqa: E402
+from storage_embedded import SqliteStorage  # noqa: E402
+from stub_server import PAGE_PATH  # noqa: E402
+
+# --- Configurações ---
+STUB_PORT = 8799
+DEFAULT_RECORDS = 500
+DEFAULT_SCENARIOS = ["http:4", "http:16", "async:50", "async:200"]
+BENCH_RATE = 10_000.0  # req/s: o benchmark mede a capacidade, não a polidez
+BENCH_RETRY_SCALE = 0.01
+FIRST_CNS = 100_000
+RESULTS_FILE = "logs/benchmark.json"
+
+
+def fresh_storage(records):
+    """Cria um SQLite em memória com `records` CNS pendentes e o instala."""
+    storage = SqliteStorage(":memory:")
+    storage.create_schema()
+    storage.insert_new_cns(str(FIRST_CNS + n) for n in range(records))
+    use_storage(storage)
+    return storage
+
+
+def start_stub(port, latency_ms, jitter_ms, error_rate, not_found_rate):
+    """Sobe o stub_server.py em um processo separado e espera a porta abrir."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_server.py")
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            script,
+            "--port",
+            str(port),
+            "--latency-ms",
+            str(latency_ms),
+            "--jitter-ms",
+            str(jitter_ms),
+            "--error-rate",
+            str(error_rate),
+            "--not-found-rate",
+            str(not_found_rate),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"O stub não abriu a porta {port}.")
+
+
+def run_scenario(scenario, records, url):
+    """
+    Executa `main_scraper` de ponta a ponta em um cenário 'motor:paralelismo'.
+
+    O paralelismo é o número de workers para 'selenium'/'http' e a
+    concorrência para 'async'.
+    """
+    engine, _, parallelism = scenario.partition(":")
+    parallelism = int(parallelism or 1)
+    argv = [
+        "--engine",
+        engine,
+        "--rate",
+        str(BENCH_RATE),
+        "--url",
+        url,
+        "--no-cache",
+        "--metrics-port",
+        "0",
+        # Novas tentativas voltam em milissegundos, não em segundos.
+        "--retry-backoff-scale",
+        str(BENCH_RETRY_SCALE),
+    ]
+    if engine == "async":
+        argv += ["--concurrency", str(parallelism)]
+    else:
+        argv += ["--workers", str(parallelism)]
+    args = main_scraper.parse_args(argv)
+
+    storage = fresh_storage(records)
+    METRICS.reset()
+    start = time.perf_counter()
+    main_scraper.run_scraper(args, cache=None)
+    elapsed = time.perf_counter() - start
+
+    counts = storage.status_counts()
+    storage.close()
+    done = counts.get(STATUS_CONCLUIDO, 0) + counts.get(STATUS_NAO_ENCONTRADO, 0)
+    summary = METRICS.summary()
+    scrape = summary["stages"].get("scrape", {})
+    return {
+        "scenario": scenario,
+        "records": done,
+        "seconds": elapsed,
+        "records_per_second": done / elapsed if elapsed else 0.0,
+        "p50_ms": (scrape.get("p50") or 0) * 1000,
+        "p95_ms": (scrape.get("p95") or 0) * 1000,
+        "p99_ms": (scrape.get("p99") or 0) * 1000,
+        "status": counts,
+        "counters": summary["counters"],
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark offline do scraper contra o stub local do site."
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        default=DEFAULT_SCENARIOS,
+        help="Cenários 'motor:paralelismo', ex.: http:4 async:200 selenium:2.",
+    )
+    parser.add_argument("--records", type=int, default=DEFAULT_RECORDS)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--not-found-rate", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=STUB_PORT)
+    parser.add_argument(
+        "--output", default=RESULTS_FILE, help="Arquivo JSON com os resultados."
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Os logs por CNS distorceriam a medição; só os erros aparecem.
+    logging.getLogger().setLevel(logging.ERROR)
+
+    stub = start_stub(
+        args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.not_found_rate
+    )
+    url = f"http://127.0.0.1:{args.port}{PAGE_PATH}"
+    print(
+        f"Stub: latência {args.latency_ms}±{args.jitter_ms}ms, "
+        f"erros {args.error_rate:.0%}, não encontrados {args.not_found_rate:.0%}. "
+        f"{args.records} CNS por cenário."
+    )
+
+    results = []
+    try:
+        for scenario in args.scenarios:
+            print(f"Executando o cenário {scenario}...")
+            results.append(run_scenario(scenario, args.records, url))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print()
+    print(
+        f"{'cenário':<14}{'registros':>10}{'tempo (s)':>11}{'reg/s':>9}"
+        f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'retries':>9}"
+    )
+    for r in results:
+        print(
+            f"{r['scenario']:<14}{r['records']:>10}{r['seconds']:>11.1f}"
+            f"{r['records_per_second']:>9.1f}{r['p50_ms']:>10.1f}"
+            f"{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+            f"{r['counters'].get('retries', 0):>9}"
+        )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados salvos em '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# --- Configurações ---
+PROFILES = ("default", "lean")
+# O navegador original continua sendo o padrão; o 'lean' é opcional
+# (--browser-profile lean), já que depende da página funcionar sem interface,
+# sem imagens e com recursos de terceiros bloqueados.
+DEFAULT_PROFILE = "default"
+LEAN_WINDOW_SIZE = "1280,800"
+
+# Recursos que a extração nunca usa. Bloqueados via CDP
+# (Network.setBlockedURLs), antes mesmo de a requisição sair do navegador.
+BLOCKED_URL_PATTERNS = [
+    # Imagens, fontes e mídia
+    "*.png*",
+    "*.jpg*",
+    "*.jpeg*",
+    "*.gif*",
+    "*.svg*",
+    "*.ico*",
+    "*.webp*",
+    "*.woff*",
+    "*.ttf*",
+    "*.otf*",
+    "*.eot*",
+    "*.mp4*",
+    # Scripts e pixels de terceiros
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*facebook.net*",
+    "*facebook.com/tr*",
+    "*hotjar.com*",
+    "*clarity.ms*",
+    "*fonts.googleapis.com*",
+    "*fonts.gstatic.com*",
+]
+# O CSS fica fora da lista padrão: as esperas usam a visibilidade do painel,
+# que depende das regras de estilo da página.
+CSS_URL_PATTERNS = ["*.css", "*.css?*"]
+
+
+def build_chrome_options(profile=DEFAULT_PROFILE):
+    """
+    Monta as opções do Chrome para o perfil escolhido.
+
+    'default' reproduz o navegador original (janela maximizada, tudo
+    carregado). 'lean' roda sem interface, sem imagens, com janela menor e
+    estratégia de carregamento 'eager', que libera o `driver.get` assim que
+    o DOM está pronto, sem esperar imagens e iframes.
+    """
+    from selenium import webdriver  # Só quem abre um navegador precisa do Selenium
+
+    options = webdriver.ChromeOptions()
+    if profile == "default":
+        options.add_argument("--start-maximized")
+        return options
+
+    options.add_argument("--headless=new")
+    options.add_argument(f"--window-size={LEAN_WINDOW_SIZE}")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--mute-audio")
+    options.add_experimental_option(
+        "prefs", {"profile.managed_default_content_settings.images": 2}
+    )
+    options.page_load_strategy = "eager"
+    return options
+
+
+def blocked_url_patterns(profile=DEFAULT_PROFILE, block_css=False):
+    """Padrões de URL a bloquear no perfil; o perfil 'default' não bloqueia nada."""
+    if profile == "default":
+        return []
+    return BLOCKED_URL_PATTERNS + (CSS_URL_PATTERNS if block_css else [])
+
+
+def make_request_blocker(patterns):
+    """
+    Retorna uma função que ativa o bloqueio de `patterns` em um driver recém
+    criado, ou None se não houver nada a bloquear.
+    """
+    if not patterns:
+        return None
+
+    def setup(driver):
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+    return setup
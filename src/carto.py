@@ -0,0 +1,133 @@
+import argparse
+import json
+import sys
+import time
+
+# Ponto de entrada único do projeto. Cada subcomando importa o seu módulo só
+# quando é chamado: `status` não carrega Selenium, pandas nem aiohttp.
+
+COMMANDS = {
+    "create": "Cria a tabela 'cartorios_enriquecidos' (idempotente).",
+    "populate": "Popula a fila de CNS a partir de um Excel ou CSV.",
+    "scrape": "Executa o robô de scraping.",
+    "normalize": "Normaliza CEP, telefone, UF e atribuições em lote.",
+    "export": "Exporta a tabela para Excel, CSV ou Parquet.",
+    "replay": "Regrava no banco os resultados pendentes do journal local.",
+    "status": "Mostra quantos CNS há em cada status da fila.",
+    "lookup": "Sobe o serviço HTTP local de consulta (índice em memória).",
+    "report": "Resume falhas e latências por execução a partir do log JSON.",
+}
+
+
+def cmd_create(argv):
+    from create_table import create_cartorios_table
+
+    create_cartorios_table()
+
+
+def cmd_populate(argv):
+    import populate_cns
+
+    populate_cns.main(argv)
+
+
+def cmd_scrape(argv):
+    import main_scraper
+
+    main_scraper.main(argv)
+
+
+def cmd_normalize(argv):
+    import normalize
+
+    normalize.main(argv)
+
+
+def cmd_export(argv):
+    import export_to_excel
+
+    export_to_excel.main(argv)
+
+
+def cmd_replay(argv):
+    import journal
+
+    journal.main(argv)
+
+
+def cmd_lookup(argv):
+    import lookup_service
+
+    lookup_service.main(argv)
+
+
+def cmd_report(argv):
+    import log_report
+
+    log_report.main(argv)
+
+
+def cmd_status(argv):
+    parser = argparse.ArgumentParser(
+        prog="carto status", description=COMMANDS["status"]
+    )
+    parser.add_argument("--json", action="store_true", help="Saída em JSON.")
+    args = parser.parse_args(argv)
+
+    from storage import STATUS_PENDENTE, StorageUnavailableError, get_storage
+
+    start = time.perf_counter()
+    storage = get_storage()
+    try:
+        counts = storage.status_counts()
+    except StorageUnavailableError as e:
+        print(f"ERRO: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+
+    if args.json:
+        print(json.dumps({"backend": storage.name, "total": total, "status": counts}))
+        return
+
+    print(f"Backend: {storage.name}")
+    for status, count in sorted(counts.items()):
+        share = count / total if total else 0
+        print(f"  {status:<16}{count:>10}  {share:6.1%}")
+    print(f"  {'TOTAL':<16}{total:>10}")
+    if total and not counts.get(STATUS_PENDENTE):
+        print("Nenhum CNS pendente.")
+    print(f"Consulta em {elapsed * 1000:.0f} ms.")
+
+
+HANDLERS = {
+    "create": cmd_create,
+    "populate": cmd_populate,
+    "scrape": cmd_scrape,
+    "normalize": cmd_normalize,
+    "export": cmd_export,
+    "replay": cmd_replay,
+    "status": cmd_status,
+    "lookup": cmd_lookup,
+    "report": cmd_report,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="carto",
+        description="Enriquecimento de cartórios: criação da fila, scraping e "
+        "exportação. Use 'carto <comando> --help' para as opções de cada um.",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="comando")
+    subparsers.required = True
+    for name, help_text in COMMANDS.items():
+        # As opções de cada comando são tratadas pelo próprio módulo.
+        subparsers.add_parser(name, help=help_text, add_help=False)
+
+    args, rest = parser.parse_known_args(argv)
+    HANDLERS[args.command](rest)
+
+
+if __name__ == "__main__":
+    main()
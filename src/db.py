@@ -1,13 +1,42 @@
-import pyodbc
-from settings import CONN_STRING  # Importa a string de conexão
+import threading
+from contextlib import contextmanager
+
+from settings import get_conn_string  # Monta a string de conexão sob demanda
+from storage import StorageUnavailableError
+
+# --- Configurações ---
+POOL_SIZE = 5  # Máximo de conexões abertas pelo pool ao mesmo tempo
+
+
+def load_pyodbc():
+    """
+    Importa o pyodbc sob demanda.
+
+    Só o backend SQL Server precisa dele: o `carto status` e os backends
+    SQLite/DuckDB funcionam em máquinas sem o driver ODBC. Levanta
+    StorageUnavailableError se o pyodbc (ou a biblioteca ODBC) não estiver
+    instalado.
+    """
+    try:
+        import pyodbc
+    except ImportError as e:
+        raise StorageUnavailableError(
+            f"pyodbc indisponível ({e}). Instale o pyodbc e o driver ODBC do "
+            f"SQL Server, ou use STORAGE_BACKEND=sqlite/duckdb."
+        ) from e
+    return pyodbc
 
 
 def get_db_connection():
     """
     Cria e retorna uma conexão com o banco de dados SQL Server.
+
+    Retorna None se a conexão falhar; levanta StorageUnavailableError se o
+    pyodbc não estiver instalado.
     """
+    pyodbc = load_pyodbc()
     try:
-        conn = pyodbc.connect(CONN_STRING)
+        conn = pyodbc.connect(get_conn_string())
         return conn
     except Exception as e:
         print(f"Erro CRÍTICO ao conectar no SQL Server: {e}")
@@ -17,12 +46,117 @@ def get_db_connection():
         return None
 
 
+class ConnectionPool:
+    """
+    Pool pequeno e thread-safe de conexões pyodbc reutilizáveis.
+
+    Evita pagar o handshake com o SQL Server a cada operação. Conexões que
+    falharam durante o uso devem ser devolvidas com `discard=True`, para que
+    o pool abra uma nova na próxima vez. Quem espera por uma conexão é
+    acordado tanto por uma devolução quanto por um descarte: no segundo caso
+    ele mesmo abre a conexão que substitui a descartada.
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._idle = []  # LIFO: a conexão usada por último é a mais quente
+        self._opened = 0
+        self._available = threading.Condition()
+
+    def acquire(self):
+        """
+        Retorna uma conexão ociosa, abre uma nova ou aguarda uma vaga.
+
+        Levanta StorageUnavailableError se não conseguir abrir a conexão.
+        """
+        with self._available:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._opened < self.size:
+                    self._opened += 1
+                    break
+                self._available.wait()
+        try:
+            return load_pyodbc().connect(get_conn_string())
+        except StorageUnavailableError:
+            self._free_slot()
+            raise
+        except Exception as e:
+            # DB_* ausentes (ValueError) ou servidor fora (pyodbc.Error): para
+            # quem chama, os dois são o mesmo "banco indisponível".
+            self._free_slot()
+            raise StorageUnavailableError(
+                f"Não foi possível conectar ao SQL Server: {e}"
+            ) from e
+
+    def _free_slot(self):
+        with self._available:
+            self._opened -= 1
+            self._available.notify()
+
+    def release(self, conn, discard=False):
+        if discard:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._free_slot()
+            return
+        with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Empresta uma conexão durante o bloco `with`.
+
+        Em caso de exceção a transação é desfeita e a conexão descartada.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self.release(conn, discard=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Retorna o pool de conexões compartilhado pelo processo."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
 # --- Bloco de Teste ---
 # Este código só roda quando você executa `python src/db.py` diretamente
 if __name__ == "__main__":
     print("Testando conexão com o SQL Server...")
 
-    conn = get_db_connection()
+    try:
+        conn = get_db_connection()
+    except StorageUnavailableError as e:
+        print(f"Erro CRÍTICO: {e}")
+        conn = None
 
     if conn:
         try:
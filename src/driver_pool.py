@@ -0,0 +1,199 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium import webdriver
+from selenium.common.exceptions import NoAlertPresentException, WebDriverException
+from form_session import CNS_INPUT_ID
+from http_engine import URL_ALVO
+from metrics import METRICS
+from waits import AdaptiveTimeout, wait_for_element
+
+# --- Configurações ---
+DRIVER_SPARES = 1  # Navegadores aquecidos mantidos de reserva
+DRIVER_MAX_PAGES = 200  # Recicla o navegador depois de tantas páginas
+WARMUP_WAIT_SECONDS = 30  # Espera por um navegador em aquecimento antes de criar outro
+RECOVERY_TIMEOUT = 5  # segundos para a página de consulta voltar após um erro
+RECOVERY_WAIT = AdaptiveTimeout(
+    initial=RECOVERY_TIMEOUT, floor=2, ceiling=RECOVERY_TIMEOUT * 2
+)
+
+
+class DriverPool:
+    """
+    Pool de navegadores Chrome pré-aquecidos, compartilhado entre os workers.
+
+    Os navegadores são criados em segundo plano e já abrem a página de
+    consulta, de modo que `acquire()` normalmente devolve um driver pronto
+    na hora. Depois de um erro, `recover()` tenta primeiro reaproveitar a
+    sessão (fecha alertas e recarrega o formulário); só se isso falhar o
+    driver é descartado, fechado em segundo plano e substituído por um da
+    reserva. Cada driver é reciclado após `max_pages` páginas, para conter
+    o crescimento de memória do Chrome. Se informado, `setup(driver)` é
+    chamado em cada navegador criado (por exemplo, para bloquear recursos).
+
+    Com `reuse_form`, quem consulta pelo navegador reaproveita a página já
+    carregada entre um CNS e outro, em vez de recarregá-la (form_session.py).
+    """
+
+    def __init__(
+        self,
+        options,
+        url=URL_ALVO,
+        spares=DRIVER_SPARES,
+        max_pages=DRIVER_MAX_PAGES,
+        prewarm=None,
+        setup=None,
+        reuse_form=False,
+    ):
+        self.options = options
+        self.setup = setup
+        self.reuse_form = reuse_form
+        self.url = url
+        self.spares = spares
+        self.max_pages = max_pages
+        self._idle = queue.Queue()
+        self._pages = {}
+        self._warming = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="driver-pool"
+        )
+        for _ in range(spares if prewarm is None else prewarm):
+            self._schedule_warmup()
+
+    def _create(self):
+        driver = webdriver.Chrome(options=self.options)
+        if self.setup:
+            self.setup(driver)
+        # Abre a página uma vez para aquecer DNS, TLS e o cache do navegador.
+        driver.get(self.url)
+        return driver
+
+    def _schedule_warmup(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._warming += 1
+        self._executor.submit(self._warmup)
+
+    def _warmup(self):
+        try:
+            driver = self._create()
+        except WebDriverException as e:
+            logging.warning(f"Falha ao aquecer um navegador de reserva: {e.msg}")
+            driver = None
+        with self._lock:
+            self._warming -= 1
+            closed = self._closed
+            if driver is not None and not closed:
+                self._idle.put(driver)
+        if driver is not None and closed:
+            self._quit(driver)
+
+    def _top_up(self):
+        """Agenda aquecimentos até haver `spares` navegadores de reserva."""
+        with self._lock:
+            missing = self.spares - self._idle.qsize() - self._warming
+        for _ in range(missing):
+            self._schedule_warmup()
+
+    def acquire(self):
+        """Retorna um navegador pronto, criando um do zero só se não houver reserva."""
+        with self._lock:
+            warming = self._warming
+        try:
+            driver = self._idle.get(timeout=WARMUP_WAIT_SECONDS if warming else 0)
+        except queue.Empty:
+            logging.info("Nenhum navegador aquecido disponível. Iniciando um novo...")
+            METRICS.inc("driver_cold_starts")
+            driver = self._create()
+        with self._lock:
+            self._pages[driver] = 0
+        self._top_up()
+        return driver
+
+    def release(self, driver):
+        """Devolve um navegador saudável à reserva (por exemplo, no fim do worker)."""
+        if driver is None:
+            return
+        with self._lock:
+            self._pages.pop(driver, None)
+            closed = self._closed
+            if not closed:
+                self._idle.put(driver)
+        if closed:
+            self._quit(driver)
+
+    def page_done(self, driver):
+        """
+        Conta uma página carregada pelo driver.
+
+        Retorna o próprio driver ou, se ele atingiu `max_pages`, None depois de
+        descartá-lo; o próximo `acquire()` pega um navegador novo da reserva.
+        """
+        with self._lock:
+            self._pages[driver] = self._pages.get(driver, 0) + 1
+            exhausted = self._pages[driver] >= self.max_pages
+        if not exhausted:
+            return driver
+        logging.info(f"Navegador atingiu {self.max_pages} páginas. Reciclando.")
+        METRICS.inc("driver_recycles")
+        self.discard(driver)
+        return None
+
+    def recover(self, driver):
+        """
+        Tenta devolver o driver a um estado utilizável após um erro.
+
+        Fecha alertas pendentes e recarrega o formulário de consulta. Retorna
+        o driver se a sessão foi recuperada, ou None se ele foi descartado.
+        """
+        if driver is None:
+            return None
+        try:
+            try:
+                driver.switch_to.alert.dismiss()
+            except NoAlertPresentException:
+                pass
+            driver.get(self.url)
+            wait_for_element(driver, CNS_INPUT_ID, timeout=RECOVERY_WAIT)
+            logging.info("Sessão do navegador recuperada sem reiniciar.")
+            METRICS.inc("driver_recoveries")
+            return driver
+        except WebDriverException as e:
+            logging.warning(f"Navegador não se recuperou ({e.msg}). Descartando.")
+            METRICS.inc("driver_restarts")
+            self.discard(driver)
+            return None
+
+    def discard(self, driver):
+        """Fecha o driver em segundo plano e repõe a reserva."""
+        with self._lock:
+            self._pages.pop(driver, None)
+            closed = self._closed
+        if closed:
+            self._quit(driver)
+            return
+        self._executor.submit(self._quit, driver)
+        self._top_up()
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass  # O navegador pode já ter morrido.
+
+    def close(self):
+        """Fecha todos os navegadores da reserva e encerra o aquecimento."""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                break
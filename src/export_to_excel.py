@@ -1,55 +1,475 @@
-import pandas as pd
-import sys
+import argparse
+import csv
+import json
 import os
-from db import get_db_connection
+import sys
+import zlib
+from datetime import datetime, timedelta
+
+from storage import (
+    INTEGER_COLUMNS,
+    TIMESTAMP_COLUMNS,
+    StorageUnavailableError,
+    get_storage,
+)
 
 # --- Configurações ---
 TABLE_NAME = "cartorios_enriquecidos"
 OUTPUT_FOLDER = "data_output"
-OUTPUT_FILENAME = "resultado_cartorios_enriquecidos.xlsx"
+OUTPUT_BASENAME = "resultado_cartorios_enriquecidos"
+CHUNK_SIZE = 10_000  # Linhas lidas do banco por vez
+EXCEL_MAX_ROWS = 1_048_575  # Limite de linhas por aba do Excel (sem o cabeçalho)
+WATERMARK_FILE = ".export_watermark.json"
+# Coluna indexada com a última mudança de conteúdo (ver storage.py).
+WATERMARK_COLUMN = "ModifiedAt"
+# A marca d'água é a hora do banco antes da leitura. Uma linha gravada com
+# ModifiedAt anterior a ela, mas confirmada depois (um lote longo do
+# WriteBehindBuffer, por exemplo), cai nesta janela e é lida de novo na
+# próxima exportação; as já exportadas são descartadas pelo par (CNS, ModifiedAt).
+WATERMARK_OVERLAP = timedelta(minutes=5)
+MERGE_BUCKETS = 32  # Arquivos do dataset Parquet; o merge só reescreve os afetados
+
+
+class ExcelChunkWriter:
+    """
+    Escreve em .xlsx com o modo write-only do openpyxl.
+
+    As linhas vão direto para o arquivo temporário do openpyxl, então a memória
+    não cresce com o tamanho da tabela. Ao atingir o limite de linhas do Excel,
+    uma nova aba é criada.
+    """
+
+    def __init__(self, path):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+        self.columns = None
+
+    def _new_sheet(self):
+        index = len(self.workbook.worksheets) + 1
+        title = "Cartorios" if index == 1 else f"Cartorios_{index}"
+        self.sheet = self.workbook.create_sheet(title)
+        self.sheet.append(self.columns)
+        self.sheet_rows = 0
+
+    def write(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self._new_sheet()
+        # NaN/NaT viram células vazias em vez de texto "nan".
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            if self.sheet_rows >= EXCEL_MAX_ROWS:
+                self._new_sheet()
+            self.sheet.append(row)
+            self.sheet_rows += 1
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class CsvChunkWriter:
+    """Escreve em CSV (UTF-8 com BOM, para abrir direto no Excel)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w", encoding="utf-8-sig", newline="")
+        self.header_written = False
+
+    def write(self, chunk):
+        chunk.to_csv(
+            self.file,
+            index=False,
+            header=not self.header_written,
+            quoting=csv.QUOTE_MINIMAL,
+        )
+        self.header_written = True
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetChunkWriter:
+    """
+    Escreve em Parquet com um `pyarrow.parquet.ParquetWriter`, um row group
+    por lote lido do banco.
+
+    O schema do arquivo é fixado no primeiro lote, então as colunas de data
+    e inteiras da tabela (TIMESTAMP_COLUMNS, INTEGER_COLUMNS) têm o tipo
+    declarado em vez do inferido: num lote só com linhas ainda não raspadas
+    elas viriam vazias e sem tipo. As demais colunas são inferidas.
+    """
+
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.writer = None
+        self.schema = None
+
+    def _declared_type(self, name, inferred):
+        if name in TIMESTAMP_COLUMNS:
+            return self.pa.timestamp("us")
+        if name in INTEGER_COLUMNS:
+            return self.pa.int64()
+        # Colunas totalmente nulas no primeiro lote não têm tipo: trata como
+        # texto. O pandas pode inferir texto como large_string; o tipo fica
+        # sempre string para que os deltas do merge tenham o mesmo schema.
+        if self.pa.types.is_null(inferred) or self.pa.types.is_large_string(inferred):
+            return self.pa.string()
+        return inferred
+
+    def _build_schema(self, chunk):
+        schema = self.pa.Schema.from_pandas(chunk, preserve_index=False)
+        return self.pa.schema(
+            [self.pa.field(f.name, self._declared_type(f.name, f.type)) for f in schema]
+        )
+
+    @staticmethod
+    def _coerce(chunk):
+        """Converte as colunas de tipo declarado, seja qual for o backend."""
+        import pandas as pd
+
+        chunk = chunk.copy()
+        for column in chunk.columns:
+            if column in TIMESTAMP_COLUMNS:
+                chunk[column] = pd.to_datetime(chunk[column], format="ISO8601")
+            elif column in INTEGER_COLUMNS:
+                chunk[column] = pd.to_numeric(chunk[column]).astype("Int64")
+        return chunk
+
+    def write(self, chunk):
+        chunk = self._coerce(chunk)
+        if self.writer is None:
+            self.schema = self._build_schema(chunk)
+            self.writer = self.pq.ParquetWriter(
+                self.path, self.schema, compression="snappy"
+            )
+        table = self.pa.Table.from_pandas(
+            chunk, schema=self.schema, preserve_index=False
+        )
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+WRITERS = {
+    "xlsx": ExcelChunkWriter,
+    "csv": CsvChunkWriter,
+    "parquet": ParquetChunkWriter,
+}
+
+
+def get_output_dir():
+    # Garante que a pasta de saída exista.
+    # O '..' sobe um nível do diretório 'src' para encontrar 'data_output'.
+    output_dir_path = os.path.join(os.path.dirname(__file__), "..", OUTPUT_FOLDER)
+    if not os.path.exists(output_dir_path):
+        os.makedirs(output_dir_path)
+        print(f"Pasta de saída criada em: {output_dir_path}")
+    return output_dir_path
+
+
+def export_query(
+    conn,
+    sql_query,
+    output_file_path,
+    output_format,
+    chunksize=CHUNK_SIZE,
+    params=None,
+    on_chunk=None,
+):
+    """
+    Lê o resultado da consulta em lotes e o grava no formato escolhido.
+
+    O arquivo é escrito com a extensão `.tmp` e renomeado só no final, então
+    uma exportação interrompida nunca deixa um arquivo pela metade.
+    Retorna o total de linhas exportadas (0 = nenhum arquivo gerado).
+    `on_chunk(chunk)` é chamado para cada lote e devolve o lote a gravar,
+    por exemplo sem as linhas que a exportação incremental já levou.
+    """
+    import pandas as pd
+
+    temp_path = output_file_path + ".tmp"
+    writer = WRITERS[output_format](temp_path)
+    total_rows = 0
+    try:
+        for chunk in pd.read_sql(sql_query, conn, params=params, chunksize=chunksize):
+            if on_chunk:
+                chunk = on_chunk(chunk)
+                if chunk.empty:
+                    continue
+            writer.write(chunk)
+            total_rows += len(chunk)
+            print(f"  {total_rows} registros exportados...")
+        writer.close()
+    except Exception:
+        writer.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    if total_rows == 0:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return 0
+
+    os.replace(temp_path, output_file_path)
+    return total_rows
+
+
+def export_columnar(storage, sql_query, output_file_path):
+    """
+    Exporta para Parquet com o COPY do próprio banco (backend DuckDB).
+
+    Mesmo contrato de `export_query`: grava em `.tmp`, renomeia no final e
+    retorna o total de linhas (0 = nenhum arquivo gerado).
+    """
+    temp_path = output_file_path + ".tmp"
+    try:
+        total_rows = storage.copy_to_parquet(sql_query, temp_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    if total_rows == 0:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return 0
+
+    os.replace(temp_path, output_file_path)
+    print(f"  {total_rows} registros exportados...")
+    return total_rows
+
+
+def load_watermark(output_dir, target):
+    """
+    Retorna (marca d'água, exportados) da última exportação de `target`.
+
+    `exportados` mapeia CNS -> ModifiedAt (ISO) das linhas já exportadas que
+    ainda caem na janela WATERMARK_OVERLAP. Arquivos antigos, só com a data,
+    são lidos com `exportados` vazio.
+    """
+    path = os.path.join(output_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None, {}
+    with open(path, encoding="utf-8") as f:
+        value = json.load(f).get(target)
+    if not value:
+        return None, {}
+    if isinstance(value, str):
+        return datetime.fromisoformat(value), {}
+    return datetime.fromisoformat(value["watermark"]), value.get("exported", {})
+
+
+def save_watermark(output_dir, target, value, exported):
+    """Grava a marca d'água de forma atômica, preservando as de outros alvos."""
+    path = os.path.join(output_dir, WATERMARK_FILE)
+    watermarks = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            watermarks = json.load(f)
+    watermarks[target] = {"watermark": value.isoformat(), "exported": exported}
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def build_incremental_query(watermark):
+    """
+    Consulta das linhas novas ou alteradas desde a marca d'água (menos a
+    janela WATERMARK_OVERLAP), em um único intervalo do índice de ModifiedAt.
+    """
+    if watermark is None:
+        return f"SELECT * FROM {TABLE_NAME}", None
+    return (
+        f"SELECT * FROM {TABLE_NAME} WHERE {WATERMARK_COLUMN} > ?",
+        [watermark - WATERMARK_OVERLAP],
+    )
+
+
+def _bucket_of(cns):
+    return zlib.crc32(str(cns).encode("utf-8")) % MERGE_BUCKETS
+
+
+def merge_into_parquet_dataset(delta_path, dataset_dir):
+    """
+    Aplica um delta Parquet sobre um dataset Parquet, substituindo por CNS.
+
+    O dataset é dividido em MERGE_BUCKETS arquivos por hash do CNS; apenas os
+    arquivos que contêm CNS do delta são reescritos, cada um de forma atômica.
+    Retorna a quantidade de arquivos reescritos.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    os.makedirs(dataset_dir, exist_ok=True)
+    delta = pq.read_table(delta_path)
+    buckets = pa.array([_bucket_of(cns) for cns in delta.column("CNS").to_pylist()])
+
+    rewritten = 0
+    for bucket in sorted(set(buckets.to_pylist())):
+        delta_part = delta.filter(pc.equal(buckets, bucket))
+        part_path = os.path.join(dataset_dir, f"part-{bucket:02d}.parquet")
+        if os.path.exists(part_path):
+            current = pq.read_table(part_path)
+            keep = pc.invert(pc.is_in(current.column("CNS"), delta_part.column("CNS")))
+            merged = pa.concat_tables(
+                [current.filter(keep), delta_part], promote_options="default"
+            )
+        else:
+            merged = delta_part
+        pq.write_table(merged, part_path + ".tmp", compression="snappy")
+        os.replace(part_path + ".tmp", part_path)
+        rewritten += 1
+    return rewritten
 
 
-def main():
+def export_incremental(storage, conn, output_format, chunksize, merge_into=None):
     """
-    Exporta todos os dados da tabela 'cartorios_enriquecidos' para um arquivo Excel.
+    Exporta apenas as linhas novas ou alteradas desde a última execução.
+
+    Sem `merge_into`, gera um arquivo de delta com data e hora no nome. Com
+    `merge_into`, o delta é aplicado sobre o dataset Parquet nessa pasta.
+    A marca d'água só avança depois que a saída foi gravada com sucesso.
     """
+    import pandas as pd
+
+    output_dir = get_output_dir()
+    target = f"merge:{os.path.abspath(merge_into)}" if merge_into else "delta"
+    watermark, exported = load_watermark(output_dir, target)
+    # Lida antes das linhas: o que for gravado durante a leitura fica para a
+    # próxima exportação, em vez de ficar para trás da marca.
+    new_watermark = storage.database_now()
+    overlap_start = pd.Timestamp(new_watermark - WATERMARK_OVERLAP)
+    sql_query, params = build_incremental_query(watermark)
+    print(
+        f"Exportação incremental desde {watermark}."
+        if watermark
+        else "Nenhuma marca d'água encontrada: exportando a tabela inteira."
+    )
+
+    new_exported = {}
+
+    def skip_exported(chunk):
+        stamps = pd.to_datetime(chunk[WATERMARK_COLUMN], format="ISO8601")
+        keys = [stamp.isoformat() if pd.notna(stamp) else None for stamp in stamps]
+        fresh = []
+        for cns, stamp, key in zip(chunk["CNS"], stamps, keys):
+            fresh.append(exported.get(cns) != key)
+            # Só as que a próxima exportação vai ler de novo precisam ficar.
+            if pd.notna(stamp) and stamp > overlap_start:
+                new_exported[cns] = key
+        return chunk[fresh]
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    fmt = "parquet" if merge_into else output_format
+    delta_path = os.path.join(output_dir, f"{OUTPUT_BASENAME}_delta_{stamp}.{fmt}")
+    total_rows = export_query(
+        conn, sql_query, delta_path, fmt, chunksize, params, skip_exported
+    )
+    if total_rows == 0:
+        print("Nenhuma linha nova ou alterada desde a última exportação.")
+        save_watermark(output_dir, target, new_watermark, new_exported)
+        return 0, None
+
+    output_path = delta_path
+    if merge_into:
+        rewritten = merge_into_parquet_dataset(delta_path, merge_into)
+        os.remove(delta_path)
+        output_path = merge_into
+        print(f"{rewritten} arquivos do dataset reescritos.")
+
+    save_watermark(output_dir, target, new_watermark, new_exported)
+    return total_rows, output_path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=f"Exporta a tabela '{TABLE_NAME}' para Excel, CSV ou Parquet."
+    )
+    parser.add_argument("--format", choices=sorted(WRITERS), default="xlsx")
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=CHUNK_SIZE,
+        help="Linhas lidas do banco por vez; limita o uso de memória.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Exporta apenas as linhas novas ou alteradas desde a última "
+        "exportação incremental (marca d'água em ModifiedAt).",
+    )
+    parser.add_argument(
+        "--merge-into",
+        metavar="PASTA",
+        help="Com --incremental, aplica o delta sobre o dataset Parquet desta "
+        "pasta em vez de gerar um arquivo de delta.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Exporta todos os dados da tabela 'cartorios_enriquecidos' em modo streaming.
+    """
+    args = parse_args(argv)
     print("Iniciando processo de exportação...")
 
-    conn = get_db_connection()
-    if not conn:
+    storage = get_storage()
+    try:
+        if args.incremental or args.merge_into:
+            storage.create_schema()  # Garante a coluna ModifiedAt da marca d'água
+        conn = storage.connect()
+    except StorageUnavailableError:
         print("Não foi possível conectar ao banco de dados. Abortando.")
         sys.exit(1)
 
     try:
+        if args.incremental or args.merge_into:
+            total_rows, output_path = export_incremental(
+                storage, conn, args.format, args.chunksize, args.merge_into
+            )
+            if total_rows:
+                print("-" * 50)
+                print(">>> EXPORTAÇÃO INCREMENTAL CONCLUÍDA COM SUCESSO! <<<")
+                print(f"{total_rows} registros exportados para: {output_path}")
+                print("-" * 50)
+            return
+
         # A consulta SQL para selecionar todos os dados da tabela.
         sql_query = f"SELECT * FROM {TABLE_NAME}"
         print(f"Executando consulta na tabela '{TABLE_NAME}'...")
 
-        # O pandas.read_sql é a forma mais eficiente de carregar dados de uma query.
-        df = pd.read_sql(sql_query, conn)
-
-        print(f"Foram encontrados {len(df)} registros no banco de dados.")
+        output_file_path = os.path.join(
+            get_output_dir(), f"{OUTPUT_BASENAME}.{args.format}"
+        )
+        if args.format == "parquet" and storage.supports_columnar_export:
+            # DuckDB grava o Parquet direto das colunas, sem passar pelo pandas.
+            total_rows = export_columnar(storage, sql_query, output_file_path)
+        else:
+            total_rows = export_query(
+                conn, sql_query, output_file_path, args.format, args.chunksize
+            )
 
-        if df.empty:
+        if total_rows == 0:
             print("A tabela está vazia. Nenhum arquivo será gerado.")
             return
 
-        # Garante que a pasta de saída exista.
-        # O '..' sobe um nível do diretório 'src' para encontrar 'data_output'.
-        output_dir_path = os.path.join(os.path.dirname(__file__), "..", OUTPUT_FOLDER)
-        if not os.path.exists(output_dir_path):
-            os.makedirs(output_dir_path)
-            print(f"Pasta de saída criada em: {output_dir_path}")
-
-        output_file_path = os.path.join(output_dir_path, OUTPUT_FILENAME)
-
-        # Exporta o DataFrame para um arquivo Excel.
-        # index=False evita que o índice do pandas seja escrito no arquivo.
-        df.to_excel(output_file_path, index=False, engine="openpyxl")
-
         print("-" * 50)
         print(">>> EXPORTAÇÃO CONCLUÍDA COM SUCESSO! <<<")
-        print(f"Arquivo salvo em: {output_file_path}")
+        print(f"{total_rows} registros salvos em: {output_file_path}")
         print("-" * 50)
 
     except Exception as e:
@@ -0,0 +1,160 @@
+# Regras de extração compartilhadas pelos motores de scraping.
+# Cada motor (Selenium ou HTTP) só precisa obter o HTML do painel de
+# resultados; o parse offline e a montagem do dicionário `data` ficam
+# centralizados aqui para que todos retornem exatamente o mesmo resultado.
+import lxml.html
+
+DEFAULT_NOT_FOUND_TEXT = "Não informado"
+CNS_NOT_FOUND_ALERT = "CNS não cadastrado"
+
+# Novo: Set com todas as UFs do Brasil para validação
+UFS_BRASIL = {
+    "AC",
+    "AL",
+    "AP",
+    "AM",
+    "BA",
+    "CE",
+    "DF",
+    "ES",
+    "GO",
+    "MA",
+    "MT",
+    "MS",
+    "MG",
+    "PA",
+    "PB",
+    "PR",
+    "PE",
+    "PI",
+    "RJ",
+    "RN",
+    "RS",
+    "RO",
+    "RR",
+    "SC",
+    "SP",
+    "SE",
+    "TO",
+}
+
+PANEL_ID = "panelDadosCartorio"
+PANEL_XPATH = f'//*[@id="{PANEL_ID}"]/div'
+CNS_INPUT_XPATH = '//*[@id="txtListaCartoriosCNS"]'
+
+# Mapa declarativo campo bruto -> XPath, relativo ao elemento do painel.
+# Para mudar a extração de um campo basta ajustar este mapa.
+FIELD_SELECTORS = {
+    "NomeCartorio": './/*[@id="lblRazao"]',
+    "Tabeliao": './/*[@id="lblResponsavel"]',
+    "Logradouro": './/*[@id="lblLogradouro"]',
+    "Numero": './/*[@id="lblNumero"]',
+    "Complemento": './/*[@id="lblComplemento"]',
+    "Bairro": './/*[@id="lblBairro"]',
+    "CEP": './/*[@id="lblCep"]',
+    "DDD": './/*[@id="lblDDDTelefone"]',
+    "Telefone": './/*[@id="lblTelefone"]',
+    "Email": './/*[@id="lblEmail"]',
+    # Para 'Site' e 'Atribuições', o texto vem após o <b>, dentro do <li>.
+    "Site": "./div/ul/li[6]",
+    "Atribuicoes": "./div/ul/li[7]",
+}
+
+
+class CnsNaoCadastradoError(Exception):
+    """O site informou que o CNS consultado não está cadastrado."""
+
+
+def element_text(element):
+    """Equivalente offline ao `.text` do Selenium: texto com espaços normalizados."""
+    lines = [" ".join(line.split()) for line in element.text_content().splitlines()]
+    text = "\n".join(line for line in lines if line)
+    return text if text else DEFAULT_NOT_FOUND_TEXT
+
+
+def extract_raw_fields(panel):
+    """Aplica FIELD_SELECTORS sobre o elemento lxml do painel."""
+    raw = {}
+    for field, selector in FIELD_SELECTORS.items():
+        elements = panel.xpath(selector)
+        raw[field] = element_text(elements[0]) if elements else DEFAULT_NOT_FOUND_TEXT
+    return raw
+
+
+def parse_panel_html(html):
+    """
+    Converte um snapshot HTML contendo o painel de resultados no dicionário `data`.
+
+    Aceita o `outerHTML` do painel, a página inteira ou o conteúdo de um
+    UpdatePanel. Levanta ValueError se o painel não estiver no HTML.
+    """
+    tree = lxml.html.fromstring(html)
+    panels = tree.xpath(f'//*[@id="{PANEL_ID}"]')
+    if not panels or not panels[0].xpath("./div"):
+        raise ValueError(f"Painel '{PANEL_ID}' ausente no HTML.")
+    return build_cartorio_data(extract_raw_fields(panels[0]))
+
+
+def build_cartorio_data(raw):
+    """
+    Monta o dicionário de dados do cartório a partir dos campos brutos.
+
+    `raw` mapeia cada chave de FIELD_SELECTORS para o texto do elemento, ou
+    DEFAULT_NOT_FOUND_TEXT quando o elemento não existir.
+    """
+    data = {}
+    data["NomeCartorio"] = raw["NomeCartorio"]
+    data["Tabeliao"] = raw["Tabeliao"]
+
+    # Monta o endereço apenas com as partes que existem
+    address_parts = [
+        raw["Logradouro"],
+        raw["Numero"],
+        raw["Complemento"],
+        raw["Bairro"],
+    ]
+    # Filtra para não incluir "Não informado" na string final
+    valid_parts = [part for part in address_parts if part != DEFAULT_NOT_FOUND_TEXT]
+    data["Endereco"] = ", ".join(valid_parts) if valid_parts else DEFAULT_NOT_FOUND_TEXT
+
+    data["CEP"] = raw["CEP"]
+
+    # Concatenação de telefone
+    ddd = raw["DDD"]
+    telefone_num = raw["Telefone"]
+    if ddd != DEFAULT_NOT_FOUND_TEXT and telefone_num != DEFAULT_NOT_FOUND_TEXT:
+        data["Telefone"] = f"({ddd}) {telefone_num}"
+    else:
+        data["Telefone"] = DEFAULT_NOT_FOUND_TEXT
+
+    data["Email"] = raw["Email"]
+
+    site_text = raw["Site"]
+    if "Site:" in site_text:
+        data["Site"] = site_text.replace("Site:", "").strip()
+    else:
+        data["Site"] = (
+            site_text  # Se não encontrar o "Site:", pode ser o próprio valor ou "Não informado"
+        )
+
+    atribuicoes_text = raw["Atribuicoes"]
+    if "Serviços ativados ao cartório:" in atribuicoes_text:
+        data["Atribuicoes"] = atribuicoes_text.replace(
+            "Serviços ativados ao cartório:", ""
+        ).strip()
+    else:
+        data["Atribuicoes"] = atribuicoes_text
+
+    # Lógica de extração da UF aprimorada e corrigida
+    nome_cartorio = data.get("NomeCartorio", "")
+    data["UF"] = ""  # Define um valor padrão
+    if nome_cartorio:
+        # Divide o nome por espaços e hífens para pegar a última palavra
+        parts = nome_cartorio.replace("-", " ").split()
+        if parts:
+            last_part = parts[-1].strip().upper()
+            # Verifica se a última parte é uma UF válida
+            if last_part in UFS_BRASIL:
+                data["UF"] = last_part
+
+    return data
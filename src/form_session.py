@@ -0,0 +1,101 @@
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+
+from extraction import PANEL_ID
+from metrics import METRICS
+from waits import observer_script, wait_for_element, wait_until
+
+# Reaproveitamento do formulário: em vez de um `driver.get` por CNS, a página
+# de consulta é carregada uma vez e, para os CNS seguintes, só o campo é
+# limpo e o CNS é digitado de novo, o que dispara o postback do UpdatePanel.
+#
+# Para não confundir o painel da consulta anterior com o da atual, o
+# `lblRazao` de cada resultado lido é marcado com o CNS a que pertence
+# (atributo OWNER_ATTR). Um painel novo, renderizado pelo site, não tem a
+# marca; enquanto o `lblRazao` na tela for de outro CNS, o resultado ainda
+# não chegou.
+
+# --- Configurações ---
+CNS_INPUT_ID = "txtListaCartoriosCNS"
+OWNER_ATTR = "data-carto-cns"
+
+# Devolve o outerHTML do painel se ele estiver visível e pertencer ao CNS
+# consultado (marcando-o como tal), ou null enquanto não estiver. Reavaliada
+# pelo MutationObserver de waits.py a cada mudança na página.
+READ_PANEL_JS = observer_script(f"""
+var cns = args[0];
+var panel = document.getElementById('{PANEL_ID}');
+var razao = document.getElementById('lblRazao');
+if (!panel || !razao || !panel.getClientRects().length) return null;
+var owner = razao.getAttribute('{OWNER_ATTR}');
+if (owner && owner !== cns) return null;
+var html = panel.outerHTML;
+razao.setAttribute('{OWNER_ATTR}', cns);
+return html;
+""")
+
+# A página está pronta para uma nova consulta sem recarregar?
+FORM_READY_JS = f"""
+return document.readyState === 'complete'
+    && location.pathname === arguments[0]
+    && !!document.getElementById('{CNS_INPUT_ID}');
+"""
+
+CLEAR_INPUT_JS = f"document.getElementById('{CNS_INPUT_ID}').value = '';"
+
+
+def wait_for_panel(driver, cns):
+    """Espera o painel do `cns` e retorna o seu outerHTML."""
+    return wait_until(driver, READ_PANEL_JS, cns)
+
+
+def load_and_query(driver, cns, url):
+    """Caminho completo: recarrega a página de consulta e digita o CNS."""
+    with METRICS.timer("page_load"):
+        driver.get(url)
+
+    with METRICS.timer("wait"):
+        wait_for_element(driver, CNS_INPUT_ID)
+        input_cns = driver.find_element(By.ID, CNS_INPUT_ID)
+        input_cns.clear()
+        input_cns.send_keys(cns)
+        return wait_for_panel(driver, cns)
+
+
+def form_ready(driver, url):
+    """True se o navegador está na página de consulta, pronto para reaproveitá-la."""
+    return bool(driver.execute_script(FORM_READY_JS, urlsplit(url).path))
+
+
+def resubmit_query(driver, cns):
+    """
+    Caminho rápido: limpa o campo e digita o CNS na página já carregada.
+
+    Limpar via JavaScript não dispara eventos, então o único postback é o do
+    CNS novo. Levanta TimeoutException se o painel do CNS não aparecer no
+    limite adaptativo de waits.py.
+    """
+    with METRICS.timer("wait"):
+        driver.execute_script(CLEAR_INPUT_JS)
+        driver.find_element(By.ID, CNS_INPUT_ID).send_keys(cns)
+        return wait_for_panel(driver, cns)
+
+
+def query_panel(driver, cns, url, reuse_form=False):
+    """
+    Consulta um CNS no navegador e retorna o outerHTML do painel de resultados.
+
+    Com `reuse_form`, tenta primeiro reaproveitar a página já carregada. Se
+    ela não estiver no estado esperado, ou o painel do CNS não aparecer (ainda
+    é o da consulta anterior, por exemplo), recarrega a página uma vez.
+    """
+    if reuse_form and form_ready(driver, url):
+        try:
+            html = resubmit_query(driver, cns)
+            METRICS.inc("form_resubmits")
+            return html
+        except TimeoutException:
+            METRICS.inc("form_reloads")
+    return load_and_query(driver, cns, url)
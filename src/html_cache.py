@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# --- Configurações ---
+DEFAULT_CACHE_DIR = "cache/html"
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_MB = 2048
+COMPRESSION_LEVEL = 6
+
+INDEX_DDL = """
+CREATE TABLE IF NOT EXISTS entries (
+    cns TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access);
+CREATE INDEX IF NOT EXISTS ix_entries_hash ON entries (hash);
+"""
+
+
+class HtmlCache:
+    """
+    Cache em disco do HTML bruto do painel de resultados, por CNS.
+
+    O conteúdo é endereçado pelo SHA-256 e gravado comprimido com zlib em
+    `objects/<2 primeiros>/<hash>.z`; um índice SQLite liga cada CNS ao seu
+    blob. Entradas mais velhas que `ttl_days` não são devolvidas por `get()`,
+    e quando o total comprimido passa de `max_mb` as entradas acessadas há
+    mais tempo são removidas (LRU). Seguro para uso por várias threads.
+    """
+
+    def __init__(
+        self,
+        cache_dir=DEFAULT_CACHE_DIR,
+        ttl_days=DEFAULT_TTL_DAYS,
+        max_mb=DEFAULT_MAX_MB,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_days * 86400
+        self.max_bytes = max_mb * 1024 * 1024
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"), check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(INDEX_DDL)
+        self._db.commit()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.cache_dir, "objects", digest[:2], f"{digest}.z")
+
+    def _read_blob(self, digest):
+        with open(self._blob_path(digest), "rb") as f:
+            return zlib.decompress(f.read()).decode("utf-8")
+
+    def put(self, cns, html):
+        """Guarda o HTML de um CNS, substituindo a versão anterior."""
+        raw = html.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self._blob_path(digest)
+        now = time.time()
+
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                payload = zlib.compress(raw, COMPRESSION_LEVEL)
+                with open(path + ".tmp", "wb") as f:
+                    f.write(payload)
+                os.replace(path + ".tmp", path)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO blobs (hash, size) VALUES (?, ?)",
+                    (digest, len(payload)),
+                )
+            previous = self._db.execute(
+                "SELECT hash FROM entries WHERE cns = ?", (cns,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (cns, hash, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (cns, digest, now, now),
+            )
+            if previous and previous[0] != digest:
+                self._drop_blob_if_orphan(previous[0])
+            self._evict()
+            self._db.commit()
+
+    def get(self, cns, max_age=None):
+        """
+        Retorna o HTML em cache do CNS, ou None se ausente ou expirado.
+
+        `max_age` (segundos) substitui o TTL padrão; use `float("inf")` para
+        aceitar qualquer idade, como no reprocessamento a partir do cache.
+        """
+        max_age = self.ttl_seconds if max_age is None else max_age
+        with self._lock:
+            row = self._db.execute(
+                "SELECT hash, fetched_at FROM entries WHERE cns = ?", (cns,)
+            ).fetchone()
+            if not row or time.time() - row[1] > max_age:
+                return None
+            self._db.execute(
+                "UPDATE entries SET last_access = ? WHERE cns = ?", (time.time(), cns)
+            )
+            self._db.commit()
+            try:
+                return self._read_blob(row[0])
+            except (OSError, zlib.error) as e:
+                logging.warning(f"Cache: blob do CNS {cns} ilegível ({e}). Ignorando.")
+                return None
+
+    def iter_entries(self):
+        """Percorre (cns, html) de todas as entradas, independentemente do TTL."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT cns, hash FROM entries ORDER BY cns"
+            ).fetchall()
+        for cns, digest in rows:
+            try:
+                yield cns, self._read_blob(digest)
+            except (OSError, zlib.error) as e:
+                logging.warning(f"Cache: blob do CNS {cns} ilegível ({e}). Ignorando.")
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _drop_blob_if_orphan(self, digest):
+        """Apaga o blob se nenhum CNS o referencia. Retorna os bytes liberados."""
+        in_use = self._db.execute(
+            "SELECT 1 FROM entries WHERE hash = ? LIMIT 1", (digest,)
+        ).fetchone()
+        row = self._db.execute(
+            "SELECT size FROM blobs WHERE hash = ?", (digest,)
+        ).fetchone()
+        if in_use or not row:
+            return 0
+        self._db.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+        try:
+            os.remove(self._blob_path(digest))
+        except FileNotFoundError:
+            pass
+        return row[0]
+
+    def _evict(self):
+        """Remove as entradas menos usadas até o cache caber em `max_bytes`."""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[
+            0
+        ]
+        if total <= self.max_bytes:
+            return
+        victims = self._db.execute(
+            "SELECT cns, hash FROM entries ORDER BY last_access"
+        ).fetchall()
+        for cns, digest in victims:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM entries WHERE cns = ?", (cns,))
+            total -= self._drop_blob_if_orphan(digest)
+        logging.info(f"Cache: eviction concluída, {total / 1024 / 1024:.1f} MB em uso.")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,226 @@
+import logging
+import os
+import re
+
+import lxml.etree
+import lxml.html
+import requests
+from requests.adapters import HTTPAdapter
+
+from extraction import CNS_NOT_FOUND_ALERT, CnsNaoCadastradoError, parse_panel_html
+
+# --- Configurações ---
+URL_ALVO = "https://ridigital.org.br/CartorioNacional/CartorioNacional.aspx"
+CNS_INPUT_NAME = "txtListaCartoriosCNS"
+REQUEST_TIMEOUT = 15  # segundos
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+)
+
+# Registro do UpdatePanel feito pelo ScriptManager na página, por exemplo:
+# Sys.WebForms.PageRequestManager._initialize('ScriptManager1', 'form1', ['tUpdatePanel1','UpdatePanel1'], ...)
+_PRM_INIT_RE = re.compile(
+    r"PageRequestManager\._initialize\('([^']+)',\s*'[^']*',\s*\[\s*'t([^']+)'"
+)
+_ALERT_RE = re.compile(r"alert\(\s*['\"]([^'\"]*)['\"]\s*\)")
+
+
+class HttpEngineError(Exception):
+    """O caminho HTTP não conseguiu obter um resultado; use o Selenium."""
+
+
+def parse_hidden_fields(html):
+    """Extrai os campos ocultos do formulário ASP.NET (__VIEWSTATE etc.)."""
+    try:
+        tree = lxml.html.fromstring(html)
+    except lxml.etree.LxmlError as e:
+        # Corpo vazio ou que não é HTML (ex.: uma resposta 200 truncada).
+        raise HttpEngineError(f"Resposta não é um HTML válido: {e}") from e
+    return {
+        field.get("name"): field.get("value", "")
+        for field in tree.xpath('//input[@type="hidden"][@name]')
+    }
+
+
+def parse_async_delta(text):
+    """
+    Decodifica uma resposta parcial do ASP.NET AJAX.
+
+    O formato é uma sequência de blocos `tamanho|tipo|id|conteúdo|`, onde o
+    tamanho se refere ao conteúdo e pode conter o caractere '|'.
+    Retorna uma lista de tuplas (tipo, id, conteúdo). Levanta HttpEngineError
+    se a resposta estiver malformada ou truncada.
+    """
+    entries = []
+    pos = 0
+    while pos < len(text):
+        sep = text.find("|", pos)
+        if sep == -1:
+            break
+        try:
+            length = int(text[pos:sep])
+            type_end = text.index("|", sep + 1)
+            id_end = text.index("|", type_end + 1)
+        except ValueError as e:
+            raise HttpEngineError(f"Resposta parcial malformada: {e}") from e
+        content_start = id_end + 1
+        content = text[content_start : content_start + length]
+        entries.append((text[sep + 1 : type_end], text[type_end + 1 : id_end], content))
+        pos = content_start + length + 1  # pula o '|' final do bloco
+    return entries
+
+
+def _is_async_delta(text):
+    return bool(re.match(r"^\d+\|", text))
+
+
+def parse_panel(html):
+    """Converte o HTML com o painel de resultados no dicionário `data`."""
+    try:
+        return parse_panel_html(html)
+    except (ValueError, lxml.etree.LxmlError) as e:
+        raise HttpEngineError(str(e)) from e
+
+
+def parse_form_state(html):
+    """
+    Lê da página inicial o estado necessário para o postback.
+
+    Retorna (campos ocultos, id do ScriptManager, id do UpdatePanel); os dois
+    últimos são None quando a página não usa ASP.NET AJAX.
+    """
+    match = _PRM_INIT_RE.search(html)
+    script_manager, update_panel = match.groups() if match else (None, None)
+    return parse_hidden_fields(html), script_manager, update_panel
+
+
+def build_postback(url, hidden_fields, script_manager, update_panel, cns):
+    """Monta o formulário e os cabeçalhos do postback que consulta um CNS."""
+    form = dict(hidden_fields)
+    form["__EVENTTARGET"] = CNS_INPUT_NAME
+    form["__EVENTARGUMENT"] = ""
+    form[CNS_INPUT_NAME] = cns
+    headers = {"Referer": url}
+    if script_manager:
+        form[script_manager] = f"{update_panel}|{CNS_INPUT_NAME}"
+        form["__ASYNCPOST"] = "true"
+        headers["X-MicrosoftAjax"] = "Delta=true"
+        headers["X-Requested-With"] = "XMLHttpRequest"
+    return form, headers
+
+
+def extract_panel_html(text, cns, hidden_fields):
+    """
+    Extrai da resposta do postback o HTML do painel de resultados.
+
+    Atualiza `hidden_fields` com o VIEWSTATE devolvido pelo servidor, para
+    ser reaproveitado na próxima consulta. Levanta CnsNaoCadastradoError
+    quando o site exibe o alerta, ou HttpEngineError quando o estado
+    expirou ou a resposta não tem o painel (nesse caso `hidden_fields`
+    é esvaziado, forçando a recarga da página).
+    """
+    if not _is_async_delta(text):
+        if CNS_NOT_FOUND_ALERT in text:
+            raise CnsNaoCadastradoError(cns)
+        hidden_fields.clear()
+        hidden_fields.update(parse_hidden_fields(text))
+        return text
+
+    panel_html = []
+    for entry_type, entry_id, content in parse_async_delta(text):
+        if entry_type == "hiddenField":
+            # Reaproveita o VIEWSTATE devolvido na próxima consulta.
+            hidden_fields[entry_id] = content
+        elif entry_type == "updatePanel":
+            panel_html.append(content)
+        elif entry_type in ("scriptBlock", "scriptStartupBlock"):
+            alert = _ALERT_RE.search(content)
+            if alert and CNS_NOT_FOUND_ALERT in alert.group(1):
+                raise CnsNaoCadastradoError(cns)
+        elif entry_type in ("error", "pageRedirect"):
+            # VIEWSTATE expirado ou sessão inválida: recarrega na próxima.
+            hidden_fields.clear()
+            raise HttpEngineError(f"Resposta '{entry_type}' do servidor: {content}")
+
+    if not panel_html:
+        raise HttpEngineError("Resposta parcial sem conteúdo de UpdatePanel.")
+    return "<div>" + "".join(panel_html) + "</div>"
+
+
+def interpret_response(text, cns, hidden_fields):
+    """Interpreta a resposta do postback e retorna o dicionário `data`."""
+    return parse_panel(extract_panel_html(text, cns, hidden_fields))
+
+
+class HttpEngine:
+    """
+    Consulta CNS reproduzindo o postback ASP.NET da página, sem navegador.
+
+    Mantém uma `requests.Session` com keep-alive e reaproveita o VIEWSTATE
+    entre consultas; a página só é recarregada quando o estado expira.
+    Cada worker deve ter a sua própria instância.
+    """
+
+    def __init__(self, url=URL_ALVO, timeout=REQUEST_TIMEOUT, record_dir=None):
+        self.url = url
+        self.timeout = timeout
+        self.record_dir = record_dir
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._hidden_fields = {}
+        self._script_manager = None
+        self._update_panel = None
+
+    def _load_form(self):
+        logging.info("HTTP: carregando a página de consulta para obter o VIEWSTATE.")
+        try:
+            response = self.session.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise HttpEngineError(f"Falha ao carregar a página: {e}") from e
+        self._record("pagina_inicial.html", response.text)
+
+        self._hidden_fields, self._script_manager, self._update_panel = (
+            parse_form_state(response.text)
+        )
+
+    def _post(self, cns):
+        form, headers = build_postback(
+            self.url, self._hidden_fields, self._script_manager, self._update_panel, cns
+        )
+        try:
+            response = self.session.post(
+                self.url, data=form, headers=headers, timeout=self.timeout
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise HttpEngineError(f"Falha no postback: {e}") from e
+        return response.text
+
+    def fetch_panel_html(self, cns):
+        """Consulta um CNS e retorna o HTML do painel de resultados."""
+        if not self._hidden_fields:
+            self._load_form()
+
+        text = self._post(cns)
+        self._record(f"{cns}.html", text)
+        return extract_panel_html(text, cns, self._hidden_fields)
+
+    def scrape(self, cns):
+        """Retorna o mesmo dicionário `data` que `scrape_cns_data`."""
+        return parse_panel(self.fetch_panel_html(cns))
+
+    def _record(self, filename, content):
+        """Grava as respostas brutas, para uso com o stub_server.py."""
+        if not self.record_dir:
+            return
+        os.makedirs(self.record_dir, exist_ok=True)
+        with open(os.path.join(self.record_dir, filename), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,109 @@
+import logging
+import sys
+
+from storage import (  # noqa: F401 (reexportados para os scripts do scraper)
+    CLAIM_TIMEOUT_MINUTES,
+    STATUS_CNS_NOT_FOUND,
+    STATUS_CONCLUIDO,
+    STATUS_ERRO,
+    STATUS_NAO_ENCONTRADO,
+    STATUS_PENDENTE,
+    TABLE_NAME,
+    StorageUnavailableError,
+    get_storage,
+)
+
+
+def get_pending_cns():
+    """Busca no banco de dados os CNS que ainda não foram processados."""
+    try:
+        cns_list = get_storage().get_pending_cns()
+        logging.info(f"Encontrados {len(cns_list)} CNS pendentes de processamento.")
+        return cns_list
+    except StorageUnavailableError:
+        logging.critical("Não foi possível conectar ao banco para buscar tarefas.")
+        sys.exit(1)
+    except Exception as e:
+        logging.error(f"Erro ao buscar CNS pendentes: {e}")
+        return []
+
+
+def claim_batch(run_id, worker_id, batch_size, refresh=False):
+    """
+    Reivindica atomicamente um lote de CNS pendentes para um worker.
+
+    Com `refresh`, o lote vem das linhas já concluídas cuja reconsulta venceu
+    (NextRefreshAt), as mais atrasadas primeiro.
+
+    No SQL Server usa o padrão `UPDLOCK, READPAST`: linhas travadas por outro
+    worker são puladas em vez de aguardadas, então dois workers nunca recebem o
+    mesmo CNS. Linhas já reivindicadas nesta execução (mesmo `run_id`) não
+    voltam para a fila, o que impede que um CNS pulado seja tentado de novo
+    por outro worker.
+    """
+    try:
+        storage = get_storage()
+        if refresh:
+            return storage.claim_refresh_batch(run_id, worker_id, batch_size)
+        return storage.claim_batch(run_id, worker_id, batch_size)
+    except Exception as e:
+        logging.error(f"[{worker_id}] Erro ao reivindicar lote de CNS: {e}")
+        return []
+
+
+def release_claims(run_id):
+    """Libera todas as reivindicações feitas por esta execução."""
+    try:
+        get_storage().release_claims(run_id)
+    except Exception as e:
+        logging.error(f"Erro ao liberar reivindicações da execução {run_id}: {e}")
+
+
+def update_cartorio_data(cns, data):
+    """
+    Atualiza um registro no banco de dados com os dados extraídos.
+
+    Grava imediatamente, uma linha por vez; para volume use o WriteBehindBuffer.
+    """
+    # Filtra chaves com valores nulos ou vazios para não sobrescrever dados existentes com nada
+    update_data = {k: v for k, v in data.items() if v}
+    if not update_data:
+        logging.warning(f"CNS {cns}: Nenhum dado novo para atualizar.")
+        return True  # Considera sucesso pois não há o que fazer
+
+    try:
+        get_storage().update_cartorio_data(cns, update_data)
+        logging.info(f"CNS {cns}: Dados salvos com sucesso.")
+        return True
+    except Exception as e:
+        logging.error(f"CNS {cns}: Erro ao salvar no banco: {e}")
+        return False
+
+
+def record_failure(cns, error, max_retries):
+    """
+    Registra uma tentativa malsucedida no banco e retorna o total de tentativas.
+
+    Ao atingir `max_retries` o CNS passa para ERRO e não é mais buscado como
+    pendente. Numa reconsulta (linha CONCLUIDO) ele continua concluído e só tem
+    o NextRefreshAt adiado. Retorna None se o banco estiver indisponível; nesse caso o
+    chamador deve manter a contagem em memória.
+    """
+    try:
+        return get_storage().record_failure(cns, error, max_retries)
+    except Exception as e:
+        logging.error(f"CNS {cns}: Erro ao registrar falha no banco: {e}")
+        return None
+
+
+def mark_not_found(cns):
+    """
+    Marca o CNS como inexistente no site, para nunca mais ser consultado.
+
+    Numa reconsulta (linha CONCLUIDO) os dados já gravados são mantidos: só o
+    LastError é registrado e o NextRefreshAt adiado.
+    """
+    try:
+        get_storage().mark_not_found(cns)
+    except Exception as e:
+        logging.error(f"CNS {cns}: Erro ao marcar como não encontrado: {e}")
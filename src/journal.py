@@ -0,0 +1,209 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import METRICS
+
+# --- Configurações ---
+DEFAULT_JOURNAL_PATH = "journal/resultados.jsonl"
+REPLAY_BATCH_SIZE = 200  # Linhas gravadas no banco por transação no replay
+REPLAY_RETRY_SECONDS = 10  # Espera entre tentativas enquanto o banco está fora
+
+
+def read_entries(path=DEFAULT_JOURNAL_PATH):
+    """
+    Lê o journal e retorna {cns: (seq, data)} dos resultados não confirmados.
+
+    Cada linha é um resultado ({"cns", "seq", "data", "ts"}) ou uma
+    confirmação ({"commit": [[cns, seq], ...]}), que só vale para os
+    resultados do CNS escritos até aquele `seq`: um resultado mais novo do
+    mesmo CNS, ainda num lote a gravar, continua pendente. Vale o resultado
+    mais recente de cada CNS; uma última linha truncada (queda no meio da
+    escrita) é ignorada. Journals antigos, sem `seq`, confirmam pelo CNS.
+    """
+    pending = OrderedDict()
+    if not os.path.exists(path):
+        return pending
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(
+                    f"Journal '{path}': linha {line_number} incompleta ignorada."
+                )
+                continue
+            if "commit" in entry:
+                for item in entry["commit"]:
+                    cns, seq = item if isinstance(item, list) else (item, None)
+                    if cns in pending and (seq is None or pending[cns][0] <= seq):
+                        del pending[cns]
+            else:
+                pending.pop(entry["cns"], None)
+                pending[entry["cns"]] = (entry.get("seq", 0), entry["data"])
+    return pending
+
+
+def read_pending(path=DEFAULT_JOURNAL_PATH):
+    """Lê o journal e retorna {cns: data} dos resultados ainda não confirmados."""
+    return OrderedDict((cns, data) for cns, (_, data) in read_entries(path).items())
+
+
+class CheckpointJournal:
+    """
+    Journal local, só de acréscimo (JSONL), dos resultados ainda não gravados.
+
+    Cada resultado raspado é escrito aqui antes de ir para o banco; o
+    WriteBehindBuffer faz o fsync uma vez por lote, antes do COMMIT no banco,
+    e registra a confirmação depois dele. Se o banco cair ou o processo
+    morrer, o que não foi confirmado é regravado por `replay_journal` em vez
+    de ser raspado de novo.
+
+    Cada resultado recebe um número de sequência (`append` o retorna), e a
+    confirmação é por (CNS, seq): um CNS raspado de novo enquanto o lote
+    anterior grava continua pendente até o lote dele ser confirmado. Quando
+    não resta nada pendente, o arquivo é truncado, então em operação normal
+    ele fica com no máximo alguns lotes.
+    Um processo por journal: use caminhos diferentes para processos diferentes.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        # Resultados de uma execução anterior ainda não regravados continuam valendo.
+        self._pending = {cns: seq for cns, (seq, _) in read_entries(path).items()}
+        self._seq = max(self._pending.values(), default=0)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, cns, data):
+        """
+        Registra um resultado e retorna o seu número de sequência.
+
+        Sobrevive a uma queda do processo; o fsync vem em `sync`.
+        """
+        with self._lock:
+            self._seq += 1
+            line = json.dumps(
+                {"cns": cns, "seq": self._seq, "data": data, "ts": time.time()},
+                ensure_ascii=False,
+            )
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._pending[cns] = self._seq
+            return self._seq
+
+    def sync(self):
+        """Força os resultados escritos até agora para o disco (fsync)."""
+        with self._lock, METRICS.timer("journal_sync"):
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def mark_committed(self, committed):
+        """
+        Registra que os resultados `committed`, pares (cns, seq), estão no banco.
+
+        Confirma também os resultados mais antigos do mesmo CNS, que o lote
+        substituiu. O journal só é truncado quando nada mais está pendente.
+        """
+        with self._lock:
+            for cns, seq in committed:
+                if self._pending.get(cns, seq + 1) <= seq:
+                    del self._pending[cns]
+            if not self._pending:
+                self._file.seek(0)
+                self._file.truncate()
+            else:
+                line = json.dumps({"commit": [[cns, seq] for cns, seq in committed]})
+                self._file.write(line + "\n")
+            self._file.flush()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            empty = not self._pending
+        if empty and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def replay_journal(path=DEFAULT_JOURNAL_PATH, batch_size=REPLAY_BATCH_SIZE):
+    """
+    Grava no banco os resultados pendentes do journal e o esvazia.
+
+    Retorna a quantidade de CNS regravados. Se o banco falhar, a exceção sobe
+    e o journal fica intacto para a próxima tentativa.
+    """
+    from storage import iter_batches
+    from write_buffer import write_batch
+
+    pending = read_pending(path)
+    if not pending:
+        return 0
+    logging.info(f"Journal '{path}': regravando {len(pending)} resultados pendentes.")
+    for batch in iter_batches(pending.items(), batch_size):
+        write_batch(batch)
+        METRICS.inc("journal_replayed", len(batch))
+    os.remove(path)
+    logging.info(f"Journal '{path}': {len(pending)} resultados regravados no banco.")
+    return len(pending)
+
+
+def drain_journal(path=DEFAULT_JOURNAL_PATH, wait=False):
+    """
+    Executa `replay_journal`; com `wait`, repete até o banco voltar.
+
+    Retorna a quantidade regravada, ou None se o banco continuar indisponível.
+    """
+    while True:
+        try:
+            return replay_journal(path)
+        except Exception as e:
+            if not wait:
+                logging.warning(
+                    f"Journal '{path}' não pôde ser regravado agora: {e}. "
+                    f"Os resultados continuam guardados."
+                )
+                return None
+            logging.warning(
+                f"Banco indisponível ({e}). Nova tentativa em {REPLAY_RETRY_SECONDS}s."
+            )
+            time.sleep(REPLAY_RETRY_SECONDS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Regrava no banco os resultados pendentes do journal local."
+    )
+    parser.add_argument("--path", default=DEFAULT_JOURNAL_PATH)
+    parser.add_argument(
+        "--wait",
+        action="store_true",
+        help="Se o banco estiver fora, espera ele voltar em vez de desistir.",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+    )
+
+    replayed = drain_journal(args.path, wait=args.wait)
+    if replayed is None:
+        raise SystemExit(1)
+    print(f"{replayed} resultados regravados a partir de '{args.path}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+from collections import Counter, defaultdict
+
+from log_setup import JSON_LOG_FILE
+
+# --- Configurações ---
+PERCENTILES = (50, 95, 99)
+TOP_ERRORS = 5
+# Etapas por CNS que encerram uma tentativa (ver log_setup.fields).
+OUTCOME_STAGES = ("done", "not_found", "retry", "gave_up")
+
+
+def log_files(path):
+    """O log atual e os rotacionados (.gz) ao lado dele."""
+    files = sorted(glob.glob(f"{glob.escape(path)}.*.gz"))
+    return files + ([path] if os.path.exists(path) else [])
+
+
+def iter_entries(path):
+    """Lê as linhas JSON de todos os arquivos do log, ignorando linhas inválidas."""
+    for filename in log_files(path):
+        opener = gzip.open if filename.endswith(".gz") else open
+        with opener(filename, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def percentile(ordered, q):
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def error_signature(message):
+    """Mensagem de erro sem CNS nem números, para agrupar falhas iguais."""
+    return re.sub(r"\d+(\.\d+)?", "#", message)[:120]
+
+
+def aggregate(entries):
+    """Agrupa as linhas por execução: contagens, falhas e latências por etapa."""
+    runs = defaultdict(
+        lambda: {
+            "start": None,
+            "end": None,
+            "stages": Counter(),
+            "failures": Counter(),
+            "durations": defaultdict(list),
+            "errors": Counter(),
+        }
+    )
+    for entry in entries:
+        run = runs[entry.get("run", "?")]
+        ts = entry.get("ts")
+        if ts:
+            run["start"] = min(run["start"] or ts, ts)
+            run["end"] = max(run["end"] or ts, ts)
+        stage = entry.get("stage")
+        if stage:
+            run["stages"][stage] += 1
+            if "duration" in entry:
+                run["durations"][stage].append(entry["duration"])
+            if stage in ("retry", "gave_up"):
+                run["failures"][entry.get("category", "?")] += 1
+        if entry.get("level") in ("ERROR", "CRITICAL") and not stage:
+            run["errors"][error_signature(entry.get("msg", ""))] += 1
+
+    report = {}
+    for run_id, run in sorted(runs.items(), key=lambda item: item[1]["start"] or ""):
+        latency = {}
+        for stage, values in sorted(run["durations"].items()):
+            ordered = sorted(values)
+            latency[stage] = {
+                "count": len(ordered),
+                **{f"p{q}": round(percentile(ordered, q), 3) for q in PERCENTILES},
+            }
+        report[run_id] = {
+            "start": run["start"],
+            "end": run["end"],
+            "stages": dict(run["stages"]),
+            "failures": dict(run["failures"]),
+            "latency": latency,
+            "top_errors": run["errors"].most_common(TOP_ERRORS),
+        }
+    return report
+
+
+def print_report(report):
+    for run_id, run in report.items():
+        stages = run["stages"]
+        attempts = sum(stages.get(stage, 0) for stage in OUTCOME_STAGES)
+        print(f"Execução {run_id}  ({run['start']} -> {run['end']})")
+        print(
+            f"  concluídos={stages.get('done', 0)}  "
+            f"não encontrados={stages.get('not_found', 0)}  "
+            f"novas tentativas={stages.get('retry', 0)}  "
+            f"desistências={stages.get('gave_up', 0)}  "
+            f"cache={stages.get('cache', 0)}"
+        )
+        if attempts:
+            failed = stages.get("retry", 0) + stages.get("gave_up", 0)
+            print(f"  taxa de falha por tentativa: {failed / attempts:.1%}")
+        if run["failures"]:
+            by_category = ", ".join(
+                f"{category}={count}"
+                for category, count in sorted(run["failures"].items())
+            )
+            print(f"  falhas por categoria: {by_category}")
+        if run["latency"]:
+            print(
+                f"  {'etapa':<16}{'n':>8}{'p50 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}"
+            )
+            for stage, stats in run["latency"].items():
+                print(
+                    f"  {stage:<16}{stats['count']:>8}{stats['p50']:>10.3f}"
+                    f"{stats['p95']:>10.3f}{stats['p99']:>10.3f}"
+                )
+        for signature, count in run["top_errors"]:
+            print(f"  {count:>6}x {signature}")
+        print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Relatório de falhas e latência por execução, a partir do "
+        "log estruturado do scraper (inclui os arquivos rotacionados .gz)."
+    )
+    parser.add_argument("--path", default=JSON_LOG_FILE)
+    parser.add_argument("--run", help="Mostra só esta execução.")
+    parser.add_argument(
+        "--last", type=int, default=None, help="Mostra só as N execuções mais recentes."
+    )
+    parser.add_argument("--json", action="store_true", help="Saída em JSON.")
+    args = parser.parse_args(argv)
+
+    report = aggregate(iter_entries(args.path))
+    if args.run:
+        report = {k: v for k, v in report.items() if k == args.run}
+    if args.last:
+        report = dict(list(report.items())[-args.last :])
+    if not report:
+        print(f"Nenhuma execução encontrada em '{args.path}'.")
+        return
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
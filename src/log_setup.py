@@ -0,0 +1,125 @@
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import uuid
+from datetime import datetime
+
+# --- Configurações ---
+JSON_LOG_FILE = "logs/scraper.jsonl"
+LOG_MAX_MB = 50  # Rotação por tamanho (padrão)
+LOG_BACKUPS = 10  # Arquivos rotacionados (.gz) mantidos
+CONSOLE_FORMAT = "%(asctime)s [%(levelname)s] [%(threadName)s] - %(message)s"
+# Campos estruturados aceitos no `extra=` das chamadas de logging (ver `fields`).
+STRUCTURED_FIELDS = ("cns", "stage", "attempt", "duration", "category")
+
+# Identifica a execução em todas as linhas do log, para o log_report.py.
+RUN_ID = uuid.uuid4().hex[:8]
+
+
+def fields(cns=None, stage=None, attempt=None, duration=None, category=None):
+    """
+    Campos estruturados de uma linha de log, para o `extra=` do logging:
+
+        logging.info("...", extra=fields(cns, "done", attempt, duration))
+    """
+    values = {
+        "cns": cns,
+        "stage": stage,
+        "attempt": attempt,
+        "duration": round(duration, 4) if duration is not None else None,
+        "category": category,
+    }
+    return {key: value for key, value in values.items() if value is not None}
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com os campos estruturados quando houver."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "run": getattr(record, "run", RUN_ID),
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for name in STRUCTURED_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RunIdFilter(logging.Filter):
+    def filter(self, record):
+        record.run = RUN_ID
+        return True
+
+
+def gzip_rotator(source, dest):
+    """Comprime o arquivo que acabou de ser rotacionado."""
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def make_file_handler(path, max_mb=LOG_MAX_MB, when=None, backups=LOG_BACKUPS):
+    """
+    Handler do arquivo JSONL, rotacionado por tamanho (`max_mb`) ou, com
+    `when` ('midnight', 'H'...), por tempo. Os arquivos antigos viram .gz.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if when:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=when, backupCount=backups, encoding="utf-8"
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path,
+            maxBytes=int(max_mb * 1024 * 1024),
+            backupCount=backups,
+            encoding="utf-8",
+        )
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = gzip_rotator
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def setup_logging(path=JSON_LOG_FILE, max_mb=LOG_MAX_MB, when=None, console=True):
+    """
+    Configura o logging da execução fora do caminho crítico do scraping.
+
+    As threads só colocam o registro numa fila (QueueHandler); a escrita no
+    console e no arquivo JSONL acontece numa thread de fundo (QueueListener).
+    Retorna o listener, que deve ser parado com `.stop()` no fim da execução
+    para descarregar a fila.
+    """
+    handlers = [make_file_handler(path, max_mb, when)]
+    if console:
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(stream)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RunIdFilter())
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(logging.INFO)
+    listener.start()
+    return listener
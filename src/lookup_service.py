@@ -0,0 +1,523 @@
+import argparse
+import bisect
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from storage import (
+    DATA_COLUMNS,
+    NORMALIZED_COLUMNS,
+    STATUS_CONCLUIDO,
+    TABLE_NAME,
+    StorageUnavailableError,
+    get_storage,
+)
+
+# Serviço local de consulta, só leitura, sobre a tabela enriquecida.
+#
+# Um snapshot das linhas concluídas fica em memória, indexado por CNS, UF,
+# cidade e CEP; as consultas nunca vão ao banco. Uma thread de fundo busca de
+# tempos em tempos só as linhas alteradas desde a última carga, pelo índice de
+# ModifiedAt, e troca o índice inteiro de uma vez. A cada FULL_RELOAD_SECONDS
+# a carga é completa, o que tira do índice as linhas que deixaram de estar
+# concluídas.
+#
+#   GET  /cartorio/<CNS>                                 um cartório
+#   POST /cartorios  {"cns": [...]}                      vários CNS de uma vez
+#   GET  /cartorios?uf=SP&cidade=Campinas&cep=130&limit= por UF, cidade e/ou CEP
+#   GET  /health                                         tamanho do índice e do cache
+
+# --- Configurações ---
+DEFAULT_LOOKUP_PORT = 8780
+RELOAD_SECONDS = 300  # Intervalo entre as cargas incrementais
+FULL_RELOAD_SECONDS = 3600  # Intervalo entre as cargas completas
+CACHE_SIZE = 10_000  # Respostas guardadas no LRU
+FETCH_SIZE = 10_000  # Linhas lidas do banco por vez
+DEFAULT_LIMIT = 100  # Itens por resposta das buscas por UF/CEP
+MAX_LIMIT = 5_000
+MAX_BATCH = 5_000  # CNS por requisição em lote
+# A carga incremental volta este tanto antes da marca d'água, para pegar linhas
+# confirmadas depois da leitura anterior com um ModifiedAt mais antigo.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+COLUMNS = ["CNS"] + DATA_COLUMNS + NORMALIZED_COLUMNS + ["data_extracao"]
+UF_POSITION = COLUMNS.index("UF")
+CEP_POSITION = COLUMNS.index("CEP")
+NOME_POSITION = COLUMNS.index("NomeCartorio")
+
+# A tabela não tem uma coluna de cidade (o Endereco vai só até o bairro); ela
+# sai do nome do cartório, como em "2º TABELIÃO DE NOTAS DE SANTANA DE
+# PARNAÍBA - SP" ou "OFICIAL DE REGISTRO CIVIL DA COMARCA DE CAMPINAS - SP": a
+# cidade é o que vem depois do último trecho que descreve o serviço.
+NAME_PREPOSITIONS = re.compile(r"(\s+D(?:A|E|O|AS|OS)\s+)")
+NAME_UF_SUFFIX = re.compile(r"\s*-\s*[A-Z]{2}\s*$")
+SERVICE_WORDS = {
+    "CARTORIO",
+    "CASAMENTOS",
+    "CIRCUNSCRICAO",
+    "CIVIL",
+    "COMARCA",
+    "CONTRATOS",
+    "DISTRIBUICAO",
+    "DISTRIBUIDOR",
+    "DISTRITO",
+    "DOCUMENTOS",
+    "IMOVEIS",
+    "INTERDICOES",
+    "JURIDICA",
+    "JURIDICAS",
+    "LETRAS",
+    "MUNICIPIO",
+    "NASCIMENTOS",
+    "NATURAIS",
+    "NOTAS",
+    "OBITOS",
+    "OFICIAL",
+    "OFICIO",
+    "PAZ",
+    "PESSOA",
+    "PESSOAS",
+    "PROTESTO",
+    "PROTESTOS",
+    "REGISTRO",
+    "REGISTROS",
+    "SEDE",
+    "SERVENTIA",
+    "SERVICO",
+    "SERVICOS",
+    "SUBDISTRITO",
+    "TABELIAO",
+    "TABELIONATO",
+    "TITULOS",
+    "TUTELAS",
+    "ZONA",
+}
+
+
+def cep_digits(cep):
+    return "".join(ch for ch in str(cep or "") if ch.isdigit())
+
+
+def fold(text):
+    """Maiúsculas sem acentos, para comparar nomes de cidade."""
+    decomposed = unicodedata.normalize("NFKD", str(text or ""))
+    return " ".join(
+        "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+        .upper()
+        .split()
+    )
+
+
+def city_from_name(nome):
+    """
+    Cidade (já em `fold`) no nome do cartório, ou "" se o nome não a traz.
+
+    Na dúvida não chuta: "1º TABELIONATO DE NOTAS - SP" não tem cidade.
+    """
+    name = NAME_UF_SUFFIX.sub("", fold(nome))
+    pieces = NAME_PREPOSITIONS.split(name)
+    # Trechos nas posições pares, preposições nas ímpares.
+    for position in range(len(pieces) - 1, -1, -2):
+        words = pieces[position].replace(",", " ").split()
+        if not words:
+            continue
+        if words[0] in SERVICE_WORDS or any(ch.isdigit() for ch in words[0]):
+            return "".join(pieces[position + 2 :]).strip()
+    return ""
+
+
+class LookupIndex:
+    """
+    Snapshot imutável da tabela: cada linha é uma tupla na ordem de COLUMNS.
+
+    `by_uf` e `by_city` guardam os CNS de cada UF e de cada cidade (ver
+    `city_from_name`); `by_cep` é uma lista ordenada de (dígitos do CEP,
+    CNS), em que um prefixo de CEP vira um intervalo encontrado por busca
+    binária. Uma carga nova gera outro índice, então as threads que estão
+    respondendo nunca veem um índice pela metade.
+    """
+
+    def __init__(self, records=None, watermark=None, generation=0):
+        self.records = records or {}
+        self.watermark = watermark
+        self.generation = generation  # Entra na chave do cache de respostas
+        self.by_uf = {}
+        self.by_city = {}
+        self.cities = {}
+        cep_keys = []
+        for cns, row in self.records.items():
+            self.by_uf.setdefault(row[UF_POSITION] or "", []).append(cns)
+            city = city_from_name(row[NOME_POSITION])
+            if city:
+                self.cities[cns] = city
+                self.by_city.setdefault(city, []).append(cns)
+            digits = cep_digits(row[CEP_POSITION])
+            if digits:
+                cep_keys.append((digits, cns))
+        for cns_list in self.by_uf.values():
+            cns_list.sort()
+        for cns_list in self.by_city.values():
+            cns_list.sort()
+        cep_keys.sort()
+        self.by_cep = cep_keys
+        self._cep_values = [digits for digits, _ in cep_keys]
+
+    def with_rows(self, rows, watermark):
+        """Novo índice com `rows` (linhas novas ou alteradas) aplicadas sobre este."""
+        records = dict(self.records)
+        for row in rows:
+            records[row[0]] = tuple(row)
+        return LookupIndex(records, watermark, self.generation + 1)
+
+    def get(self, cns):
+        row = self.records.get(cns)
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def search(self, uf=None, cep_prefix=None, city=None, limit=DEFAULT_LIMIT):
+        """
+        CNS da UF, da cidade (em `fold`) e/ou com CEP começando por
+        `cep_prefix`, em ordem. O filtro mais seletivo escolhe os candidatos.
+        """
+        if cep_prefix:
+            start = bisect.bisect_left(self._cep_values, cep_prefix)
+            # Todo CEP com o prefixo fica antes de prefixo + o maior caractere.
+            end = bisect.bisect_left(self._cep_values, cep_prefix + "\uffff")
+            candidates = (cns for _, cns in self.by_cep[start:end])
+            if city:
+                candidates = (cns for cns in candidates if self.cities.get(cns) == city)
+        elif city:
+            candidates = iter(self.by_city.get(city, []))
+        elif uf:
+            candidates = iter(self.by_uf.get(uf, []))
+        else:
+            return []
+        if uf and (cep_prefix or city):
+            candidates = (
+                cns for cns in candidates if self.records[cns][UF_POSITION] == uf
+            )
+        results = []
+        for cns in candidates:
+            results.append(self.get(cns))
+            if len(results) >= limit:
+                break
+        return results
+
+
+class LruCache:
+    """Respostas já serializadas das chaves mais consultadas."""
+
+    def __init__(self, max_items=CACHE_SIZE):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def fetch_rows(storage, watermark=None):
+    """
+    Linhas concluídas alteradas depois de `watermark`, menos a janela
+    WATERMARK_OVERLAP (todas, se None). Retorna (linhas, nova marca d'água).
+    """
+    sql = f"SELECT {', '.join(COLUMNS)} FROM {TABLE_NAME} WHERE Status = ?"
+    params = [STATUS_CONCLUIDO]
+    if watermark is not None:
+        sql += " AND ModifiedAt > ?"
+        params.append(watermark - WATERMARK_OVERLAP)
+    sql += " ORDER BY CNS"
+
+    # A marca é a hora do banco antes das linhas: o que for gravado durante a
+    # leitura volta de novo na próxima carga, em vez de se perder.
+    new_watermark = storage.database_now()
+    conn = storage.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = []
+        while True:
+            chunk = cursor.fetchmany(FETCH_SIZE)
+            if not chunk:
+                break
+            rows.extend(tuple(row) for row in chunk)
+    finally:
+        conn.close()
+    return rows, new_watermark
+
+
+class LookupService:
+    """
+    Mantém o índice atual e o recarrega de forma incremental.
+
+    A carga incremental só acrescenta ou atualiza linhas; uma linha que sai de
+    CONCLUIDO (voltou a PENDENTE, por exemplo) não muda ModifiedAt e não
+    seria notada. Por isso, a cada `full_reload_seconds` (0 = nunca) o índice
+    é refeito do zero.
+    """
+
+    def __init__(
+        self, storage, cache_size=CACHE_SIZE, full_reload_seconds=FULL_RELOAD_SECONDS
+    ):
+        self.storage = storage
+        self.cache = LruCache(cache_size)
+        self.index = LookupIndex()
+        self.full_reload_seconds = full_reload_seconds
+        self.loaded_at = None
+        self.full_loaded_at = None
+        self._reload_lock = threading.Lock()
+
+    def _full_reload_due(self):
+        if self.full_loaded_at is None:
+            return True
+        if self.full_reload_seconds <= 0:
+            return False
+        return time.time() - self.full_loaded_at >= self.full_reload_seconds
+
+    def reload(self):
+        """Aplica as linhas novas desde a última carga. Retorna quantas vieram."""
+        with self._reload_lock:
+            current = self.index
+            if self._full_reload_due():
+                rows, watermark = fetch_rows(self.storage)
+                records = {row[0]: row for row in rows}
+                self.index = LookupIndex(records, watermark, current.generation + 1)
+                self.full_loaded_at = time.time()
+            else:
+                rows, watermark = fetch_rows(self.storage, current.watermark)
+                # As linhas relidas pela janela de sobreposição, sem mudança,
+                # não geram um índice novo nem esvaziam o cache.
+                rows = [row for row in rows if current.records.get(row[0]) != row]
+                if rows:
+                    # Respostas do índice anterior saem do LRU aos poucos, sem
+                    # nunca serem servidas: a geração faz parte da chave.
+                    self.index = current.with_rows(rows, watermark)
+                else:
+                    current.watermark = watermark
+            self.loaded_at = time.time()
+            return len(rows)
+
+    def reload_forever(self, interval, stop_event):
+        while not stop_event.wait(interval):
+            try:
+                changed = self.reload()
+            except Exception as e:
+                logging.warning(f"Falha na carga incremental (mantendo o índice): {e}")
+                continue
+            if changed:
+                logging.info(f"Carga incremental: {changed} linhas atualizadas.")
+
+    def cached(self, index, key, build):
+        """
+        Resposta serializada de `key` no `index`, do LRU ou montada por
+        `build()`. Retorna None (sem guardar) se `build()` não achar nada.
+        """
+        key = (index.generation,) + key
+        payload = self.cache.get(key)
+        if payload is None:
+            body = build()
+            if body is None:
+                return None
+            payload = json.dumps(body, ensure_ascii=False, default=str).encode()
+            self.cache.put(key, payload)
+        return payload
+
+    def health(self):
+        return {
+            "rows": len(self.index.records),
+            "watermark": self.index.watermark,
+            "cities": len(self.index.by_city),
+            "loaded_at": self.loaded_at,
+            "full_loaded_at": self.full_loaded_at,
+            "cache_items": len(self.cache),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+        }
+
+
+def make_handler(service):
+    class LookupHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive: um cliente reaproveita a conexão
+        # Cabeçalho e corpo saem em escritas separadas; sem TCP_NODELAY, o
+        # Nagle segura o corpo até o ACK atrasado do cliente (~40 ms).
+        disable_nagle_algorithm = True
+
+        def _send(self, status, payload):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _send_json(self, status, body):
+            self._send(
+                status, json.dumps(body, ensure_ascii=False, default=str).encode()
+            )
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path.startswith("/cartorio/"):
+                cns = url.path[len("/cartorio/") :]
+                index = service.index
+                payload = service.cached(index, ("cns", cns), lambda: index.get(cns))
+                if payload is None:
+                    self._send_json(404, {"erro": f"CNS {cns} não encontrado."})
+                    return
+                self._send(200, payload)
+                return
+            if url.path == "/cartorios":
+                query = parse_qs(url.query)
+                uf = query.get("uf", [""])[0].upper() or None
+                cep = cep_digits(query.get("cep", [""])[0]) or None
+                city = fold(query.get("cidade", [""])[0]) or None
+                try:
+                    limit = min(int(query.get("limit", [DEFAULT_LIMIT])[0]), MAX_LIMIT)
+                except ValueError:
+                    self._send_json(400, {"erro": "limit deve ser um número."})
+                    return
+                if not uf and not cep and not city:
+                    self._send_json(400, {"erro": "Informe uf, cidade e/ou cep."})
+                    return
+                index = service.index
+                self._send(
+                    200,
+                    service.cached(
+                        index,
+                        ("busca", uf, cep, city, limit),
+                        lambda: index.search(uf, cep, city, limit),
+                    ),
+                )
+                return
+            if url.path == "/health":
+                self._send_json(200, service.health())
+                return
+            self._send_json(404, {"erro": "Rota não encontrada."})
+
+        def do_POST(self):
+            if urlsplit(self.path).path != "/cartorios":
+                self._send_json(404, {"erro": "Rota não encontrada."})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                cns_list = json.loads(self.rfile.read(length) or b"{}")["cns"]
+            except (ValueError, KeyError, TypeError):
+                self._send_json(400, {"erro": 'Envie {"cns": [...]} em JSON.'})
+                return
+            if not isinstance(cns_list, list) or len(cns_list) > MAX_BATCH:
+                self._send_json(
+                    400, {"erro": f"Envie uma lista de até {MAX_BATCH} CNS."}
+                )
+                return
+            index = service.index
+            found, missing = {}, []
+            for cns in cns_list:
+                record = index.get(str(cns))
+                if record is None:
+                    missing.append(cns)
+                else:
+                    found[record["CNS"]] = record
+            self._send_json(200, {"encontrados": found, "ausentes": missing})
+
+        def log_message(self, format, *args):
+            pass  # Milhares de consultas por segundo não cabem no log.
+
+    return LookupHandler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=f"Serviço HTTP local, só leitura, de consulta à tabela "
+        f"'{TABLE_NAME}', servido de um índice em memória."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_LOOKUP_PORT)
+    parser.add_argument(
+        "--reload-seconds",
+        type=float,
+        default=RELOAD_SECONDS,
+        help="Intervalo entre as cargas incrementais (0 = nunca recarrega).",
+    )
+    parser.add_argument(
+        "--full-reload-seconds",
+        type=float,
+        default=FULL_RELOAD_SECONDS,
+        help="Intervalo entre as cargas completas, que tiram do índice as linhas "
+        "que deixaram de estar concluídas (0 = só a carga inicial).",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=CACHE_SIZE,
+        help="Respostas mantidas no cache LRU.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+    )
+
+    service = LookupService(get_storage(), args.cache_size, args.full_reload_seconds)
+    start = time.perf_counter()
+    try:
+        service.reload()
+    except StorageUnavailableError:
+        logging.error("Não foi possível conectar ao banco de dados. Abortando.")
+        return
+    logging.info(
+        f"{len(service.index.records)} cartórios carregados em "
+        f"{time.perf_counter() - start:.1f}s."
+    )
+
+    stop_event = threading.Event()
+    if args.reload_seconds > 0:
+        threading.Thread(
+            target=service.reload_forever,
+            args=(args.reload_seconds, stop_event),
+            name="lookup-reload",
+            daemon=True,
+        ).start()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    server.daemon_threads = True
+    logging.info(
+        f"Consulta disponível em http://{args.host}:{args.port}/cartorio/<CNS>"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
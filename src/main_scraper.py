@@ -1,266 +1,233 @@
+import argparse
+import asyncio
 import logging
 import sys
+import threading
 import time
-from collections import defaultdict
-from db import get_db_connection
-
-# Selenium Imports
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import (
-    TimeoutException,
-    NoSuchElementException,
-    WebDriverException,
-    UnexpectedAlertPresentException,  # Mais específico para alertas
+import uuid
+from collections import defaultdict, deque
+from job_queue import (
+    claim_batch,
+    get_pending_cns,
+    mark_not_found,
+    record_failure,
+    release_claims,
+    update_cartorio_data,
+)
+from rate_limit import RateLimiter
+from write_buffer import WriteBehindBuffer
+from journal import DEFAULT_JOURNAL_PATH, CheckpointJournal, drain_journal
+from retry_scheduler import CircuitBreaker, RetryScheduler, classify_failure
+from storage import DbWriteError
+from http_engine import HttpEngine, HttpEngineError, parse_panel
+from html_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_MB, DEFAULT_TTL_DAYS, HtmlCache
+from metrics import DEFAULT_METRICS_PORT, METRICS, start_metrics_server
+import log_setup
+from log_setup import fields
+from browser_profile import (
+    DEFAULT_PROFILE,
+    PROFILES,
+    blocked_url_patterns,
+    make_request_blocker,
+)
+from extraction import (
+    CNS_NOT_FOUND_ALERT,
+    DEFAULT_NOT_FOUND_TEXT,
+    CnsNaoCadastradoError,
+    parse_panel_html,
 )
 
+# O Selenium (driver_pool, form_session, browser_profile.build_chrome_options e
+# as exceções do WebDriver) é importado só nos caminhos que abrem um navegador:
+# o motor async e o --reparse-from-cache rodam sem ele instalado.
+
 # --- Configurações ---
 URL_ALVO = "https://ridigital.org.br/CartorioNacional/CartorioNacional.aspx"
-TABLE_NAME = "cartorios_enriquecidos"
-LOG_FILE = "logs/scraper.log"
-DEFAULT_NOT_FOUND_TEXT = "Não informado"
-STATUS_CNS_NOT_FOUND = "CNS NÃO ENCONTRADO NO SITE"
+RUN_SUMMARY_FILE = "logs/run_summary.json"
 MAX_RETRIES = 3
+# Modo worker pool: quantidade de CNS reivindicados por vez e teto de
+# requisições por segundo ao site-alvo, somando todos os workers.
+DEFAULT_WORKERS = 1
+CLAIM_BATCH_SIZE = 20
+MAX_REQUESTS_PER_SECOND = 2.0
+# Modo refresh: teto de consultas ao site por hora, espalhadas ao longo da hora.
+REFRESH_BUDGET_PER_HOUR = 600
 
-# Novo: Set com todas as UFs do Brasil para validação
-UFS_BRASIL = {
-    "AC",
-    "AL",
-    "AP",
-    "AM",
-    "BA",
-    "CE",
-    "DF",
-    "ES",
-    "GO",
-    "MA",
-    "MT",
-    "MS",
-    "MG",
-    "PA",
-    "PB",
-    "PR",
-    "PE",
-    "PI",
-    "RJ",
-    "RN",
-    "RS",
-    "RO",
-    "RR",
-    "SC",
-    "SP",
-    "SE",
-    "TO",
-}
-
-
-# --- Configuração do Logging ---
-# Configura um logger para registrar sucessos e falhas em um arquivo.
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE, mode="a", encoding="utf-8"),
-        logging.StreamHandler(),  # Também exibe os logs no console
-    ],
-)
 
+def setup_logging(args):
+    """
+    Logging assíncrono: console em texto e `logs/scraper.jsonl` estruturado,
+    rotacionado e comprimido (ver log_setup.py). Retorna o QueueListener.
+    """
+    return log_setup.setup_logging(args.log_file, args.log_max_mb, args.log_rotate_when)
 
-def get_pending_cns():
-    """Busca no banco de dados os CNS que ainda não foram processados."""
-    conn = get_db_connection()
-    if not conn:
-        logging.critical("Não foi possível conectar ao banco para buscar tarefas.")
-        sys.exit(1)
 
-    try:
-        with conn.cursor() as cursor:
-            # A lógica de "resumível": pegamos apenas onde o NomeCartorio é nulo.
-            # Isso indica que o enriquecimento ainda não ocorreu.
-            cursor.execute(
-                f"SELECT CNS FROM {TABLE_NAME} WHERE NomeCartorio IS NULL OR NomeCartorio = ''"
-            )
-            cns_list = [row.CNS for row in cursor.fetchall()]
-            logging.info(f"Encontrados {len(cns_list)} CNS pendentes de processamento.")
-            return cns_list
-    except Exception as e:
-        logging.error(f"Erro ao buscar CNS pendentes: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+def fetch_panel_html(driver, cns, url=URL_ALVO, reuse_form=False):
+    """
+    Consulta um CNS no navegador e retorna o `outerHTML` do painel de resultados.
 
+    Uma única chamada ao WebDriver traz o snapshot inteiro; a extração dos
+    campos acontece offline, em extraction.parse_panel_html. Com `reuse_form`,
+    a página já carregada é reaproveitada (ver form_session.py).
+    """
+    from form_session import query_panel
 
-def extract_element_text(driver, by, value, default=DEFAULT_NOT_FOUND_TEXT):
-    """Função auxiliar para extrair texto de um elemento de forma segura."""
-    try:
-        text = driver.find_element(by, value).text.strip()
-        return text if text else default  # Retorna o default se o texto for vazio
-    except NoSuchElementException:
-        return default
+    return query_panel(driver, cns, url, reuse_form)
 
 
-def scrape_cns_data(driver, cns):
+def scrape_cns_data(driver, cns, url=URL_ALVO):
     """Executa o scraping para um único CNS e retorna um dicionário com os dados."""
-    driver.get(URL_ALVO)
-
-    # Digita o CNS e espera o painel de informações aparecer
-    input_cns = WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located((By.XPATH, '//*[@id="txtListaCartoriosCNS"]'))
-    )
-    input_cns.clear()
-    input_cns.send_keys(cns)
-
-    # Espera explícita pela visibilidade do painel de resultados. Essencial!
-    WebDriverWait(driver, 15).until(
-        EC.visibility_of_element_located(
-            (By.XPATH, '//*[@id="panelDadosCartorio"]/div')
-        )
-    )
-
-    # Extração dos dados usando os XPaths fornecidos
-    data = {}
-    data["NomeCartorio"] = extract_element_text(driver, By.XPATH, '//*[@id="lblRazao"]')
-    data["Tabeliao"] = extract_element_text(
-        driver, By.XPATH, '//*[@id="lblResponsavel"]'
-    )
-
-    # Concatenação de endereço
-    logradouro = extract_element_text(driver, By.XPATH, '//*[@id="lblLogradouro"]')
-    numero = extract_element_text(driver, By.XPATH, '//*[@id="lblNumero"]')
-    complemento = extract_element_text(driver, By.XPATH, '//*[@id="lblComplemento"]')
-    bairro = extract_element_text(driver, By.XPATH, '//*[@id="lblBairro"]')
+    return parse_panel_html(fetch_panel_html(driver, cns, url))
 
-    # Monta o endereço apenas com as partes que existem
-    address_parts = [logradouro, numero, complemento, bairro]
-    # Filtra para não incluir "Não informado" na string final
-    valid_parts = [part for part in address_parts if part != DEFAULT_NOT_FOUND_TEXT]
-    data["Endereco"] = ", ".join(valid_parts) if valid_parts else DEFAULT_NOT_FOUND_TEXT
 
-    data["CEP"] = extract_element_text(driver, By.XPATH, '//*[@id="lblCep"]')
+def scrape_with_engine(cns, drivers, driver, http_engine, url=URL_ALVO, cache=None):
+    """
+    Consulta um CNS pelo caminho HTTP, caindo para o Selenium se ele falhar.
 
-    # Concatenação de telefone
-    ddd = extract_element_text(driver, By.XPATH, '//*[@id="lblDDDTelefone"]')
-    telefone_num = extract_element_text(driver, By.XPATH, '//*[@id="lblTelefone"]')
-
-    if ddd != DEFAULT_NOT_FOUND_TEXT and telefone_num != DEFAULT_NOT_FOUND_TEXT:
-        data["Telefone"] = f"({ddd}) {telefone_num}"
-    else:
-        data["Telefone"] = DEFAULT_NOT_FOUND_TEXT
-
-    data["Email"] = extract_element_text(driver, By.XPATH, '//*[@id="lblEmail"]')
-
-    # Para 'Site' e 'Atribuições', o texto vem após o <b>. O XPath precisa ser ajustado.
-    # XPath para pegar o nó de texto seguinte a um elemento <b> específico.
-    site_text = extract_element_text(
-        driver, By.XPATH, '//*[@id="panelDadosCartorio"]/div/ul/li[6]'
-    )
-    if "Site:" in site_text:
-        data["Site"] = site_text.replace("Site:", "").strip()
-    else:
-        data["Site"] = (
-            site_text  # Se não encontrar o "Site:", pode ser o próprio valor ou "Não informado"
+    Retorna a tupla (data, driver), pois o navegador pode ter sido obtido do
+    pool (`drivers`) aqui, ou reciclado após atingir o limite de páginas.
+    Com um `cache` (HtmlCache), o HTML bruto de painéis completos é guardado
+    para permitir reprocessar o parsing sem voltar ao site.
+    """
+    html = data = None
+    if http_engine is not None:
+        try:
+            with METRICS.timer("http_request"):
+                html = http_engine.fetch_panel_html(cns)
+            with METRICS.timer("extract"):
+                data = parse_panel(html)
+        except HttpEngineError as e:
+            METRICS.inc("http_fallbacks")
+            logging.warning(f"CNS {cns}: Caminho HTTP falhou ({e}). Usando o Selenium.")
+
+    if data is None:
+        if driver is None:
+            driver = drivers.acquire()
+        html = fetch_panel_html(driver, cns, url, drivers.reuse_form)
+        driver = drivers.page_done(driver)
+        with METRICS.timer("extract"):
+            data = parse_panel_html(html)
+
+    nome = data.get("NomeCartorio")
+    if cache is not None and nome and nome != DEFAULT_NOT_FOUND_TEXT:
+        cache.put(cns, html)
+    return data, driver
+
+
+def register_failure(retry_counts, cns, error, retries, breaker=None, duration=None):
+    """
+    Classifica a falha, persiste-a no banco (Attempts/LastError) e agenda a
+    nova tentativa no `retries` (RetryScheduler), com backoff por categoria.
+
+    A contagem vem do banco, então tentativas de execuções anteriores também
+    contam para o MAX_RETRIES; se o banco não responder, conta em memória.
+    """
+    category = classify_failure(error)
+    METRICS.inc("retries")
+    METRICS.inc(f"failure_{category}")
+    if breaker is not None:
+        breaker.record_failure(category)
+    attempts = record_failure(cns, f"[{category}] {error}", MAX_RETRIES)
+    retry_counts[cns] = attempts if attempts is not None else retry_counts[cns] + 1
+    if retry_counts[cns] >= MAX_RETRIES:
+        # record_failure já marcou o CNS como ERRO (ou, numa reconsulta, adiou
+        # o NextRefreshAt mantendo-o CONCLUIDO).
+        logging.critical(
+            f"CNS {cns}: Excedeu o limite de {MAX_RETRIES} tentativas. Pulando permanentemente.",
+            extra=fields(cns, "gave_up", retry_counts[cns], duration, category),
         )
-
-    atribuicoes_text = extract_element_text(
-        driver, By.XPATH, '//*[@id="panelDadosCartorio"]/div/ul/li[7]'
-    )
-    if "Serviços ativados ao cartório:" in atribuicoes_text:
-        data["Atribuicoes"] = atribuicoes_text.replace(
-            "Serviços ativados ao cartório:", ""
-        ).strip()
-    else:
-        data["Atribuicoes"] = atribuicoes_text
-
-    # Lógica de extração da UF aprimorada e corrigida
-    nome_cartorio = data.get("NomeCartorio", "")
-    data["UF"] = ""  # Define um valor padrão
-    if nome_cartorio:
-        # Divide o nome por espaços e hífens para pegar a última palavra
-        parts = nome_cartorio.replace("-", " ").split()
-        if parts:
-            last_part = parts[-1].strip().upper()
-            # Verifica se a última parte é uma UF válida
-            if last_part in UFS_BRASIL:
-                data["UF"] = last_part
-
-    return data
-
-
-def update_cartorio_data(cns, data):
-    """Atualiza um registro no banco de dados com os dados extraídos."""
-    conn = get_db_connection()
-    if not conn:
-        logging.error(f"CNS {cns}: Falha ao conectar no banco para salvar dados.")
-        return False
-
-    # Prepara o SQL UPDATE dinamicamente
-    # Filtra chaves com valores nulos ou vazios para não sobrescrever dados existentes com nada
-    update_data = {k: v for k, v in data.items() if v}
-    if not update_data:
-        logging.warning(f"CNS {cns}: Nenhum dado novo para atualizar.")
-        return True  # Considera sucesso pois não há o que fazer
-
-    set_clause = ", ".join([f"{key} = ?" for key in update_data.keys()])
-    sql = (
-        f"UPDATE {TABLE_NAME} SET {set_clause}, data_extracao = GETDATE() WHERE CNS = ?"
+        return
+    delay = retries.schedule(cns, category, retry_counts[cns])
+    logging.info(
+        f"CNS {cns}: Falha '{category}'. Nova tentativa em {delay:.1f}s.",
+        extra=fields(cns, "retry", retry_counts[cns], duration, category),
     )
-    params = list(update_data.values()) + [cns]
 
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(sql, params)
-        conn.commit()
-        logging.info(f"CNS {cns}: Dados salvos com sucesso.")
-        return True
-    except Exception as e:
-        logging.error(f"CNS {cns}: Erro ao salvar no banco: {e}")
-        conn.rollback()
-        return False
-    finally:
-        if conn:
-            conn.close()
 
+def process_cns_list(
+    cns_list,
+    drivers,
+    driver=None,
+    rate_limiter=None,
+    http_engine=None,
+    url=URL_ALVO,
+    writer=None,
+    cache=None,
+    retries=None,
+    retry_counts=None,
+    breaker=None,
+    drain=True,
+):
+    """
+    Processa uma lista de CNS com um navegador, aplicando a lógica de retries.
+
+    Recebe e devolve o driver para que um worker possa reaproveitar o mesmo
+    navegador entre lotes; navegadores novos vêm do DriverPool `drivers`, ao
+    qual o chamador deve devolver o driver no final. Após um erro a sessão é
+    recuperada no próprio navegador sempre que possível, sem reiniciá-lo.
+    Com um `http_engine`, o navegador só é aberto quando o caminho HTTP falha.
+    Com um `writer` (WriteBehindBuffer), os resultados são gravados em lote.
+    Com um `cache` (HtmlCache), CNS com HTML recente não geram consulta ao site.
+
+    Um CNS que falha não trava a fila: vai para o `retries` (RetryScheduler)
+    e só volta quando o seu backoff vence, enquanto os demais seguem. Com
+    `drain`, a função espera as novas tentativas antes de retornar; sem ele,
+    as ainda agendadas ficam no `retries` do chamador. Com um `breaker`
+    (CircuitBreaker), as consultas param enquanto o site estiver fora.
+    """
+    from selenium.common.exceptions import (
+        TimeoutException,
+        WebDriverException,
+        UnexpectedAlertPresentException,  # Mais específico para alertas
+    )
 
-def main():
-    """Função principal que orquestra o processo de scraping."""
-    cns_list = get_pending_cns()
+    if retries is None:
+        retries = RetryScheduler()
+    if retry_counts is None:
+        retry_counts = defaultdict(int)
+    queue = deque(cns_list)
     total = len(cns_list)
 
-    if total == 0:
-        logging.info("Nenhum CNS para processar. Trabalho concluído.")
-        return
-
-    options = webdriver.ChromeOptions()
-    options.add_argument("--start-maximized")
-    # options.add_argument("--headless")
-
-    driver = None
-    retry_counts = defaultdict(int)
-
-    i = 0
-    while i < len(cns_list):
-        cns = cns_list[i]
-
-        if retry_counts[cns] >= MAX_RETRIES:
-            logging.critical(
-                f"CNS {cns}: Excedeu o limite de {MAX_RETRIES} tentativas. Pulando permanentemente."
-            )
-            # REQUERIMENTO: Não fazer nada no banco, apenas pular.
-            i += 1
-            continue
+    while True:
+        cns = retries.pop_due()
+        if cns is None:
+            if queue:
+                cns = queue.popleft()
+            elif drain and len(retries):
+                time.sleep(retries.next_due_in())
+                continue
+            else:
+                break
 
+        network = False
+        attempt = retry_counts[cns] + 1
+        started = time.perf_counter()
         try:
-            if driver is None:
-                logging.info("Iniciando uma nova instância do navegador...")
-                driver = webdriver.Chrome(options=options)
-
             logging.info(
-                f"--- Processando {i+1}/{total}: CNS {cns} (Tentativa {retry_counts[cns] + 1}) ---"
+                f"--- Processando {total - len(queue)}/{total}: CNS {cns} (Tentativa {attempt}) ---",
+                extra=fields(cns, "start", attempt),
             )
-            scraped_data = scrape_cns_data(driver, cns)
+            cached_html = cache.get(cns) if cache else None
+            if cached_html is not None:
+                logging.info(
+                    f"CNS {cns}: HTML encontrado no cache, sem consulta ao site.",
+                    extra=fields(cns, "cache", attempt),
+                )
+                METRICS.inc("cache_hits")
+                with METRICS.timer("extract"):
+                    scraped_data = parse_panel_html(cached_html)
+            else:
+                network = True
+                if breaker is not None:
+                    breaker.wait()
+                if rate_limiter:
+                    rate_limiter.acquire()
+                with METRICS.timer("scrape"):
+                    scraped_data, driver = scrape_with_engine(
+                        cns, drivers, driver, http_engine, url, cache
+                    )
+                if breaker is not None:
+                    breaker.record_success()
 
             if (
                 not scraped_data.get("NomeCartorio")
@@ -268,22 +235,48 @@ def main():
             ):
                 raise ValueError("Extração falhou, Nome do Cartório não encontrado.")
 
-            if update_cartorio_data(cns, scraped_data):
-                i += 1  # Sucesso! Avança para o próximo CNS.
+            if writer:
+                writer.add(
+                    cns, scraped_data
+                )  # A gravação em lote ocorre em segundo plano.
             else:
-                # Se a atualização do banco falhar, trata como um erro recuperável
-                raise Exception("Falha ao salvar os dados no banco de dados.")
+                with METRICS.timer("db_write"):
+                    saved = update_cartorio_data(cns, scraped_data)
+                if not saved:
+                    # Se a atualização do banco falhar, trata como um erro recuperável
+                    raise DbWriteError("Falha ao salvar os dados no banco de dados.")
+            METRICS.inc("scraped")
+            elapsed = time.perf_counter() - started
+            logging.info(
+                f"CNS {cns}: Dados extraídos em {elapsed:.2f}s.",
+                extra=fields(cns, "done", attempt, elapsed),
+            )
 
-            time.sleep(1)
+        except CnsNaoCadastradoError:
+            # Mesmo tratamento do alerta abaixo, detectado pelo caminho HTTP.
+            logging.warning(
+                f"CNS {cns}: O site informou 'CNS não cadastrado'. Pulando.",
+                extra=fields(cns, "not_found", attempt, time.perf_counter() - started),
+            )
+            METRICS.inc("not_found")
+            if breaker is not None:
+                breaker.record_success()  # O site respondeu normalmente.
+            mark_not_found(cns)
 
         except UnexpectedAlertPresentException as e:
             # Tratamento específico para o alerta "CNS não cadastrado"
-            if e.alert_text and "CNS não cadastrado" in e.alert_text:
+            if e.alert_text and CNS_NOT_FOUND_ALERT in e.alert_text:
                 logging.warning(
-                    f"CNS {cns}: O site informou 'CNS não cadastrado'. Pulando."
+                    f"CNS {cns}: O site informou 'CNS não cadastrado'. Pulando.",
+                    extra=fields(
+                        cns, "not_found", attempt, time.perf_counter() - started
+                    ),
                 )
-                # REQUERIMENTO: Não fazer nada no banco, apenas pular.
-                i += 1  # Pula para o próximo CNS, sem novas tentativas.
+                # Persiste o resultado para que o CNS nunca volte à fila.
+                METRICS.inc("not_found")
+                if breaker is not None:
+                    breaker.record_success()
+                mark_not_found(cns)
                 try:
                     if driver:
                         driver.switch_to.alert.accept()
@@ -292,37 +285,529 @@ def main():
             else:
                 # Se for outro tipo de alerta, usa a lógica de retry normal
                 logging.error(
-                    f"CNS {cns}: Alerta inesperado: {e.alert_text}. Reiniciando o driver."
+                    f"CNS {cns}: Alerta inesperado: {e.alert_text}. Recuperando o driver."
+                )
+                register_failure(
+                    retry_counts,
+                    cns,
+                    e,
+                    retries,
+                    breaker,
+                    time.perf_counter() - started,
                 )
-                retry_counts[cns] += 1
                 # Limpa o estado do driver após um alerta desconhecido
-                if driver:
-                    driver.quit()
-                driver = None
-                time.sleep(2)
+                driver = drivers.recover(driver)
+
+        except DbWriteError as e:
+            # O navegador está bom; só a gravação falhou.
+            logging.error(f"CNS {cns}: {e}")
+            register_failure(
+                retry_counts,
+                cns,
+                e,
+                retries,
+                breaker,
+                time.perf_counter() - started,
+            )
 
         except (TimeoutException, WebDriverException, ValueError) as e:
             logging.error(
-                f"CNS {cns}: Falha no processamento. Causa: {e}. O navegador será reiniciado."
+                f"CNS {cns}: Falha no processamento. Causa: {e}. Recuperando o navegador."
+            )
+            register_failure(
+                retry_counts,
+                cns,
+                e,
+                retries,
+                breaker,
+                time.perf_counter() - started,
             )
-            retry_counts[cns] += 1
-            if driver:
-                driver.quit()
-            driver = None
-            time.sleep(5)
+            driver = drivers.recover(driver)
         except Exception as e:
             logging.critical(f"CNS {cns}: Erro crítico. Causa: {e}")
-            retry_counts[cns] += 1
-            if driver:
-                driver.quit()
-            driver = None
-            time.sleep(5)
-
-    if driver:
-        logging.info("--- FIM DO PROCESSAMENTO --- Fechando navegador.")
-        driver.quit()
-    else:
-        logging.info("--- FIM DO PROCESSAMENTO ---")
+            # Sem consulta ao site (cache), o erro não diz nada sobre a saúde dele.
+            register_failure(
+                retry_counts,
+                cns,
+                e,
+                retries,
+                breaker if network else None,
+                time.perf_counter() - started,
+            )
+            driver = drivers.recover(driver)
+
+    return driver
+
+
+def create_http_engine(engine, url):
+    """Cria o motor HTTP quando selecionado; None significa só Selenium."""
+    if engine != "http":
+        return None
+    return HttpEngine(url=url)
+
+
+def create_driver_pool(args, prewarm):
+    """
+    Cria o pool de navegadores. No motor 'selenium' os navegadores são
+    aquecidos de antemão; no 'http' o Selenium é só fallback e eles são
+    abertos sob demanda.
+    """
+    from browser_profile import build_chrome_options
+    from driver_pool import DRIVER_MAX_PAGES, DRIVER_SPARES, DriverPool
+
+    selenium = args.engine == "selenium"
+    return DriverPool(
+        build_chrome_options(args.browser_profile),
+        url=args.url,
+        spares=DRIVER_SPARES if selenium else 0,
+        max_pages=args.driver_max_pages or DRIVER_MAX_PAGES,
+        prewarm=prewarm if selenium else 0,
+        setup=make_request_blocker(
+            blocked_url_patterns(args.browser_profile, args.block_css)
+        ),
+        reuse_form=not args.reload_each_cns,
+    )
+
+
+def run_worker(
+    run_id,
+    worker_id,
+    drivers,
+    rate_limiter,
+    batch_size,
+    engine,
+    url,
+    writer,
+    cache,
+    breaker=None,
+    retry_scale=1.0,
+    refresh=False,
+):
+    """
+    Loop de um worker: reivindica lotes no banco até a fila esvaziar.
+
+    Com `refresh`, os lotes são de linhas concluídas cuja reconsulta venceu.
+
+    As novas tentativas agendadas pelo worker são retomadas entre um lote e
+    outro; o worker só termina quando a fila e as suas novas tentativas acabam.
+    """
+    driver = None
+    http_engine = create_http_engine(engine, url)
+    retries = RetryScheduler(retry_scale)
+    retry_counts = defaultdict(int)
+    processed = 0
+    try:
+        while True:
+            cns_list = claim_batch(run_id, worker_id, batch_size, refresh)
+            if not cns_list and not len(retries):
+                break
+            if cns_list:
+                logging.info(f"Lote com {len(cns_list)} CNS reivindicado.")
+            else:
+                # Fila vazia: só restam as novas tentativas deste worker.
+                time.sleep(retries.next_due_in())
+            driver = process_cns_list(
+                cns_list,
+                drivers,
+                driver=driver,
+                rate_limiter=rate_limiter,
+                http_engine=http_engine,
+                url=url,
+                writer=writer,
+                cache=cache,
+                retries=retries,
+                retry_counts=retry_counts,
+                breaker=breaker,
+                drain=False,
+            )
+            processed += len(cns_list)
+    finally:
+        drivers.release(driver)
+        if http_engine:
+            http_engine.close()
+        logging.info(f"Worker finalizado. {processed} CNS processados.")
+
+
+def run_worker_pool(
+    drivers,
+    workers,
+    batch_size,
+    rate_per_second,
+    engine,
+    url,
+    cache=None,
+    journal=None,
+    retry_scale=1.0,
+    refresh=False,
+):
+    """
+    Executa N navegadores em paralelo, cada um em sua própria thread.
+
+    Um único CircuitBreaker é compartilhado: se o site cair, todos param.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    rate_limiter = RateLimiter(rate_per_second, burst=workers)
+    breaker = CircuitBreaker()
+    writer = WriteBehindBuffer(journal=journal)
+    logging.info(
+        f"Iniciando execução {run_id} com {workers} workers "
+        f"(lote={batch_size}, teto={rate_per_second} req/s)."
+    )
+
+    threads = [
+        threading.Thread(
+            target=run_worker,
+            args=(
+                run_id,
+                f"worker-{n}",
+                drivers,
+                rate_limiter,
+                batch_size,
+                engine,
+                url,
+                writer,
+                cache,
+                breaker,
+                retry_scale,
+                refresh,
+            ),
+            name=f"worker-{n}",
+        )
+        for n in range(1, workers + 1)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        writer.close()
+        # Devolve à fila o que esta execução reivindicou e não concluiu.
+        release_claims(run_id)
+    logging.info("--- FIM DO PROCESSAMENTO ---")
+
+
+def reparse_from_cache(cache):
+    """
+    Reconstrói as linhas da tabela a partir do HTML em cache, sem acessar o site.
+
+    Útil depois de corrigir o parsing: todas as entradas do cache, de qualquer
+    idade, passam de novo por `parse_panel_html` e são gravadas em lote. Uma
+    entrada sem o painel ou que não é HTML válido é registrada e pulada.
+    """
+    writer = WriteBehindBuffer(max_rows=1000)
+    parsed = failed = 0
+    try:
+        for cns, html in cache.iter_entries():
+            try:
+                # parse_panel converte os erros do lxml em HttpEngineError.
+                data = parse_panel(html)
+            except HttpEngineError as e:
+                logging.error(f"CNS {cns}: HTML em cache inválido ({e}).")
+                failed += 1
+                continue
+            writer.add(cns, data)
+            parsed += 1
+            if parsed % 10_000 == 0:
+                logging.info(f"{parsed} CNS reprocessados a partir do cache...")
+    finally:
+        writer.close()
+    logging.info(
+        f"--- FIM DO REPROCESSAMENTO --- {parsed} CNS reprocessados, {failed} falhas."
+    )
+
+
+def open_journal(args):
+    """
+    Regrava o que ficou no journal de execuções anteriores e o abre para esta.
+
+    Retorna None com --no-journal. Se o banco ainda estiver fora, os resultados
+    antigos continuam no journal e são regravados numa próxima oportunidade.
+    """
+    if args.no_journal:
+        return None
+    drain_journal(args.journal)
+    return CheckpointJournal(args.journal)
+
+
+def open_cache(args):
+    """Abre o cache de HTML conforme os argumentos; None com --no-cache."""
+    if args.no_cache:
+        return None
+    # No modo refresh o objetivo é consultar o site: o cache só é alimentado.
+    ttl_days = 0 if args.refresh else args.cache_ttl_days
+    return HtmlCache(args.cache_dir, ttl_days, args.cache_max_mb)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Robô de enriquecimento de CNS.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Quantidade de navegadores em paralelo (padrão: 1, modo serial).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=CLAIM_BATCH_SIZE,
+        help="Quantidade de CNS reivindicados por lote no modo worker pool.",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=MAX_REQUESTS_PER_SECOND,
+        help="Teto de requisições por segundo ao site, somando todos os workers.",
+    )
+    parser.add_argument(
+        "--max-rate",
+        type=float,
+        default=None,
+        help="No motor 'async', teto até onde o token bucket pode acelerar "
+        "partindo de --rate (padrão: o próprio --rate).",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["selenium", "http", "async"],
+        default="selenium",
+        help="Motor de consulta. 'http' reproduz o postback sem navegador e "
+        "usa o Selenium como fallback; 'async' faz o mesmo com asyncio e "
+        "centenas de consultas simultâneas.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=200,
+        help="Máximo de CNS em andamento no motor 'async'.",
+    )
+    parser.add_argument(
+        "--url",
+        default=URL_ALVO,
+        help="URL da página de consulta (útil para apontar para o stub_server.py).",
+    )
+    parser.add_argument(
+        "--browser-profile",
+        choices=PROFILES,
+        default=DEFAULT_PROFILE,
+        help="'default' (padrão): navegador completo e visível; 'lean': "
+        "headless, sem imagens, fontes e scripts de terceiros.",
+    )
+    parser.add_argument(
+        "--block-css",
+        action="store_true",
+        help="No perfil 'lean', bloqueia também as folhas de estilo.",
+    )
+    parser.add_argument(
+        "--driver-max-pages",
+        type=int,
+        default=None,
+        help="Páginas carregadas por navegador antes de ele ser reciclado "
+        "(padrão: DRIVER_MAX_PAGES do driver_pool.py).",
+    )
+    parser.add_argument(
+        "--reload-each-cns",
+        action="store_true",
+        help="Recarrega a página de consulta a cada CNS em vez de reaproveitar "
+        "o formulário já carregado (comportamento antigo).",
+    )
+    parser.add_argument(
+        "--log-file",
+        default=log_setup.JSON_LOG_FILE,
+        help="Log estruturado (JSONL) da execução.",
+    )
+    parser.add_argument(
+        "--log-max-mb",
+        type=float,
+        default=log_setup.LOG_MAX_MB,
+        help="Tamanho a partir do qual o log é rotacionado e comprimido.",
+    )
+    parser.add_argument(
+        "--log-rotate-when",
+        default=None,
+        help="Rotaciona o log por tempo em vez de tamanho ('midnight', 'H'...).",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=DEFAULT_METRICS_PORT,
+        help="Porta local do endpoint de métricas no formato Prometheus "
+        "(0 desativa).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Diretório do cache de HTML bruto dos painéis.",
+    )
+    parser.add_argument(
+        "--cache-ttl-days",
+        type=float,
+        default=DEFAULT_TTL_DAYS,
+        help="Idade máxima, em dias, de um HTML em cache para evitar nova consulta.",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_MAX_MB,
+        help="Tamanho máximo do cache; acima disso os menos usados são removidos.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Desativa o cache de HTML (sempre consulta o site).",
+    )
+    parser.add_argument(
+        "--reparse-from-cache",
+        action="store_true",
+        help="Reprocessa todo o HTML em cache e grava no banco, sem acessar o site.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Reconsulta linhas já concluídas cuja data de reconsulta venceu "
+        "(NextRefreshAt), das mais atrasadas para as mais recentes.",
+    )
+    parser.add_argument(
+        "--refresh-budget",
+        type=int,
+        default=REFRESH_BUDGET_PER_HOUR,
+        help="No modo refresh, máximo de consultas ao site por hora.",
+    )
+    parser.add_argument(
+        "--journal",
+        default=DEFAULT_JOURNAL_PATH,
+        help="Journal local dos resultados ainda não gravados no banco.",
+    )
+    parser.add_argument(
+        "--no-journal",
+        action="store_true",
+        help="Desativa o journal (uma queda do banco pode exigir novo scraping).",
+    )
+    parser.add_argument(
+        "--retry-backoff-scale",
+        type=float,
+        default=1.0,
+        help="Multiplica as esperas entre novas tentativas (ex.: 0.01 em testes).",
+    )
+    return parser.parse_args(argv)
+
+
+def run_scraper(args, cache, journal=None):
+    """Executa o scraping no modo escolhido: async, worker pool ou serial."""
+    rate = args.rate
+    if args.refresh:
+        # O orçamento por hora vira um teto de taxa, e as reconsultas se
+        # espalham pela hora em vez de gastar o orçamento todo de uma vez.
+        rate = min(rate, args.refresh_budget / 3600)
+        logging.info(
+            f"Modo refresh: até {args.refresh_budget} consultas por hora "
+            f"({rate:.3f} req/s)."
+        )
+
+    if args.engine == "async":
+        # Importado sob demanda: só este motor usa o aiohttp.
+        from async_scraper import run_async_engine
+
+        # O --rate é o teto por padrão; só um --max-rate explícito deixa o AIMD
+        # acelerar além dele. No modo refresh o orçamento é sempre o teto.
+        max_rate = rate if args.refresh or args.max_rate is None else args.max_rate
+        asyncio.run(
+            run_async_engine(
+                url=args.url,
+                concurrency=args.concurrency,
+                max_retries=MAX_RETRIES,
+                initial_rate=min(rate, max_rate),
+                max_rate=max_rate,
+                cache=cache,
+                journal=journal,
+                retry_scale=args.retry_backoff_scale,
+                refresh=args.refresh,
+            )
+        )
+        return
+
+    # O modo refresh usa sempre as reivindicações do worker pool.
+    if args.workers > 1 or args.refresh:
+        drivers = create_driver_pool(args, prewarm=args.workers)
+        try:
+            run_worker_pool(
+                drivers,
+                args.workers,
+                args.batch_size,
+                rate,
+                args.engine,
+                args.url,
+                cache,
+                journal,
+                args.retry_backoff_scale,
+                args.refresh,
+            )
+        finally:
+            drivers.close()
+        return
+
+    cns_list = get_pending_cns()
+
+    if len(cns_list) == 0:
+        logging.info("Nenhum CNS para processar. Trabalho concluído.")
+        return
+
+    drivers = create_driver_pool(args, prewarm=1)
+    http_engine = create_http_engine(args.engine, args.url)
+    writer = WriteBehindBuffer(journal=journal)
+    try:
+        driver = process_cns_list(
+            cns_list,
+            drivers,
+            rate_limiter=RateLimiter(rate),
+            http_engine=http_engine,
+            url=args.url,
+            writer=writer,
+            cache=cache,
+            retries=RetryScheduler(args.retry_backoff_scale),
+            breaker=CircuitBreaker(),
+        )
+        drivers.release(driver)
+    finally:
+        writer.close()
+        if http_engine:
+            http_engine.close()
+        logging.info("--- FIM DO PROCESSAMENTO --- Fechando navegadores.")
+        drivers.close()
+
+
+def main(argv=None):
+    """Função principal que orquestra o processo de scraping."""
+    args = parse_args(argv)
+    listener = setup_logging(args)
+    try:
+        run_main(args)
+    finally:
+        # Descarrega a fila de logs antes de sair.
+        listener.stop()
+
+
+def run_main(args):
+    """Executa o scraping (ou o reprocessamento do cache) com o logging já configurado."""
+    cache = open_cache(args)
+
+    if args.reparse_from_cache:
+        if cache is None:
+            logging.error("--reparse-from-cache não pode ser usado com --no-cache.")
+            sys.exit(1)
+        reparse_from_cache(cache)
+        cache.close()
+        return
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    journal = open_journal(args)
+    try:
+        run_scraper(args, cache, journal)
+    finally:
+        if journal is not None:
+            journal.close()
+        # Latência por etapa (p50/p95/p99) e contadores da execução.
+        METRICS.log_summary(RUN_SUMMARY_FILE)
 
 
 if __name__ == "__main__":
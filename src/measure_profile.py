@@ -0,0 +1,153 @@
+import argparse
+import json
+import statistics
+import time
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from browser_profile import (
+    PROFILES,
+    blocked_url_patterns,
+    build_chrome_options,
+    make_request_blocker,
+)
+from extraction import CNS_INPUT_XPATH
+from http_engine import URL_ALVO
+
+# --- Configurações ---
+DEFAULT_PAGES = 5
+PAGE_TIMEOUT = 30  # segundos
+
+
+def read_network_log(driver):
+    """
+    Consome o log de performance do Chrome e resume o tráfego desde a última
+    leitura: (bytes recebidos, requisições feitas, requisições bloqueadas).
+    """
+    received = requests_sent = blocked = 0
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        method, params = message.get("method"), message.get("params", {})
+        if method == "Network.loadingFinished":
+            received += params.get("encodedDataLength", 0)
+        elif method == "Network.requestWillBeSent":
+            requests_sent += 1
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            blocked += 1
+    return received, requests_sent, blocked
+
+
+def measure_profile(profile, url, pages, block_css=False):
+    """
+    Carrega a página de consulta `pages` vezes com o perfil e mede cada carga.
+
+    A primeira carga é feita com o cache do navegador vazio; as seguintes
+    reproduzem o que o robô faz a cada CNS (`driver.get` na mesma sessão).
+    """
+    options = build_chrome_options(profile)
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    driver = webdriver.Chrome(options=options)
+    setup = make_request_blocker(blocked_url_patterns(profile, block_css))
+    if setup:
+        setup(driver)
+
+    samples = []
+    try:
+        for _ in range(pages):
+            read_network_log(driver)  # descarta o tráfego anterior
+            start = time.perf_counter()
+            driver.get(url)
+            WebDriverWait(driver, PAGE_TIMEOUT).until(
+                EC.presence_of_element_located((By.XPATH, CNS_INPUT_XPATH))
+            )
+            elapsed = time.perf_counter() - start
+            received, requests_sent, blocked = read_network_log(driver)
+            samples.append(
+                {
+                    "seconds": elapsed,
+                    "bytes": received,
+                    "requests": requests_sent,
+                    "blocked": blocked,
+                }
+            )
+    finally:
+        driver.quit()
+    return samples
+
+
+def summarize(samples):
+    """Resume as amostras em primeira carga e média das cargas seguintes."""
+    warm = samples[1:] or samples
+    return {
+        "first_seconds": samples[0]["seconds"],
+        "first_kb": samples[0]["bytes"] / 1024,
+        "warm_seconds": statistics.mean(s["seconds"] for s in warm),
+        "warm_kb": statistics.mean(s["bytes"] for s in warm) / 1024,
+        "requests": statistics.mean(s["requests"] for s in warm),
+        "blocked": statistics.mean(s["blocked"] for s in warm),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compara tempo e tráfego por página entre perfis do navegador."
+    )
+    parser.add_argument("--url", default=URL_ALVO, help="Página a ser carregada.")
+    parser.add_argument(
+        "--pages",
+        type=int,
+        default=DEFAULT_PAGES,
+        help="Cargas por perfil (a primeira é com cache vazio).",
+    )
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        choices=PROFILES,
+        default=list(PROFILES),
+        help="Perfis a comparar; o primeiro é a referência.",
+    )
+    parser.add_argument(
+        "--block-css",
+        action="store_true",
+        help="No perfil 'lean', bloqueia também as folhas de estilo.",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = {}
+    for profile in args.profiles:
+        print(f"Medindo o perfil '{profile}' ({args.pages} cargas)...")
+        results[profile] = summarize(
+            measure_profile(profile, args.url, args.pages, args.block_css)
+        )
+
+    print()
+    print(
+        f"{'perfil':<10}{'1ª carga (s)':>14}{'1ª carga (KB)':>15}"
+        f"{'por página (s)':>16}{'por página (KB)':>17}{'req.':>7}{'bloq.':>7}"
+    )
+    for profile, r in results.items():
+        print(
+            f"{profile:<10}{r['first_seconds']:>14.2f}{r['first_kb']:>15.1f}"
+            f"{r['warm_seconds']:>16.2f}{r['warm_kb']:>17.1f}"
+            f"{r['requests']:>7.1f}{r['blocked']:>7.1f}"
+        )
+
+    baseline = results[args.profiles[0]]
+    for profile in args.profiles[1:]:
+        r = results[profile]
+        print(
+            f"\n'{profile}' vs '{args.profiles[0]}' por página: "
+            f"{baseline['warm_seconds'] - r['warm_seconds']:+.2f}s economizados, "
+            f"{baseline['warm_kb'] - r['warm_kb']:+.1f} KB a menos "
+            f"(1ª carga: {baseline['first_kb'] - r['first_kb']:+.1f} KB a menos)."
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import bisect
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configurações ---
+DEFAULT_METRICS_PORT = 9108
+METRICS_PATH = "/metrics"
+# Limites dos buckets, em segundos, cobrindo de um parse (ms) a um page load lento.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MAX_SAMPLES = 50_000  # Amostras guardadas por etapa para calcular percentis
+PERCENTILES = (50, 95, 99)
+
+
+class Histogram:
+    """
+    Histograma de latências no formato do Prometheus.
+
+    Além dos buckets cumulativos, guarda até `max_samples` amostras
+    (reservoir sampling) para calcular p50/p95/p99 no resumo da execução.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_samples=MAX_SAMPLES):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max_samples = max_samples
+        self._samples = []
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        if len(self._samples) < self.max_samples:
+            self._samples.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.max_samples:
+                self._samples[slot] = value
+
+    def percentile(self, q):
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class MetricsRegistry:
+    """
+    Métricas do scraper: um histograma de latência por etapa (page load,
+    espera, extração, gravação no banco...) e contadores de eventos
+    (retries, CNS não encontrados, reinícios de navegador...).
+
+    Thread-safe; uma instância global (`METRICS`) é compartilhada por todos os
+    workers e pelo motor async.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Zera histogramas e contadores (por exemplo, entre cenários do benchmark)."""
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+            self.started_at = time.time()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Mede a duração do bloco `with` e a registra no histograma da etapa."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, event, amount=1):
+        with self._lock:
+            self._counters[event] = self._counters.get(event, 0) + amount
+
+    def render_prometheus(self):
+        """Exporta as métricas no formato texto do Prometheus."""
+        lines = [
+            "# HELP scraper_stage_seconds Latência de cada etapa do scraping.",
+            "# TYPE scraper_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.bucket_counts):
+                    cumulative += count
+                    lines.append(
+                        f'scraper_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} '
+                        f"{cumulative}"
+                    )
+                lines.append(
+                    f'scraper_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}'
+                )
+                lines.append(f'scraper_stage_seconds_sum{{stage="{stage}"}} {h.sum}')
+                lines.append(
+                    f'scraper_stage_seconds_count{{stage="{stage}"}} {h.count}'
+                )
+            lines.append(
+                "# HELP scraper_events_total Eventos contados durante a execução."
+            )
+            lines.append("# TYPE scraper_events_total counter")
+            for event, value in sorted(self._counters.items()):
+                lines.append(f'scraper_events_total{{event="{event}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Resumo da execução: contagem, média e percentis por etapa, e contadores."""
+        with self._lock:
+            stages = {}
+            for stage, h in sorted(self._histograms.items()):
+                stats = {"count": h.count, "mean": h.sum / h.count if h.count else None}
+                for q in PERCENTILES:
+                    stats[f"p{q}"] = h.percentile(q)
+                stages[stage] = stats
+            counters = dict(sorted(self._counters.items()))
+        return {
+            "started_at": self.started_at,
+            "elapsed_seconds": time.time() - self.started_at,
+            "stages": stages,
+            "counters": counters,
+        }
+
+    def log_summary(self, path=None):
+        """Registra o resumo no log e, se `path` for informado, grava em JSON."""
+        summary = self.summary()
+        logging.info(
+            f"Resumo da execução ({summary['elapsed_seconds']:.1f}s) - latência por etapa:"
+        )
+        for stage, s in summary["stages"].items():
+            logging.info(
+                f"  {stage:<14} n={s['count']:<7} média={s['mean'] * 1000:8.1f}ms "
+                + " ".join(f"p{q}={s[f'p{q}'] * 1000:8.1f}ms" for q in PERCENTILES)
+            )
+        for event, value in summary["counters"].items():
+            logging.info(f"  {event:<14} {value}")
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+            logging.info(f"Resumo da execução salvo em '{path}'.")
+        return summary
+
+
+METRICS = MetricsRegistry()
+
+
+def start_metrics_server(port=DEFAULT_METRICS_PORT, registry=METRICS):
+    """
+    Expõe `registry` em http://127.0.0.1:<port>/metrics numa thread de fundo.
+
+    Retorna o servidor, ou None se a porta estiver ocupada (o scraping segue
+    normalmente, só sem o endpoint).
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != METRICS_PATH:
+                self.send_response(404)
+                self.end_headers()
+                return
+            payload = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass  # Não polui o log do scraper com os scrapes do Prometheus.
+
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    except OSError as e:
+        logging.warning(f"Endpoint de métricas indisponível na porta {port}: {e}")
+        return None
+    thread = threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    )
+    thread.start()
+    logging.info(f"Métricas disponíveis em http://127.0.0.1:{port}{METRICS_PATH}")
+    return server
@@ -0,0 +1,215 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from extraction import DEFAULT_NOT_FOUND_TEXT
+from storage import (
+    ATRIBUICOES_TABLE,
+    NORMALIZED_COLUMNS,
+    STATUS_CONCLUIDO,
+    TABLE_NAME,
+    StorageUnavailableError,
+    get_storage,
+    iter_batches,
+)
+
+# Etapa de normalização em lote, separada do scraping.
+#
+# O scraper grava os campos como vieram do site; aqui as formas canônicas são
+# recalculadas para a tabela inteira com operações vetorizadas do pandas e do
+# NumPy e gravadas em lotes nas colunas de NORMALIZED_COLUMNS, sem tocar nos
+# valores raspados. Mudar uma regra não exige raspar de novo: basta rodar
+# `carto normalize --all`.
+
+# --- Configurações ---
+WRITE_BATCH_SIZE = 10_000  # CNS gravados por transação
+# Separadores entre os serviços no texto de Atribuicoes.
+ATRIBUICOES_SEPARATORS = r"\s*(?:/|;|,|\n)\s*"
+
+# Faixas de CEP (5 primeiros dígitos) de cada UF, segundo os Correios.
+CEP_RANGES = [
+    ("SP", 1000, 19999),
+    ("RJ", 20000, 28999),
+    ("ES", 29000, 29999),
+    ("MG", 30000, 39999),
+    ("BA", 40000, 48999),
+    ("SE", 49000, 49999),
+    ("PE", 50000, 56999),
+    ("AL", 57000, 57999),
+    ("PB", 58000, 58999),
+    ("RN", 59000, 59999),
+    ("CE", 60000, 63999),
+    ("PI", 64000, 64999),
+    ("MA", 65000, 65999),
+    ("PA", 66000, 68899),
+    ("AP", 68900, 68999),
+    ("AM", 69000, 69299),
+    ("RR", 69300, 69399),
+    ("AM", 69400, 69899),
+    ("AC", 69900, 69999),
+    ("DF", 70000, 72799),
+    ("GO", 72800, 72999),
+    ("DF", 73000, 73699),
+    ("GO", 73700, 76799),
+    ("RO", 76800, 76999),
+    ("TO", 77000, 77999),
+    ("MT", 78000, 78899),
+    ("MS", 79000, 79999),
+    ("PR", 80000, 87999),
+    ("SC", 88000, 89999),
+    ("RS", 90000, 99999),
+]
+
+# Tabelas de busca para o np.searchsorted, com os CEPs completos (8 dígitos).
+CEP_STARTS = np.array([start * 1000 for _, start, _ in CEP_RANGES], dtype=np.int64)
+CEP_ENDS = np.array([end * 1000 + 999 for _, _, end in CEP_RANGES], dtype=np.int64)
+CEP_UFS = np.array([uf for uf, _, _ in CEP_RANGES])
+
+
+def only_digits(values):
+    return values.fillna("").astype(str).str.replace(r"\D", "", regex=True)
+
+
+def canonical_cep(ceps):
+    """CEPs com 8 dígitos no formato 00000-000; os demais ficam como estão."""
+    digits = only_digits(ceps)
+    formatted = digits.str[:5] + "-" + digits.str[5:]
+    return formatted.where(digits.str.len() == 8, ceps)
+
+
+def canonical_phone(phones):
+    """
+    Telefones no formato (DD) NNNN-NNNN ou, para celulares, (DD) NNNNN-NNNN.
+
+    Aceita DDD com zero na frente e o código do país (55). Textos que não
+    formam um único número de 10 ou 11 dígitos ficam como estão.
+    """
+    digits = only_digits(phones).str.lstrip("0")
+    with_country = digits.str.len().isin([12, 13]) & digits.str.startswith("55")
+    digits = digits.where(~with_country, digits.str[2:])
+    number = digits.str[2:]
+    formatted = "(" + digits.str[:2] + ") " + number.str[:-4] + "-" + number.str[-4:]
+    return formatted.where(digits.str.len().isin([10, 11]), phones)
+
+
+def uf_from_cep(ceps):
+    """UF de cada CEP pelas faixas de CEP_RANGES; vazio se o CEP não se encaixa."""
+    digits = only_digits(ceps)
+    values = pd.to_numeric(digits.where(digits.str.len() == 8), errors="coerce")
+    values = values.fillna(-1).to_numpy(dtype=np.int64)
+    index = np.clip(np.searchsorted(CEP_STARTS, values, side="right") - 1, 0, None)
+    found = (values >= CEP_STARTS[index]) & (values <= CEP_ENDS[index])
+    return pd.Series(np.where(found, CEP_UFS[index], ""), index=ceps.index)
+
+
+def split_atribuicoes(frame):
+    """Pares (CNS, Atribuicao), um por serviço, sem repetições."""
+    texts = frame.set_index("CNS")["Atribuicoes"]
+    texts = texts[texts.notna() & (texts != DEFAULT_NOT_FOUND_TEXT)]
+    services = texts.str.split(ATRIBUICOES_SEPARATORS, regex=True).explode()
+    services = services.str.strip()
+    services = services[services.notna() & (services != "")]
+    pairs = services.rename("Atribuicao").reset_index().drop_duplicates()
+    return pairs[["CNS", "Atribuicao"]]
+
+
+def normalize_frame(frame):
+    """
+    Calcula as colunas canônicas de um DataFrame com as linhas da tabela.
+
+    Retorna (colunas normalizadas, atribuições): o primeiro com CNS e
+    NORMALIZED_COLUMNS, o segundo com os pares de `split_atribuicoes`. A UF
+    vem do CEP quando ele é válido; senão, fica a do nome do cartório.
+    """
+    normalized = pd.DataFrame({"CNS": frame["CNS"]})
+    normalized["CEPNormalizado"] = canonical_cep(frame["CEP"])
+    normalized["TelefoneNormalizado"] = canonical_phone(frame["Telefone"])
+    uf = uf_from_cep(frame["CEP"])
+    normalized["UFNormalizada"] = uf.where(uf != "", frame["UF"])
+    normalized = normalized.astype(object).where(normalized.notna(), None)
+    return normalized[["CNS"] + NORMALIZED_COLUMNS], split_atribuicoes(frame)
+
+
+def build_query(full):
+    """Concluídas: todas (`full`) ou só as extraídas desde a última normalização."""
+    sql = (
+        f"SELECT CNS, UF, CEP, Telefone, Atribuicoes FROM {TABLE_NAME} "
+        f"WHERE Status = ?"
+    )
+    if not full:
+        sql += " AND (NormalizedAt IS NULL OR data_extracao > NormalizedAt)"
+    return sql, [STATUS_CONCLUIDO]
+
+
+def run_normalization(storage, full=False, batch_size=WRITE_BATCH_SIZE):
+    """
+    Normaliza as linhas concluídas e grava o resultado em lotes.
+
+    Retorna (linhas normalizadas, atribuições gravadas).
+    """
+    sql_query, params = build_query(full)
+    conn = storage.connect()
+    try:
+        frame = pd.read_sql(sql_query, conn, params=params)
+    finally:
+        conn.close()
+    if frame.empty:
+        return 0, 0
+
+    normalized, atribuicoes = normalize_frame(frame)
+    written = pairs_written = 0
+    for batch in iter_batches(
+        normalized.itertuples(index=False, name=None), batch_size
+    ):
+        batch_cns = [row[0] for row in batch]
+        pairs = list(
+            atribuicoes[atribuicoes["CNS"].isin(batch_cns)].itertuples(
+                index=False, name=None
+            )
+        )
+        written += storage.write_normalized(batch, pairs)
+        pairs_written += len(pairs)
+        print(f"  {written}/{len(normalized)} registros normalizados...")
+    return written, pairs_written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=f"Normaliza CEP, telefone e UF da tabela '{TABLE_NAME}' e "
+        f"separa as atribuições em '{ATRIBUICOES_TABLE}'."
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Renormaliza todas as linhas concluídas (depois de mudar uma regra), "
+        "não só as extraídas desde a última normalização.",
+    )
+    parser.add_argument("--batch-size", type=int, default=WRITE_BATCH_SIZE)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    storage = get_storage()
+    start = time.perf_counter()
+    try:
+        storage.create_schema()  # Coluna NormalizedAt e tabela de atribuições
+        written, pairs = run_normalization(storage, args.all, args.batch_size)
+    except StorageUnavailableError:
+        print("Não foi possível conectar ao banco de dados. Abortando.")
+        sys.exit(1)
+
+    if not written:
+        print("Nenhuma linha a normalizar.")
+        return
+    print(
+        f"{written} registros normalizados e {pairs} atribuições gravadas "
+        f"em {time.perf_counter() - start:.1f}s."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,152 @@
-import pandas as pd
+import argparse
+import csv
+import os
+import re
 import sys
-from db import get_db_connection
+from storage import StorageUnavailableError, get_storage
 
 # --- Configurações ---
 EXCEL_PATH = "data_input/base_cartorios_com_cns.xlsx"
 # IMPORTANTE: Ajuste este nome se a coluna no seu Excel for diferente.
 CNS_COLUMN_NAME = "CNS"
-TABLE_NAME = "cartorios_enriquecidos"
+CNS_LENGTH = 6  # O CNS tem 6 dígitos (5 + dígito verificador), ex.: 00.007-5
 
-
-def load_cns_from_excel(file_path, column_name):
-    """Lê a coluna de CNS do arquivo Excel e retorna uma lista limpa."""
-    try:
-        df = pd.read_excel(file_path, dtype={column_name: str})
-        # Garante que não há valores nulos e remove espaços em branco
-        cns_list = df[column_name].dropna().str.strip().tolist()
-        print(f"Encontrados {len(cns_list)} CNS no arquivo Excel.")
-        return cns_list
-    except FileNotFoundError:
-        print(f"ERRO: Arquivo Excel não encontrado em '{file_path}'")
-        sys.exit(1)
-    except KeyError:
-        print(f"ERRO: A coluna '{column_name}' não foi encontrada no arquivo Excel.")
-        sys.exit(1)
+_CNS_SEPARATORS_RE = re.compile(r"[\s.\-/]")
 
 
-def get_existing_cns(cursor):
-    """Busca no banco de dados todos os CNS já inseridos e retorna um set."""
-    cursor.execute(f"SELECT CNS FROM {TABLE_NAME}")
-    # Usar um 'set' para buscas O(1), muito mais rápido que uma lista.
-    return {row.CNS for row in cursor.fetchall()}
+def normalize_cns(value):
+    """
+    Normaliza um CNS para 6 dígitos, sem pontuação (ex.: '00.007-5' -> '000075').
 
+    Aceita o valor como texto ou como número (quando o Excel perdeu os zeros à
+    esquerda). Retorna None se o valor não for um CNS válido.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if not value.is_integer():
+            return None
+        value = int(value)
+    digits = _CNS_SEPARATORS_RE.sub("", str(value))
+    if not digits.isdigit() or len(digits) > CNS_LENGTH:
+        return None
+    return digits.zfill(CNS_LENGTH)
 
-def main():
-    """Função principal para popular o banco com CNS do Excel."""
-    all_cns_from_excel = load_cns_from_excel(EXCEL_PATH, CNS_COLUMN_NAME)
 
-    if not all_cns_from_excel:
-        print("Nenhum CNS para processar. Encerrando.")
-        return
+def iter_cns_from_excel(file_path, column_name):
+    """Lê a coluna de CNS do Excel linha a linha, sem carregar a planilha inteira."""
+    from openpyxl import load_workbook
 
-    conn = None
-    cursor = None
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
     try:
-        conn = get_db_connection()
-        if not conn:
-            sys.exit(1)
-
-        cursor = conn.cursor()
-
-        existing_cns = get_existing_cns(cursor)
-        print(f"Encontrados {len(existing_cns)} CNS já existentes no banco de dados.")
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        header = [str(cell).strip() if cell is not None else "" for cell in header]
+        if column_name not in header:
+            raise KeyError(column_name)
+        index = header.index(column_name)
+        for row in rows:
+            yield row[index] if index < len(row) else None
+    finally:
+        workbook.close()
+
+
+def iter_cns_from_csv(file_path, column_name):
+    """Lê a coluna de CNS de um CSV (separador detectado automaticamente)."""
+    with open(file_path, encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(f, dialect=dialect)
+        if column_name not in (reader.fieldnames or []):
+            raise KeyError(column_name)
+        for row in reader:
+            yield row[column_name]
+
+
+def iter_valid_cns(file_path, column_name, stats):
+    """
+    Percorre o arquivo de entrada (Excel ou CSV) e devolve os CNS normalizados.
+
+    Valores vazios são ignorados; valores inválidos são contados em `stats`
+    e os primeiros são guardados como exemplo para o relatório final.
+    """
+    if file_path.lower().endswith(".csv"):
+        values = iter_cns_from_csv(file_path, column_name)
+    else:
+        values = iter_cns_from_excel(file_path, column_name)
+
+    for value in values:
+        if value is None or str(value).strip() == "":
+            continue
+        stats["lidos"] += 1
+        cns = normalize_cns(value)
+        if cns is None:
+            stats["invalidos"] += 1
+            if len(stats["exemplos_invalidos"]) < 10:
+                stats["exemplos_invalidos"].append(str(value))
+            continue
+        yield cns
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Popula a fila de CNS a partir de um arquivo Excel ou CSV."
+    )
+    parser.add_argument("--file", default=EXCEL_PATH, help="Arquivo .xlsx ou .csv.")
+    parser.add_argument("--column", default=CNS_COLUMN_NAME, help="Coluna com o CNS.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Função principal para popular o banco com CNS do Excel ou CSV."""
+    args = parse_args(argv)
+
+    if not os.path.exists(args.file):
+        print(f"ERRO: Arquivo de entrada não encontrado em '{args.file}'")
+        sys.exit(1)
 
-        # Filtra para inserir apenas os CNS que ainda não estão no banco.
-        cns_to_insert = [cns for cns in all_cns_from_excel if cns not in existing_cns]
+    stats = {"lidos": 0, "invalidos": 0, "exemplos_invalidos": []}
 
-        if not cns_to_insert:
+    try:
+        # Os CNS são enviados em lotes; quem já existe no banco é filtrado lá.
+        sent, inserted = get_storage().insert_new_cns(
+            iter_valid_cns(args.file, args.column, stats),
+            on_progress=lambda total: print(
+                f"  {total} CNS enviados para a tabela temporária..."
+            ),
+        )
+
+        print(f"Encontrados {stats['lidos']} CNS no arquivo de entrada.")
+        if stats["invalidos"]:
             print(
-                "Todos os CNS do Excel já estão no banco de dados. Nenhuma ação necessária."
+                f"AVISO: {stats['invalidos']} valores ignorados por não serem CNS "
+                f"válidos. Exemplos: {', '.join(stats['exemplos_invalidos'])}"
             )
-            return
-
-        print(f"Inserindo {len(cns_to_insert)} novos CNS no banco de dados...")
-
-        # Prepara os dados para inserção em lote
-        sql_insert = f"INSERT INTO {TABLE_NAME} (CNS) VALUES (?)"
-        data_to_insert = [(cns,) for cns in cns_to_insert]
-
-        # executemany é muito mais eficiente para múltiplas inserções.
-        cursor.executemany(sql_insert, data_to_insert)
-        conn.commit()
-
-        print(f"Sucesso! {cursor.rowcount} novos CNS foram inseridos.")
+        if sent == 0:
+            print("Nenhum CNS válido para processar. Encerrando.")
+        elif inserted == 0:
+            print(
+                "Todos os CNS do arquivo já estão no banco de dados. Nenhuma ação necessária."
+            )
+        else:
+            print(f"Sucesso! {inserted} novos CNS foram inseridos.")
 
+    except StorageUnavailableError as e:
+        print(f"ERRO: {e}")
+        sys.exit(1)
+    except KeyError:
+        print(
+            f"ERRO: A coluna '{args.column}' não foi encontrada no arquivo de entrada."
+        )
+        sys.exit(1)
     except Exception as e:
         print(f"Ocorreu um erro durante a inserção no banco: {e}")
-        if conn:
-            conn.rollback()
     finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-        print("Processo finalizado. Conexão com o banco fechada.")
+        print("Processo finalizado.")
 
 
 if __name__ == "__main__":
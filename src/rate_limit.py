@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket thread-safe para limitar as requisições ao site-alvo.
+
+    Todas as threads de um mesmo processo compartilham a mesma instância,
+    de modo que o teto de requisições por segundo vale para o host inteiro,
+    independentemente de quantos navegadores estão abertos.
+    """
+
+    def __init__(self, rate_per_second, burst=1):
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second deve ser maior que zero.")
+        self.rate = float(rate_per_second)
+        self.capacity = float(max(burst, 1))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._last
+        self._last = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    def acquire(self):
+        """Bloqueia até haver um token disponível e o consome."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket assíncrono cuja taxa se ajusta à saúde do site (AIMD).
+
+    Cada sucesso aumenta a taxa em `increase_step` req/s até `max_rate`;
+    cada timeout a reduz pela metade, até `min_rate`. Assim o robô satura a
+    taxa permitida em vez de dormir um tempo fixo entre as consultas.
+    """
+
+    def __init__(
+        self,
+        initial_rate,
+        min_rate=0.2,
+        max_rate=50.0,
+        increase_step=0.1,
+        decrease_factor=0.5,
+    ):
+        self.rate = float(initial_rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self._tokens = 1.0
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Aguarda até haver um token disponível e o consome."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                # Capacidade de 1 token: sem rajadas após períodos ociosos.
+                self._tokens = min(1.0, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_timeout(self):
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
@@ -0,0 +1,234 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from metrics import METRICS
+
+# --- Configurações ---
+# Categorias de falha. Só timeout e site indicam problema no site como um
+# todo e alimentam o circuit breaker; as demais são do CNS ou do nosso lado.
+FAILURE_TIMEOUT = "timeout"
+FAILURE_ALERT = "alert"
+FAILURE_PARSE = "parse"
+FAILURE_DB = "db"
+FAILURE_SITE = "site"
+SITE_HEALTH_FAILURES = (FAILURE_TIMEOUT, FAILURE_SITE)
+
+# Espera base (s) antes da 1ª nova tentativa; dobra a cada tentativa seguinte.
+RETRY_BASE_DELAYS = {
+    FAILURE_TIMEOUT: 5,
+    FAILURE_ALERT: 2,
+    FAILURE_PARSE: 10,
+    FAILURE_DB: 15,
+    FAILURE_SITE: 30,
+}
+MAX_RETRY_DELAY = 300
+
+# Circuit breaker: abre quando, entre as últimas BREAKER_WINDOW consultas
+# (e pelo menos BREAKER_MIN_REQUESTS), a fração de falhas do site passa de
+# BREAKER_THRESHOLD. Fica aberto por BREAKER_COOLDOWN segundos, dobrando a
+# cada reabertura até BREAKER_MAX_COOLDOWN.
+BREAKER_WINDOW = 50
+BREAKER_MIN_REQUESTS = 20
+BREAKER_THRESHOLD = 0.5
+BREAKER_COOLDOWN = 30
+BREAKER_MAX_COOLDOWN = 300
+BREAKER_PROBE_WAIT = 1.0  # Espera dos demais enquanto a sonda está em andamento
+
+
+def classify_failure(error):
+    """
+    Classifica uma exceção do scraping em uma das categorias FAILURE_*.
+
+    Olha o tipo da exceção e das suas causas (`raise ... from`), pelo nome das
+    classes, para não precisar importar Selenium, requests ou aiohttp aqui.
+    """
+    from storage import DbWriteError, StorageUnavailableError
+
+    chain = []
+    while error is not None and len(chain) < 5:
+        chain.append(error)
+        error = error.__cause__
+    if any(isinstance(e, (DbWriteError, StorageUnavailableError)) for e in chain):
+        return FAILURE_DB
+    names = [cls.__name__ for e in chain for cls in type(e).__mro__]
+    if any("Alert" in name for name in names):
+        return FAILURE_ALERT
+    if any("Timeout" in name for name in names):
+        return FAILURE_TIMEOUT
+    if any(isinstance(e, ValueError) for e in chain):
+        return FAILURE_PARSE
+    return FAILURE_SITE
+
+
+def retry_delay(category, attempt, scale=1.0):
+    """
+    Espera antes da tentativa seguinte à `attempt`-ésima falha.
+
+    Backoff exponencial com jitter ("equal jitter"): metade fixa, metade
+    aleatória, para que CNS que falharam juntos não voltem todos juntos.
+    """
+    delay = min(MAX_RETRY_DELAY, RETRY_BASE_DELAYS[category] * 2 ** (attempt - 1))
+    delay *= scale
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class RetryScheduler:
+    """
+    Fila de prioridade de CNS aguardando nova tentativa, ordenada pelo horário
+    em que cada um volta a ficar disponível.
+
+    Um CNS que falhou sai do caminho: os próximos da fila continuam sendo
+    processados e ele só é retomado quando o seu backoff vence.
+    """
+
+    def __init__(self, scale=1.0):
+        self.scale = scale
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def schedule(self, cns, category, attempt):
+        """Agenda a nova tentativa e retorna a espera escolhida, em segundos."""
+        delay = retry_delay(category, attempt, self.scale)
+        with self._lock:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), cns))
+        return delay
+
+    def pop_due(self):
+        """Retorna um CNS cujo backoff já venceu, ou None."""
+        with self._lock:
+            if self._heap and self._heap[0][0] <= time.monotonic():
+                return heapq.heappop(self._heap)[2]
+        return None
+
+    def next_due_in(self):
+        """Segundos até o próximo CNS ficar disponível (None se a fila está vazia)."""
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+
+class CircuitBreaker:
+    """
+    Pausa todos os workers quando a taxa de erros do site dispara.
+
+    Fechado, apenas registra os resultados. Aberto, `blocked_for()` devolve
+    quanto falta para o fim da pausa. Vencida a pausa, fica meio-aberto: uma
+    única consulta (sonda) passa; se der certo o circuito fecha, se falhar
+    reabre com o dobro da pausa.
+
+    Compartilhado por todas as threads (ou tarefas asyncio) do processo.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "fechado", "aberto", "meio-aberto"
+
+    def __init__(
+        self,
+        window=BREAKER_WINDOW,
+        min_requests=BREAKER_MIN_REQUESTS,
+        threshold=BREAKER_THRESHOLD,
+        cooldown=BREAKER_COOLDOWN,
+        max_cooldown=BREAKER_MAX_COOLDOWN,
+    ):
+        self.min_requests = min_requests
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._open_until = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def _open(self, now, reason):
+        self.state = self.OPEN
+        self._open_until = now + self.cooldown
+        self._probe_started = None
+        METRICS.inc("circuit_opened")
+        logging.warning(
+            f"Circuit breaker aberto ({reason}). Pausando todos os workers "
+            f"por {self.cooldown:.0f}s."
+        )
+
+    def blocked_for(self):
+        """Segundos que o chamador deve esperar antes de consultar o site (0 = livre)."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return 0.0
+            if self.state == self.OPEN:
+                if now < self._open_until:
+                    return self._open_until - now
+                self.state = self.HALF_OPEN
+                logging.info(
+                    "Circuit breaker meio-aberto: enviando uma consulta de teste."
+                )
+            # Meio-aberto: só a sonda passa; uma sonda perdida expira após a pausa.
+            if self._probe_started is None or now - self._probe_started > self.cooldown:
+                self._probe_started = now
+                return 0.0
+            return BREAKER_PROBE_WAIT
+
+    def wait(self):
+        """Bloqueia a thread enquanto o circuito estiver aberto."""
+        while True:
+            delay = self.blocked_for()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    async def wait_async(self):
+        """Equivalente a `wait` para o motor asyncio."""
+        import asyncio
+
+        while True:
+            delay = self.blocked_for()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def record_success(self):
+        """O site respondeu (com dados ou com "CNS não cadastrado")."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self.cooldown = self.base_cooldown
+                self._outcomes.clear()
+                self._probe_started = None
+                logging.info("Circuit breaker fechado: o site voltou a responder.")
+                return
+            self._outcomes.append(False)
+
+    def record_failure(self, category):
+        """Registra uma falha; só timeouts e erros do site contam para o circuito."""
+        with self._lock:
+            now = time.monotonic()
+            if category not in SITE_HEALTH_FAILURES:
+                if self.state == self.HALF_OPEN:
+                    self._probe_started = None  # Sonda inconclusiva: outra tenta.
+                return
+            if self.state == self.HALF_OPEN:
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self._open(now, "a consulta de teste falhou")
+                return
+            if self.state == self.OPEN:
+                return
+            self._outcomes.append(True)
+            failures = sum(self._outcomes)
+            if (
+                len(self._outcomes) >= self.min_requests
+                and failures / len(self._outcomes) >= self.threshold
+            ):
+                self._open(now, f"{failures} falhas nas últimas {len(self._outcomes)}")
+                self._outcomes.clear()
@@ -1,39 +1,77 @@
 import os
-from dotenv import load_dotenv
-
-# Carrega as variáveis do arquivo .env para o ambiente
-load_dotenv()
-
-# Pega as credenciais do banco de dados do ambiente
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-
-# Valida se todas as variáveis necessárias foram definidas
-required_vars = {
-    "DB_HOST": DB_HOST,
-    "DB_PORT": DB_PORT,
-    "DB_NAME": DB_NAME,
-    "DB_USER": DB_USER,
-    "DB_PASSWORD": DB_PASSWORD,
-}
-missing_vars = [key for key, value in required_vars.items() if not value]
-if missing_vars:
-    raise ValueError(
-        f"Variáveis de ambiente não definidas no .env: {', '.join(missing_vars)}"
+
+# As configurações são lidas sob demanda: importar este módulo não lê o .env,
+# não valida nada e não imprime nada. Assim qualquer script (ou `carto status`)
+# sobe rápido, e ferramentas auxiliares importam os módulos sem um .env completo.
+
+# Variáveis obrigatórias para o backend SQL Server.
+DB_VARS = ("DB_HOST", "DB_PORT", "DB_NAME", "DB_USER", "DB_PASSWORD")
+DEFAULT_STORAGE_BACKEND = "sqlserver"
+DEFAULT_STORAGE_PATH = "data_output/cartorios.db"
+
+_env_loaded = False
+
+
+def load_env():
+    """Carrega as variáveis do arquivo .env para o ambiente (uma única vez)."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
+
+
+def get_setting(name, default=None):
+    load_env()
+    return os.getenv(name, default)
+
+
+def storage_backend():
+    """
+    Backend de armazenamento: 'sqlserver' (padrão), 'sqlite' ou 'duckdb'.
+    Os dois últimos gravam em um arquivo local e dispensam as variáveis DB_*.
+    """
+    return get_setting("STORAGE_BACKEND", DEFAULT_STORAGE_BACKEND).strip().lower()
+
+
+def storage_path():
+    return get_setting("STORAGE_PATH", DEFAULT_STORAGE_PATH)
+
+
+def get_conn_string():
+    """
+    Monta a string de conexão do SQL Server a partir das variáveis DB_*.
+
+    Só é chamada na hora de conectar; falta de variável vira ValueError aqui,
+    e não na importação dos módulos.
+    """
+    values = {name: get_setting(name) for name in DB_VARS}
+    missing_vars = [key for key, value in values.items() if not value]
+    if missing_vars:
+        raise ValueError(
+            f"Variáveis de ambiente não definidas no .env: {', '.join(missing_vars)}"
+        )
+
+    # NOTA: O driver ODBC pode variar dependendo da sua instalação.
+    # 'ODBC Driver 17 for SQL Server' é comum, mas pode ser necessário ajustá-lo.
+    return (
+        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+        f"SERVER={values['DB_HOST']},{values['DB_PORT']};"
+        f"DATABASE={values['DB_NAME']};"
+        f"UID={values['DB_USER']};"
+        f"PWD={values['DB_PASSWORD']};"
     )
 
-# --- Monta a string de conexão ---
-# NOTA: O driver ODBC pode variar dependendo da sua instalação.
-# 'ODBC Driver 17 for SQL Server' é comum, mas pode ser necessário ajustá-lo.
-CONN_STRING = (
-    f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-    f"SERVER={DB_HOST},{DB_PORT};"
-    f"DATABASE={DB_NAME};"
-    f"UID={DB_USER};"
-    f"PWD={DB_PASSWORD};"
-)
-
-print("Conexão com o banco de dados montada com sucesso!")
+
+def __getattr__(name):
+    # Compatibilidade com `from settings import CONN_STRING` e afins.
+    if name == "CONN_STRING":
+        return get_conn_string()
+    if name == "STORAGE_BACKEND":
+        return storage_backend()
+    if name == "STORAGE_PATH":
+        return storage_path()
+    if name in DB_VARS:
+        return get_setting(name)
+    raise AttributeError(f"module 'settings' has no attribute '{name}'")
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import threading
+
+from settings import storage_backend, storage_path
+
+# --- Configurações ---
+BACKENDS = ("sqlserver", "sqlite", "duckdb")
+TABLE_NAME = "cartorios_enriquecidos"
+# Histórico compacto: só as colunas que mudaram, em JSON {"coluna": [antes, depois]}.
+HISTORY_TABLE = "cartorios_historico"
+# Atribuições separadas pela normalização (normalize.py): uma linha por serviço.
+ATRIBUICOES_TABLE = "cartorios_atribuicoes"
+# Tempo após o qual uma reivindicação (claim) é considerada abandonada,
+# por exemplo quando o worker que a fez morreu sem liberá-la.
+CLAIM_TIMEOUT_MINUTES = 30
+
+# Modo refresh: cada linha concluída volta a ser consultada em NextRefreshAt,
+# RefreshDays depois da última conferência. O intervalo dobra a cada conferência
+# sem mudança e cai pela metade a cada mudança, então cartórios que mudam com
+# frequência são reconsultados mais vezes que os estáveis.
+REFRESH_DEFAULT_DAYS = 30
+REFRESH_MIN_DAYS = 7
+REFRESH_MAX_DAYS = 180
+# Uma reconsulta que falha (erro ou "não cadastrado") não rebaixa a linha: ela
+# continua CONCLUIDO, com o erro em LastError, e volta à fila só depois disto.
+REFRESH_FAILURE_DAYS = 1
+
+# Estados possíveis da coluna Status (máquina de estados da fila):
+# PENDENTE -> CONCLUIDO | NAO_ENCONTRADO | ERRO (após esgotar as tentativas).
+# Uma linha CONCLUIDO só sai desse estado por dados novos; falhas na reconsulta
+# apenas adiam o NextRefreshAt (ver REFRESH_FAILURE_DAYS).
+STATUS_PENDENTE = "PENDENTE"
+STATUS_CONCLUIDO = "CONCLUIDO"
+STATUS_NAO_ENCONTRADO = "NAO_ENCONTRADO"
+STATUS_ERRO = "ERRO"
+STATUS_CNS_NOT_FOUND = "CNS NÃO ENCONTRADO NO SITE"
+
+# Colunas gravadas pelo scraper, na ordem usada nas tabelas de staging.
+DATA_COLUMNS = [
+    "NomeCartorio",
+    "UF",
+    "Tabeliao",
+    "Endereco",
+    "CEP",
+    "Telefone",
+    "Email",
+    "Site",
+    "Atribuicoes",
+]
+
+# Formas canônicas calculadas pela normalização (normalize.py), em colunas
+# próprias: as de DATA_COLUMNS guardam sempre o valor como veio do site, que é
+# o que o ContentHash e o histórico comparam a cada nova extração.
+NORMALIZED_COLUMNS = ["CEPNormalizado", "TelefoneNormalizado", "UFNormalizada"]
+
+# ModifiedAt marca a última mudança de conteúdo de uma linha: uma extração com
+# dados novos (junto com data_extracao) ou uma normalização que mudou alguma
+# forma canônica. É a coluna indexada das cargas incrementais (exportação e
+# lookup_service), que assim leem um único intervalo do índice.
+
+# Colunas da tabela que não são texto, pelo tipo lógico (o DDL de cada
+# backend usa o tipo equivalente). Lidas de volta, algumas perdem o tipo:
+# no SQLite as datas voltam como texto, e uma coluna só com nulos não tem tipo.
+TIMESTAMP_COLUMNS = [
+    "data_extracao",
+    "ClaimedAt",
+    "LastVerifiedAt",
+    "NextRefreshAt",
+    "NormalizedAt",
+    "ModifiedAt",
+]
+INTEGER_COLUMNS = ["Attempts", "RefreshDays"]
+
+
+class StorageUnavailableError(Exception):
+    """Não foi possível conectar ao banco configurado."""
+
+
+class DbWriteError(Exception):
+    """Um resultado raspado não pôde ser gravado no banco."""
+
+
+def iter_batches(values, size):
+    """Agrupa um iterável em listas de até `size` itens."""
+    batch = []
+    for value in values:
+        batch.append(value)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def normalize_value(value):
+    """Forma canônica de um campo para comparação: sem espaços sobrando."""
+    if value is None:
+        return ""
+    return " ".join(str(value).split())
+
+
+def content_hash(data):
+    """SHA-256 dos campos normalizados de um resultado, na ordem de DATA_COLUMNS."""
+    values = [normalize_value(data.get(col)) for col in DATA_COLUMNS]
+    return hashlib.sha256(json.dumps(values).encode("utf-8")).hexdigest()
+
+
+def diff_changes(old, new):
+    """
+    Colunas que de fato mudam ao gravar `new` sobre a linha `old`.
+
+    Segue a regra da gravação: valores vazios em `new` não sobrescrevem.
+    Retorna o JSON {"coluna": [antes, depois]} ou None se nada mudou.
+    """
+    changes = {}
+    for col in DATA_COLUMNS:
+        before, after = normalize_value(old.get(col)), normalize_value(new.get(col))
+        if after and after != before:
+            changes[col] = [old.get(col), new.get(col)]
+    return json.dumps(changes, ensure_ascii=False) if changes else None
+
+
+def history_rows(old_rows, new_data, changed_at):
+    """
+    Linhas (CNS, ChangedAt, Changes) do histórico para um lote.
+
+    `old_rows` traz {CNS: linha atual} das linhas cujo hash mudou; linhas
+    nunca enriquecidas (primeira extração) não entram no histórico.
+    """
+    rows = []
+    for cns, old in old_rows.items():
+        if not old.get("ContentHash") and not old.get("NomeCartorio"):
+            continue
+        changes = diff_changes(old, new_data[cns])
+        if changes:
+            rows.append((cns, changed_at, changes))
+    return rows
+
+
+def normalized_changed_sql():
+    """
+    Condição SQL: a normalização de `s` muda alguma forma canônica da linha `t`.
+
+    Nulo e vazio contam como iguais, o que mantém o SQL igual nos três bancos.
+    """
+    return " OR ".join(
+        f"COALESCE(t.{col}, '') <> COALESCE(s.{col}, '')" for col in NORMALIZED_COLUMNS
+    )
+
+
+def refresh_days_sql(changed):
+    """
+    Expressão SQL do novo RefreshDays de uma linha `t` que acabou de ser conferida.
+
+    Escrita no SQL comum aos três bancos; cada backend a combina com a sua
+    própria soma de dias para obter NextRefreshAt.
+    """
+    current = f"COALESCE(t.RefreshDays, {REFRESH_DEFAULT_DAYS})"
+    if not changed:
+        return (
+            f"CASE WHEN {current} * 2 > {REFRESH_MAX_DAYS} THEN {REFRESH_MAX_DAYS} "
+            f"ELSE {current} * 2 END"
+        )
+    # Primeira extração (sem hash anterior): começa no intervalo padrão.
+    return (
+        f"CASE WHEN t.ContentHash IS NULL THEN {REFRESH_DEFAULT_DAYS} "
+        f"WHEN {current} / 2 < {REFRESH_MIN_DAYS} THEN {REFRESH_MIN_DAYS} "
+        f"ELSE CAST({current} / 2 AS INTEGER) END"
+    )
+
+
+def create_storage(backend=None, path=None):
+    """
+    Cria o backend de armazenamento pelo nome.
+
+    'sqlserver' usa o SQL Server configurado no .env (padrão). 'sqlite' e
+    'duckdb' gravam em um arquivo local (`path`), sem ida e volta pela rede;
+    os módulos de cada backend só são importados quando escolhidos. Sem
+    argumentos, usa STORAGE_BACKEND e STORAGE_PATH do ambiente/.env.
+    """
+    backend = backend or storage_backend()
+    path = path or storage_path()
+    if backend == "sqlserver":
+        from storage_sqlserver import SqlServerStorage
+
+        return SqlServerStorage()
+    if backend == "sqlite":
+        from storage_embedded import SqliteStorage
+
+        return SqliteStorage(path)
+    if backend == "duckdb":
+        from storage_embedded import DuckDbStorage
+
+        return DuckDbStorage(path)
+    raise ValueError(
+        f"STORAGE_BACKEND inválido: '{backend}'. Use um de: {', '.join(BACKENDS)}."
+    )
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Retorna o backend configurado (STORAGE_BACKEND), criado uma única vez."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = create_storage()
+        return _storage
+
+
+def use_storage(storage):
+    """Substitui o backend do processo (por exemplo, por um SQLite em memória)."""
+    global _storage
+    with _storage_lock:
+        _storage = storage
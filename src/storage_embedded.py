@@ -0,0 +1,571 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from storage import (
+    ATRIBUICOES_TABLE,
+    CLAIM_TIMEOUT_MINUTES,
+    DATA_COLUMNS,
+    HISTORY_TABLE,
+    NORMALIZED_COLUMNS,
+    REFRESH_DEFAULT_DAYS,
+    REFRESH_FAILURE_DAYS,
+    STATUS_CONCLUIDO,
+    STATUS_ERRO,
+    STATUS_NAO_ENCONTRADO,
+    STATUS_PENDENTE,
+    STATUS_CNS_NOT_FOUND,
+    TABLE_NAME,
+    content_hash,
+    history_rows,
+    iter_batches,
+    normalized_changed_sql,
+    refresh_days_sql,
+)
+
+# --- Configurações ---
+INSERT_BATCH_SIZE = 10_000  # Linhas enviadas à tabela temporária por vez
+SQLITE_BUSY_TIMEOUT = 30  # Segundos esperando outro processo liberar o arquivo
+STAGING_TABLE = "staging_cartorios"
+NEW_CNS_TABLE = "novos_cns"
+NORMALIZED_TABLE = "normalizados"
+
+# No SQLite as datas ficam como texto ISO ('AAAA-MM-DD HH:MM:SS.ffffff'), que
+# ordena cronologicamente e é lido de volta pelo pandas na exportação.
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+
+
+class EmbeddedStorage:
+    """
+    Base dos backends embutidos (SQLite e DuckDB): o banco é um arquivo local,
+    sem ida e volta pela rede nem servidor para administrar.
+
+    Uma única conexão é compartilhada pelo processo e protegida por um lock;
+    cada operação é uma transação curta. As datas são calculadas em Python
+    (agora e agora - CLAIM_TIMEOUT_MINUTES), o que mantém o SQL igual nos dois
+    bancos. Lotes do WriteBehindBuffer vão para uma tabela temporária e são
+    aplicados com um único UPDATE ... FROM, como no SQL Server.
+    """
+
+    name = None
+    supports_columnar_export = False
+    # Tipos usados no DDL; cada backend ajusta para o seu dialeto.
+    text_type = "TEXT"
+    timestamp_type = "TEXT"
+    begin_sql = "BEGIN"
+
+    def __init__(self, path):
+        self.path = path
+        if path != ":memory:":
+            folder = os.path.dirname(os.path.abspath(path))
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = self._open()
+        self._create_temp_tables()
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _insert_rows(self, table, columns, rows):
+        """Insere muitas linhas de uma vez em `table` (dentro da transação atual)."""
+        placeholders = ", ".join("?" * len(columns))
+        self._conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            rows,
+        )
+
+    def _create_temp_tables(self):
+        data_columns = ", ".join(f"{col} {self.text_type}" for col in DATA_COLUMNS)
+        self._conn.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} "
+            f"(CNS {self.text_type} PRIMARY KEY, ContentHash {self.text_type}, "
+            f"{data_columns})"
+        )
+        self._conn.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {NEW_CNS_TABLE} (CNS {self.text_type})"
+        )
+        normalized_columns = ", ".join(
+            f"{col} {self.text_type}" for col in NORMALIZED_COLUMNS
+        )
+        self._conn.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {NORMALIZED_TABLE} "
+            f"(CNS {self.text_type} PRIMARY KEY, {normalized_columns})"
+        )
+
+    def _index_sql(self):
+        return [
+            f"CREATE INDEX IF NOT EXISTS IX_{HISTORY_TABLE}_CNS "
+            f"ON {HISTORY_TABLE} (CNS, ChangedAt)",
+            f"CREATE INDEX IF NOT EXISTS IX_{ATRIBUICOES_TABLE}_CNS "
+            f"ON {ATRIBUICOES_TABLE} (CNS)",
+        ]
+
+    def _migrations(self):
+        """Colunas adicionadas depois da criação original da tabela."""
+        return [
+            ("ContentHash", self.text_type),
+            ("LastVerifiedAt", self.timestamp_type),
+            ("RefreshDays", "INTEGER"),
+            ("NextRefreshAt", self.timestamp_type),
+            ("NormalizedAt", self.timestamp_type),
+            ("ModifiedAt", self.timestamp_type),
+        ] + [(column, self.text_type) for column in NORMALIZED_COLUMNS]
+
+    def _add_days_sql(self, timestamp_sql, days_sql):
+        """Expressão SQL de `timestamp_sql` + `days_sql` dias, no dialeto do banco."""
+        raise NotImplementedError
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _transaction(self, work):
+        """Executa `work()` entre BEGIN e COMMIT, desfazendo tudo em caso de erro."""
+        with self._lock:
+            self._conn.execute(self.begin_sql)
+            try:
+                result = work()
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def _execute(self, sql, params=()):
+        return self._transaction(lambda: self._conn.execute(sql, params).fetchall())
+
+    def connect(self):
+        """Abre uma conexão nova com o mesmo banco (o chamador a fecha)."""
+        raise NotImplementedError
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def create_schema(self):
+        data_columns = ",\n    ".join(f"{col} {self.text_type}" for col in DATA_COLUMNS)
+        normalized_columns = ",\n    ".join(
+            f"{col} {self.text_type}" for col in NORMALIZED_COLUMNS
+        )
+        ddl = f"""
+CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+    CNS {self.text_type} PRIMARY KEY,
+    {data_columns},
+    data_extracao {self.timestamp_type},
+    Status {self.text_type} NOT NULL DEFAULT '{STATUS_PENDENTE}',
+    Attempts INTEGER NOT NULL DEFAULT 0,
+    LastError {self.text_type},
+    ClaimedBy {self.text_type},
+    ClaimedAt {self.timestamp_type},
+    ContentHash {self.text_type},
+    LastVerifiedAt {self.timestamp_type},
+    RefreshDays INTEGER,
+    NextRefreshAt {self.timestamp_type},
+    NormalizedAt {self.timestamp_type},
+    ModifiedAt {self.timestamp_type},
+    {normalized_columns}
+)
+"""
+        history_ddl = f"""
+CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+    CNS {self.text_type} NOT NULL,
+    ChangedAt {self.timestamp_type} NOT NULL,
+    Changes {self.text_type} NOT NULL
+)
+"""
+        atribuicoes_ddl = f"""
+CREATE TABLE IF NOT EXISTS {ATRIBUICOES_TABLE} (
+    CNS {self.text_type} NOT NULL,
+    Atribuicao {self.text_type} NOT NULL
+)
+"""
+        with self._lock:
+            self._conn.execute(ddl)
+            self._conn.execute(history_ddl)
+            self._conn.execute(atribuicoes_ddl)
+            cursor = self._conn.execute(f"SELECT * FROM {TABLE_NAME} LIMIT 0")
+            existing = {column[0] for column in cursor.description}
+            for column, column_type in self._migrations():
+                if column not in existing:
+                    self._conn.execute(
+                        f"ALTER TABLE {TABLE_NAME} ADD COLUMN {column} {column_type}"
+                    )
+            # Linhas concluídas antes do modo refresh: a idade de data_extracao
+            # define quando cada uma volta a ser consultada.
+            next_refresh = self._add_days_sql(
+                "COALESCE(data_extracao, ?)", str(REFRESH_DEFAULT_DAYS)
+            )
+            self._conn.execute(
+                f"UPDATE {TABLE_NAME} SET RefreshDays = ?, NextRefreshAt = {next_refresh} "
+                f"WHERE Status = ? AND NextRefreshAt IS NULL",
+                (REFRESH_DEFAULT_DAYS, datetime.now(), STATUS_CONCLUIDO),
+            )
+            # Linhas gravadas antes da coluna ModifiedAt existir.
+            self._conn.execute(
+                f"UPDATE {TABLE_NAME} SET ModifiedAt = CASE "
+                f"WHEN NormalizedAt > data_extracao THEN NormalizedAt "
+                f"ELSE data_extracao END WHERE ModifiedAt IS NULL"
+            )
+            for index_sql in self._index_sql():
+                self._conn.execute(index_sql)
+
+    def insert_new_cns(self, cns_iterable, on_progress=None):
+        """Insere os CNS que ainda não existem. Retorna (enviados, inseridos)."""
+
+        def work():
+            self._conn.execute(f"DELETE FROM {NEW_CNS_TABLE}")
+            sent = 0
+            for batch in iter_batches(cns_iterable, INSERT_BATCH_SIZE):
+                self._insert_rows(NEW_CNS_TABLE, ["CNS"], [(cns,) for cns in batch])
+                sent += len(batch)
+                if on_progress:
+                    on_progress(sent)
+
+            count_sql = f"SELECT COUNT(*) FROM {TABLE_NAME}"
+            before = self._conn.execute(count_sql).fetchone()[0]
+            now = datetime.now()
+            self._conn.execute(
+                f"""
+                INSERT INTO {TABLE_NAME} (CNS, data_extracao, ModifiedAt)
+                SELECT DISTINCT s.CNS, ?, ?
+                FROM {NEW_CNS_TABLE} s
+                WHERE NOT EXISTS (SELECT 1 FROM {TABLE_NAME} t WHERE t.CNS = s.CNS)
+                """,
+                (now, now),
+            )
+            after = self._conn.execute(count_sql).fetchone()[0]
+            self._conn.execute(f"DELETE FROM {NEW_CNS_TABLE}")
+            return sent, after - before
+
+        return self._transaction(work)
+
+    def get_pending_cns(self):
+        rows = self._query(
+            f"SELECT CNS FROM {TABLE_NAME} WHERE Status = ? ORDER BY CNS",
+            (STATUS_PENDENTE,),
+        )
+        return [row[0] for row in rows]
+
+    def _claim(self, run_id, worker_id, batch_size, where, params, order, extra_set=""):
+        """Reivindica até `batch_size` linhas que atendem a `where`, em ordem de `order`."""
+        now = datetime.now()
+        rows = self._execute(
+            f"""
+            UPDATE {TABLE_NAME} SET ClaimedBy = ?, ClaimedAt = ?{extra_set}
+            WHERE CNS IN (
+                SELECT CNS FROM {TABLE_NAME}
+                WHERE {where}
+                  AND (
+                        ClaimedBy IS NULL
+                     OR (ClaimedBy NOT LIKE ? AND ClaimedAt < ?)
+                  )
+                ORDER BY {order}
+                LIMIT ?
+            )
+            RETURNING CNS
+            """,
+            (
+                f"{run_id}:{worker_id}",
+                now,
+                *params,
+                f"{run_id}:%",
+                now - timedelta(minutes=CLAIM_TIMEOUT_MINUTES),
+                batch_size,
+            ),
+        )
+        return [row[0] for row in rows]
+
+    def claim_batch(self, run_id, worker_id, batch_size):
+        cns_list = self._claim(
+            run_id, worker_id, batch_size, "Status = ?", (STATUS_PENDENTE,), "CNS"
+        )
+        return sorted(cns_list)
+
+    def claim_refresh_batch(self, run_id, worker_id, batch_size):
+        # As mais atrasadas primeiro; Attempts volta a zero para que falhas
+        # antigas não contem nesta reconsulta.
+        return self._claim(
+            run_id,
+            worker_id,
+            batch_size,
+            "Status = ? AND NextRefreshAt <= ?",
+            (STATUS_CONCLUIDO, datetime.now()),
+            "NextRefreshAt",
+            extra_set=", Attempts = 0",
+        )
+
+    def release_claims(self, run_id):
+        self._execute(
+            f"UPDATE {TABLE_NAME} SET ClaimedBy = NULL, ClaimedAt = NULL "
+            f"WHERE ClaimedBy LIKE ?",
+            (f"{run_id}:%",),
+        )
+
+    def update_cartorio_data(self, cns, update_data):
+        # Mesmo caminho do lote, para que a detecção de mudança valha aqui também.
+        self.write_batch([(cns, update_data)])
+
+    def _refresh_failure_sql(self):
+        """NextRefreshAt adiado de uma reconsulta que falhou; os demais ficam iguais."""
+        postponed = self._add_days_sql("?", str(REFRESH_FAILURE_DAYS))
+        return (
+            f"CASE WHEN Status = '{STATUS_CONCLUIDO}' THEN {postponed} "
+            f"ELSE NextRefreshAt END"
+        )
+
+    def record_failure(self, cns, error, max_retries):
+        # Na reconsulta (Status CONCLUIDO) a linha não vira ERRO: guarda o erro
+        # e adia o NextRefreshAt. Os CASE leem os valores anteriores ao UPDATE.
+        rows = self._execute(
+            f"""
+            UPDATE {TABLE_NAME}
+            SET Attempts = Attempts + 1,
+                LastError = ?,
+                Status = CASE
+                    WHEN Status = '{STATUS_CONCLUIDO}' THEN Status
+                    WHEN Attempts + 1 >= ? THEN ?
+                    ELSE Status
+                END,
+                NextRefreshAt = {self._refresh_failure_sql()}
+            WHERE CNS = ?
+            RETURNING Attempts
+            """,
+            (str(error)[:1000], max_retries, STATUS_ERRO, datetime.now(), cns),
+        )
+        return rows[0][0] if rows else None
+
+    def mark_not_found(self, cns):
+        self._execute(
+            f"""
+            UPDATE {TABLE_NAME}
+            SET LastError = ?,
+                Status = CASE WHEN Status = '{STATUS_CONCLUIDO}' THEN Status ELSE ? END,
+                NextRefreshAt = {self._refresh_failure_sql()}
+            WHERE CNS = ?
+            """,
+            (STATUS_CNS_NOT_FOUND, STATUS_NAO_ENCONTRADO, datetime.now(), cns),
+        )
+
+    def write_batch(self, rows):
+        """
+        Grava um lote de (cns, data) em uma única transação.
+
+        CNS cujo ContentHash não mudou só têm LastVerifiedAt atualizado; os
+        demais recebem os dados e, se já tinham sido extraídos, uma linha no
+        histórico. Retorna quantos CNS do lote mudaram.
+        """
+        new_data = dict(rows)
+        params = [
+            [cns, content_hash(data)] + [data.get(col) or None for col in DATA_COLUMNS]
+            for cns, data in new_data.items()
+        ]
+        hash_changed = "(t.ContentHash IS NULL OR t.ContentHash <> s.ContentHash)"
+        # Valores vazios não sobrescrevem dados existentes, como no SQL Server.
+        set_clause = ", ".join(
+            f"{col} = COALESCE(NULLIF(s.{col}, ''), t.{col})" for col in DATA_COLUMNS
+        )
+        next_refresh_unchanged = self._add_days_sql("?", refresh_days_sql(False))
+        next_refresh_changed = self._add_days_sql("?", refresh_days_sql(True))
+
+        def work():
+            now = datetime.now()
+            self._conn.execute(f"DELETE FROM {STAGING_TABLE}")
+            self._insert_rows(
+                STAGING_TABLE, ["CNS", "ContentHash"] + DATA_COLUMNS, params
+            )
+            changed = self._conn.execute(f"""
+                SELECT t.CNS, t.ContentHash, {", ".join(f"t.{col}" for col in DATA_COLUMNS)}
+                FROM {TABLE_NAME} AS t
+                JOIN {STAGING_TABLE} AS s ON s.CNS = t.CNS
+                WHERE {hash_changed}
+                """).fetchall()
+            columns = ["ContentHash"] + DATA_COLUMNS
+            old_rows = {row[0]: dict(zip(columns, row[1:])) for row in changed}
+            history = history_rows(old_rows, new_data, now)
+            if history:
+                self._insert_rows(
+                    HISTORY_TABLE, ["CNS", "ChangedAt", "Changes"], history
+                )
+            # Primeiro os que não mudaram: depois do UPDATE seguinte os hashes coincidem.
+            self._conn.execute(
+                f"""
+                UPDATE {TABLE_NAME} AS t SET
+                    LastVerifiedAt = ?,
+                    RefreshDays = {refresh_days_sql(changed=False)},
+                    NextRefreshAt = {next_refresh_unchanged},
+                    Status = ?,
+                    LastError = NULL
+                FROM {STAGING_TABLE} AS s
+                WHERE s.CNS = t.CNS AND t.ContentHash = s.ContentHash
+                """,
+                (now, now, STATUS_CONCLUIDO),
+            )
+            self._conn.execute(
+                f"""
+                UPDATE {TABLE_NAME} AS t SET
+                    {set_clause},
+                    ContentHash = s.ContentHash,
+                    data_extracao = ?,
+                    ModifiedAt = ?,
+                    LastVerifiedAt = ?,
+                    RefreshDays = {refresh_days_sql(changed=True)},
+                    NextRefreshAt = {next_refresh_changed},
+                    Status = ?,
+                    LastError = NULL
+                FROM {STAGING_TABLE} AS s
+                WHERE s.CNS = t.CNS AND {hash_changed}
+                """,
+                (now, now, now, now, STATUS_CONCLUIDO),
+            )
+            self._conn.execute(f"DELETE FROM {STAGING_TABLE}")
+            return len(old_rows)
+
+        return self._transaction(work)
+
+    def write_normalized(self, rows, atribuicoes):
+        """
+        Grava em uma transação um lote da normalização (normalize.py).
+
+        `rows` traz (CNS, *NORMALIZED_COLUMNS), gravados nessas colunas sem
+        tocar nos valores raspados, e `atribuicoes` os pares (CNS, Atribuicao)
+        desses CNS, que substituem os anteriores. Retorna quantos CNS foram gravados.
+        """
+        columns = ["CNS"] + NORMALIZED_COLUMNS
+        set_clause = ", ".join(f"{col} = s.{col}" for col in NORMALIZED_COLUMNS)
+
+        def work():
+            self._conn.execute(f"DELETE FROM {NORMALIZED_TABLE}")
+            self._insert_rows(NORMALIZED_TABLE, columns, rows)
+            now = datetime.now()
+            self._conn.execute(
+                f"""
+                UPDATE {TABLE_NAME} AS t SET
+                    {set_clause},
+                    ModifiedAt = CASE WHEN {normalized_changed_sql()}
+                        THEN ? ELSE t.ModifiedAt END,
+                    NormalizedAt = ?
+                FROM {NORMALIZED_TABLE} AS s
+                WHERE s.CNS = t.CNS
+                """,
+                (now, now),
+            )
+            self._conn.execute(
+                f"DELETE FROM {ATRIBUICOES_TABLE} "
+                f"WHERE CNS IN (SELECT CNS FROM {NORMALIZED_TABLE})"
+            )
+            if atribuicoes:
+                self._insert_rows(ATRIBUICOES_TABLE, ["CNS", "Atribuicao"], atribuicoes)
+            self._conn.execute(f"DELETE FROM {NORMALIZED_TABLE}")
+            return len(rows)
+
+        return self._transaction(work)
+
+    def database_now(self):
+        """Hora atual no relógio das gravações (calculadas em Python, ver acima)."""
+        return datetime.now()
+
+    def status_counts(self):
+        """Quantidade de linhas por Status."""
+        rows = self._query(f"SELECT Status, COUNT(*) FROM {TABLE_NAME} GROUP BY Status")
+        return {status: count for status, count in rows}
+
+
+class SqliteStorage(EmbeddedStorage):
+    """
+    Backend SQLite, em um único arquivo.
+
+    Usa WAL com `synchronous=NORMAL`: leitores (a exportação, o `status`) não
+    bloqueiam o scraper, e cada COMMIT não força um fsync. Reivindicações
+    usam `BEGIN IMMEDIATE`, então mais de um processo pode dividir o arquivo.
+    """
+
+    name = "sqlite"
+    begin_sql = "BEGIN IMMEDIATE"
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=SQLITE_BUSY_TIMEOUT,
+            isolation_level=None,  # Transações explícitas em _transaction
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _index_sql(self):
+        return super()._index_sql() + [
+            # Índice parcial: o equivalente ao índice filtrado do SQL Server.
+            f"CREATE INDEX IF NOT EXISTS IX_{TABLE_NAME}_pendentes "
+            f"ON {TABLE_NAME} (CNS) WHERE Status = '{STATUS_PENDENTE}'",
+            f"CREATE INDEX IF NOT EXISTS IX_{TABLE_NAME}_data_extracao "
+            f"ON {TABLE_NAME} (data_extracao)",
+            # Marca d'água das cargas incrementais (exportação e lookup).
+            f"CREATE INDEX IF NOT EXISTS IX_{TABLE_NAME}_ModifiedAt "
+            f"ON {TABLE_NAME} (ModifiedAt)",
+            # Fila do modo refresh: só as linhas concluídas, em ordem de vencimento.
+            f"CREATE INDEX IF NOT EXISTS IX_{TABLE_NAME}_refresh "
+            f"ON {TABLE_NAME} (NextRefreshAt) WHERE Status = '{STATUS_CONCLUIDO}'",
+        ]
+
+    def _add_days_sql(self, timestamp_sql, days_sql):
+        return f"datetime({timestamp_sql}, '+' || ({days_sql}) || ' days')"
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT)
+
+
+class DuckDbStorage(EmbeddedStorage):
+    """
+    Backend DuckDB: banco colunar em um arquivo, bom para a exportação e para
+    consultas analíticas sobre a tabela inteira.
+
+    O arquivo só pode ser aberto para escrita por um processo de cada vez;
+    rode o scraper e a exportação em sequência, não ao mesmo tempo.
+    """
+
+    name = "duckdb"
+    supports_columnar_export = True
+    text_type = "VARCHAR"
+    timestamp_type = "TIMESTAMP"
+    begin_sql = "BEGIN TRANSACTION"
+
+    def _open(self):
+        import duckdb
+
+        return duckdb.connect(self.path)
+
+    def _insert_rows(self, table, columns, rows):
+        # executemany no DuckDB insere linha a linha; um DataFrame vai de uma vez.
+        import pandas as pd
+
+        frame = pd.DataFrame(rows, columns=columns, dtype=object)
+        self._conn.register("_linhas", frame)
+        try:
+            self._conn.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"SELECT {', '.join(columns)} FROM _linhas"
+            )
+        finally:
+            self._conn.unregister("_linhas")
+
+    def _add_days_sql(self, timestamp_sql, days_sql):
+        return f"CAST({timestamp_sql} AS TIMESTAMP) + to_days(CAST(({days_sql}) AS INTEGER))"
+
+    def connect(self):
+        # Um cursor do DuckDB é uma conexão independente com o mesmo banco.
+        return self._conn.cursor()
+
+    def copy_to_parquet(self, sql, path):
+        """
+        Grava o resultado de `sql` direto em Parquet, sem passar pelo pandas.
+
+        Retorna a quantidade de linhas gravadas.
+        """
+        escaped = path.replace("'", "''")
+        with self._lock:
+            row = self._conn.execute(
+                f"COPY ({sql}) TO '{escaped}' (FORMAT PARQUET, COMPRESSION SNAPPY)"
+            ).fetchone()
+        return row[0] if row else 0
@@ -0,0 +1,548 @@
+from datetime import datetime
+
+from db import get_db_connection, get_pool
+from storage import (
+    ATRIBUICOES_TABLE,
+    CLAIM_TIMEOUT_MINUTES,
+    DATA_COLUMNS,
+    HISTORY_TABLE,
+    NORMALIZED_COLUMNS,
+    REFRESH_DEFAULT_DAYS,
+    REFRESH_FAILURE_DAYS,
+    STATUS_CONCLUIDO,
+    STATUS_ERRO,
+    STATUS_NAO_ENCONTRADO,
+    STATUS_PENDENTE,
+    STATUS_CNS_NOT_FOUND,
+    TABLE_NAME,
+    StorageUnavailableError,
+    content_hash,
+    history_rows,
+    iter_batches,
+    normalized_changed_sql,
+    refresh_days_sql,
+)
+
+# --- Configurações ---
+INSERT_BATCH_SIZE = 10_000  # Linhas enviadas à tabela temporária por vez
+
+CREATE_TABLE_SQL = f"""
+IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{TABLE_NAME}' and xtype='U')
+CREATE TABLE {TABLE_NAME} (
+    CNS VARCHAR(20) PRIMARY KEY,
+    NomeCartorio NVARCHAR(255),
+    UF CHAR(2),
+    Tabeliao NVARCHAR(255),
+    Endereco NVARCHAR(MAX),
+    CEP VARCHAR(10),
+    Telefone VARCHAR(100),
+    Email NVARCHAR(255),
+    Site NVARCHAR(255),
+    Atribuicoes NVARCHAR(MAX),
+    data_extracao DATETIME DEFAULT GETDATE(),
+    Status VARCHAR(20) NOT NULL DEFAULT 'PENDENTE',
+    Attempts INT NOT NULL DEFAULT 0,
+    LastError NVARCHAR(1000),
+    ClaimedBy VARCHAR(100),
+    ClaimedAt DATETIME,
+    ContentHash VARCHAR(64),
+    LastVerifiedAt DATETIME,
+    RefreshDays INT,
+    NextRefreshAt DATETIME,
+    NormalizedAt DATETIME,
+    ModifiedAt DATETIME DEFAULT GETDATE(),
+    CEPNormalizado VARCHAR(10),
+    TelefoneNormalizado VARCHAR(100),
+    UFNormalizada CHAR(2)
+);
+"""
+
+CREATE_HISTORY_SQL = f"""
+IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{HISTORY_TABLE}' and xtype='U')
+CREATE TABLE {HISTORY_TABLE} (
+    Id BIGINT IDENTITY PRIMARY KEY,
+    CNS VARCHAR(20) NOT NULL,
+    ChangedAt DATETIME NOT NULL DEFAULT GETDATE(),
+    Changes NVARCHAR(MAX) NOT NULL
+);
+"""
+
+CREATE_ATRIBUICOES_SQL = f"""
+IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{ATRIBUICOES_TABLE}' and xtype='U')
+CREATE TABLE {ATRIBUICOES_TABLE} (
+    CNS VARCHAR(20) NOT NULL,
+    Atribuicao NVARCHAR(255) NOT NULL
+);
+"""
+
+# Colunas adicionadas depois da criação original da tabela.
+# Aplicadas de forma idempotente para bancos que já existiam.
+MIGRATIONS_SQL = [
+    f"IF COL_LENGTH('{TABLE_NAME}', 'ClaimedBy') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD ClaimedBy VARCHAR(100);",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'ClaimedAt') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD ClaimedAt DATETIME;",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'Status') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD Status VARCHAR(20) NOT NULL "
+    f"CONSTRAINT DF_{TABLE_NAME}_Status DEFAULT 'PENDENTE';",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'Attempts') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD Attempts INT NOT NULL "
+    f"CONSTRAINT DF_{TABLE_NAME}_Attempts DEFAULT 0;",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'LastError') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD LastError NVARCHAR(1000);",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'ContentHash') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD ContentHash VARCHAR(64);",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'LastVerifiedAt') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD LastVerifiedAt DATETIME;",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'RefreshDays') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD RefreshDays INT;",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'NextRefreshAt') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD NextRefreshAt DATETIME;",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'NormalizedAt') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD NormalizedAt DATETIME;",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'ModifiedAt') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD ModifiedAt DATETIME "
+    f"CONSTRAINT DF_{TABLE_NAME}_ModifiedAt DEFAULT GETDATE();",
+    # Linhas gravadas antes da coluna ModifiedAt existir.
+    f"UPDATE {TABLE_NAME} SET ModifiedAt = CASE WHEN NormalizedAt > data_extracao "
+    f"THEN NormalizedAt ELSE data_extracao END WHERE ModifiedAt IS NULL;",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'CEPNormalizado') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD CEPNormalizado VARCHAR(10);",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'TelefoneNormalizado') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD TelefoneNormalizado VARCHAR(100);",
+    f"IF COL_LENGTH('{TABLE_NAME}', 'UFNormalizada') IS NULL "
+    f"ALTER TABLE {TABLE_NAME} ADD UFNormalizada CHAR(2);",
+    # Linhas enriquecidas antes da coluna Status existir.
+    f"UPDATE {TABLE_NAME} SET Status = 'CONCLUIDO' "
+    f"WHERE Status = 'PENDENTE' AND NomeCartorio IS NOT NULL AND NomeCartorio <> '';",
+    # Linhas concluídas antes do modo refresh: a idade de data_extracao define
+    # quando cada uma volta a ser consultada.
+    f"UPDATE {TABLE_NAME} SET RefreshDays = {REFRESH_DEFAULT_DAYS}, "
+    f"NextRefreshAt = DATEADD(DAY, {REFRESH_DEFAULT_DAYS}, COALESCE(data_extracao, GETDATE())) "
+    f"WHERE Status = 'CONCLUIDO' AND NextRefreshAt IS NULL;",
+]
+
+INDEXES_SQL = [
+    # Índice filtrado: só as linhas pendentes entram nele, então buscar
+    # trabalho continua instantâneo mesmo com a tabela quase toda concluída.
+    f"""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{TABLE_NAME}_pendentes')
+    CREATE INDEX IX_{TABLE_NAME}_pendentes ON {TABLE_NAME} (CNS)
+        INCLUDE (ClaimedBy, ClaimedAt, Attempts)
+        WHERE Status = '{STATUS_PENDENTE}';
+    """,
+    f"""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{TABLE_NAME}_data_extracao')
+    CREATE INDEX IX_{TABLE_NAME}_data_extracao ON {TABLE_NAME} (data_extracao);
+    """,
+    # Usado pelas cargas incrementais (marca d'água em ModifiedAt).
+    f"""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{TABLE_NAME}_ModifiedAt')
+    CREATE INDEX IX_{TABLE_NAME}_ModifiedAt ON {TABLE_NAME} (ModifiedAt);
+    """,
+    # Fila do modo refresh: só as linhas concluídas, em ordem de vencimento.
+    f"""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{TABLE_NAME}_refresh')
+    CREATE INDEX IX_{TABLE_NAME}_refresh ON {TABLE_NAME} (NextRefreshAt)
+        INCLUDE (ClaimedBy, ClaimedAt)
+        WHERE Status = '{STATUS_CONCLUIDO}';
+    """,
+    f"""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{HISTORY_TABLE}_CNS')
+    CREATE INDEX IX_{HISTORY_TABLE}_CNS ON {HISTORY_TABLE} (CNS, ChangedAt);
+    """,
+    f"""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{ATRIBUICOES_TABLE}_CNS')
+    CREATE INDEX IX_{ATRIBUICOES_TABLE}_CNS ON {ATRIBUICOES_TABLE} (CNS);
+    """,
+]
+
+# O Status vai literal, não como parâmetro: o SQL Server só usa um índice
+# filtrado quando o predicado da consulta bate com o filtro do índice, e um
+# plano parametrizado precisa valer para qualquer valor de Status.
+CLAIM_SQL = f"""
+    WITH lote AS (
+        SELECT TOP (?) CNS, ClaimedBy, ClaimedAt
+        FROM {TABLE_NAME} WITH (UPDLOCK, READPAST, ROWLOCK)
+        WHERE Status = '{STATUS_PENDENTE}'
+          AND (
+                ClaimedBy IS NULL
+             OR (ClaimedBy NOT LIKE ? AND ClaimedAt < DATEADD(MINUTE, -?, GETDATE()))
+          )
+        ORDER BY CNS
+    )
+    UPDATE lote SET ClaimedBy = ?, ClaimedAt = GETDATE()
+    OUTPUT inserted.CNS;
+"""
+
+# Modo refresh: linhas concluídas cujo NextRefreshAt venceu, as mais atrasadas
+# primeiro. Attempts volta a zero para que falhas antigas não contem aqui. O
+# Status vai literal pelo mesmo motivo de CLAIM_SQL (índice filtrado _refresh).
+CLAIM_REFRESH_SQL = f"""
+    WITH lote AS (
+        SELECT TOP (?) CNS, ClaimedBy, ClaimedAt, Attempts
+        FROM {TABLE_NAME} WITH (UPDLOCK, READPAST, ROWLOCK)
+        WHERE Status = '{STATUS_CONCLUIDO}'
+          AND NextRefreshAt <= GETDATE()
+          AND (
+                ClaimedBy IS NULL
+             OR (ClaimedBy NOT LIKE ? AND ClaimedAt < DATEADD(MINUTE, -?, GETDATE()))
+          )
+        ORDER BY NextRefreshAt
+    )
+    UPDATE lote SET ClaimedBy = ?, ClaimedAt = GETDATE(), Attempts = 0
+    OUTPUT inserted.CNS;
+"""
+
+# Na reconsulta (Status CONCLUIDO) a linha não vira ERRO: guarda o erro e
+# adia o NextRefreshAt. Os CASE leem os valores anteriores ao UPDATE.
+RECORD_FAILURE_SQL = f"""
+    UPDATE {TABLE_NAME}
+    SET Attempts = Attempts + 1,
+        LastError = ?,
+        Status = CASE
+            WHEN Status = '{STATUS_CONCLUIDO}' THEN Status
+            WHEN Attempts + 1 >= ? THEN ?
+            ELSE Status
+        END,
+        NextRefreshAt = CASE
+            WHEN Status = '{STATUS_CONCLUIDO}'
+            THEN DATEADD(DAY, {REFRESH_FAILURE_DAYS}, GETDATE())
+            ELSE NextRefreshAt
+        END
+    OUTPUT inserted.Attempts
+    WHERE CNS = ?;
+"""
+
+MARK_NOT_FOUND_SQL = f"""
+    UPDATE {TABLE_NAME}
+    SET LastError = ?,
+        Status = CASE WHEN Status = '{STATUS_CONCLUIDO}' THEN Status ELSE ? END,
+        NextRefreshAt = CASE
+            WHEN Status = '{STATUS_CONCLUIDO}'
+            THEN DATEADD(DAY, {REFRESH_FAILURE_DAYS}, GETDATE())
+            ELSE NextRefreshAt
+        END
+    WHERE CNS = ?;
+"""
+
+STAGING_DDL = """
+CREATE TABLE #staging_cartorios (
+    CNS VARCHAR(20) PRIMARY KEY,
+    ContentHash VARCHAR(64),
+    NomeCartorio NVARCHAR(255),
+    UF CHAR(2),
+    Tabeliao NVARCHAR(255),
+    Endereco NVARCHAR(MAX),
+    CEP VARCHAR(10),
+    Telefone VARCHAR(100),
+    Email NVARCHAR(255),
+    Site NVARCHAR(255),
+    Atribuicoes NVARCHAR(MAX)
+);
+"""
+
+_HASH_CHANGED = "(t.ContentHash IS NULL OR t.ContentHash <> s.ContentHash)"
+
+# Linhas atuais dos CNS do lote cujo conteúdo mudou, para montar o histórico.
+CHANGED_ROWS_SQL = f"""
+    SELECT t.CNS, t.ContentHash, {", ".join(f"t.{col}" for col in DATA_COLUMNS)}
+    FROM {TABLE_NAME} t
+    INNER JOIN #staging_cartorios s ON s.CNS = t.CNS
+    WHERE {_HASH_CHANGED};
+"""
+
+# Conteúdo igual ao já gravado: só registra que foi conferido.
+VERIFY_SQL = f"""
+    UPDATE t SET
+        t.LastVerifiedAt = GETDATE(),
+        t.RefreshDays = {refresh_days_sql(changed=False)},
+        t.NextRefreshAt = DATEADD(DAY, {refresh_days_sql(changed=False)}, GETDATE()),
+        t.Status = '{STATUS_CONCLUIDO}',
+        t.LastError = NULL
+    FROM {TABLE_NAME} t
+    INNER JOIN #staging_cartorios s ON s.CNS = t.CNS
+    WHERE t.ContentHash = s.ContentHash;
+"""
+
+# Valores vazios não sobrescrevem dados existentes.
+_SET_CLAUSE = ",\n        ".join(
+    f"t.{col} = COALESCE(NULLIF(s.{col}, ''), t.{col})" for col in DATA_COLUMNS
+)
+MERGE_SQL = f"""
+    UPDATE t SET
+        {_SET_CLAUSE},
+        t.ContentHash = s.ContentHash,
+        t.data_extracao = GETDATE(),
+        t.ModifiedAt = GETDATE(),
+        t.LastVerifiedAt = GETDATE(),
+        t.RefreshDays = {refresh_days_sql(changed=True)},
+        t.NextRefreshAt = DATEADD(DAY, {refresh_days_sql(changed=True)}, GETDATE()),
+        t.Status = '{STATUS_CONCLUIDO}',
+        t.LastError = NULL
+    FROM {TABLE_NAME} t
+    INNER JOIN #staging_cartorios s ON s.CNS = t.CNS
+    WHERE {_HASH_CHANGED};
+"""
+
+
+NORMALIZED_DDL = """
+CREATE TABLE #normalizados (
+    CNS VARCHAR(20) PRIMARY KEY,
+    CEPNormalizado VARCHAR(10),
+    TelefoneNormalizado VARCHAR(100),
+    UFNormalizada CHAR(2)
+);
+"""
+
+NORMALIZE_SQL = f"""
+    UPDATE t SET
+        {", ".join(f"t.{col} = s.{col}" for col in NORMALIZED_COLUMNS)},
+        t.ModifiedAt = CASE WHEN {normalized_changed_sql()}
+            THEN GETDATE() ELSE t.ModifiedAt END,
+        t.NormalizedAt = GETDATE()
+    FROM {TABLE_NAME} t
+    INNER JOIN #normalizados s ON s.CNS = t.CNS;
+"""
+
+
+class SqlServerStorage:
+    """
+    Backend SQL Server (pyodbc), o original do projeto.
+
+    As operações curtas da fila usam o pool de conexões de `db.py`; a
+    reivindicação de lotes usa `UPDLOCK, READPAST` para que vários processos
+    possam trabalhar na mesma tabela ao mesmo tempo.
+    """
+
+    name = "sqlserver"
+    supports_columnar_export = False
+
+    def connect(self):
+        """Abre uma conexão nova (o chamador a fecha), por exemplo para exportar."""
+        conn = get_db_connection()
+        if not conn:
+            raise StorageUnavailableError("Não foi possível conectar ao SQL Server.")
+        return conn
+
+    def create_schema(self):
+        conn = self.connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(CREATE_TABLE_SQL)
+                cursor.execute(CREATE_HISTORY_SQL)
+                cursor.execute(CREATE_ATRIBUICOES_SQL)
+                for migration_sql in MIGRATIONS_SQL:
+                    cursor.execute(migration_sql)
+                for index_sql in INDEXES_SQL:
+                    cursor.execute(index_sql)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def insert_new_cns(self, cns_iterable, on_progress=None):
+        """
+        Insere os CNS que ainda não existem, sem trazer as chaves do banco.
+
+        Os CNS vão em lotes para uma tabela temporária (fast_executemany) e a
+        filtragem dos já existentes acontece no servidor com INSERT ... WHERE
+        NOT EXISTS, apoiada pela chave primária. Retorna (enviados, inseridos).
+        """
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("CREATE TABLE #novos_cns (CNS VARCHAR(20) NOT NULL);")
+            cursor.fast_executemany = True
+
+            sent = 0
+            for batch in iter_batches(cns_iterable, INSERT_BATCH_SIZE):
+                cursor.executemany(
+                    "INSERT INTO #novos_cns (CNS) VALUES (?)", [(cns,) for cns in batch]
+                )
+                sent += len(batch)
+                if on_progress:
+                    on_progress(sent)
+
+            cursor.execute(f"""
+                INSERT INTO {TABLE_NAME} (CNS)
+                SELECT DISTINCT s.CNS
+                FROM #novos_cns s
+                WHERE NOT EXISTS (SELECT 1 FROM {TABLE_NAME} t WHERE t.CNS = s.CNS);
+                """)
+            inserted = cursor.rowcount
+            cursor.execute("DROP TABLE #novos_cns;")
+            conn.commit()
+            return sent, inserted
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def get_pending_cns(self):
+        conn = self.connect()
+        try:
+            with conn.cursor() as cursor:
+                # A lógica de "resumível": pegamos apenas as linhas PENDENTE, que
+                # são atendidas pelo índice filtrado IX_cartorios_enriquecidos_pendentes
+                # (Status literal, ver CLAIM_SQL).
+                cursor.execute(
+                    f"SELECT CNS FROM {TABLE_NAME} "
+                    f"WHERE Status = '{STATUS_PENDENTE}' ORDER BY CNS"
+                )
+                return [row.CNS for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def claim_batch(self, run_id, worker_id, batch_size):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    CLAIM_SQL,
+                    batch_size,
+                    f"{run_id}:%",
+                    CLAIM_TIMEOUT_MINUTES,
+                    f"{run_id}:{worker_id}",
+                )
+                cns_list = [row.CNS for row in cursor.fetchall()]
+            conn.commit()
+        return cns_list
+
+    def claim_refresh_batch(self, run_id, worker_id, batch_size):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    CLAIM_REFRESH_SQL,
+                    batch_size,
+                    f"{run_id}:%",
+                    CLAIM_TIMEOUT_MINUTES,
+                    f"{run_id}:{worker_id}",
+                )
+                cns_list = [row.CNS for row in cursor.fetchall()]
+            conn.commit()
+        return cns_list
+
+    def release_claims(self, run_id):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {TABLE_NAME} SET ClaimedBy = NULL, ClaimedAt = NULL "
+                    f"WHERE ClaimedBy LIKE ?",
+                    f"{run_id}:%",
+                )
+            conn.commit()
+
+    def update_cartorio_data(self, cns, update_data):
+        # Mesmo caminho do lote, para que a detecção de mudança valha aqui também.
+        self.write_batch([(cns, update_data)])
+
+    def record_failure(self, cns, error, max_retries):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    RECORD_FAILURE_SQL, str(error)[:1000], max_retries, STATUS_ERRO, cns
+                )
+                row = cursor.fetchone()
+            conn.commit()
+        return row.Attempts if row else None
+
+    def mark_not_found(self, cns):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    MARK_NOT_FOUND_SQL, STATUS_CNS_NOT_FOUND, STATUS_NAO_ENCONTRADO, cns
+                )
+            conn.commit()
+
+    def write_batch(self, rows):
+        """
+        Grava um lote de (cns, data) em uma única transação.
+
+        Os dados vão para uma tabela temporária via `fast_executemany`. CNS
+        cujo ContentHash não mudou só têm LastVerifiedAt atualizado; os demais
+        recebem os dados com um único UPDATE ... FROM e, se já tinham sido
+        extraídos antes, uma linha em cartorios_historico com o que mudou.
+        Retorna quantos CNS do lote mudaram.
+        """
+        new_data = dict(rows)
+        params = [
+            [cns, content_hash(data)] + [data.get(col) or None for col in DATA_COLUMNS]
+            for cns, data in new_data.items()
+        ]
+        placeholders = ", ".join("?" * (len(DATA_COLUMNS) + 2))
+
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(STAGING_DDL)
+                cursor.fast_executemany = True
+                cursor.executemany(
+                    f"INSERT INTO #staging_cartorios VALUES ({placeholders})", params
+                )
+                cursor.execute(CHANGED_ROWS_SQL)
+                columns = ["ContentHash"] + DATA_COLUMNS
+                old_rows = {
+                    row[0]: dict(zip(columns, row[1:])) for row in cursor.fetchall()
+                }
+                history = history_rows(old_rows, new_data, datetime.now())
+                if history:
+                    cursor.executemany(
+                        f"INSERT INTO {HISTORY_TABLE} (CNS, ChangedAt, Changes) "
+                        f"VALUES (?, ?, ?)",
+                        history,
+                    )
+                # VERIFY antes do MERGE: depois dele os hashes novos já coincidem.
+                cursor.execute(VERIFY_SQL)
+                cursor.execute(MERGE_SQL)
+                cursor.execute("DROP TABLE #staging_cartorios")
+            conn.commit()
+        return len(old_rows)
+
+    def write_normalized(self, rows, atribuicoes):
+        """
+        Grava em uma transação um lote da normalização (normalize.py).
+
+        `rows` traz (CNS, *NORMALIZED_COLUMNS), gravados nessas colunas sem
+        tocar nos valores raspados, e `atribuicoes` os pares (CNS, Atribuicao)
+        desses CNS, que substituem os anteriores. Ambos vão via `fast_executemany`. Retorna quantos CNS foram gravados.
+        """
+        placeholders = ", ".join("?" * (len(NORMALIZED_COLUMNS) + 1))
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(NORMALIZED_DDL)
+                cursor.fast_executemany = True
+                cursor.executemany(
+                    f"INSERT INTO #normalizados VALUES ({placeholders})", rows
+                )
+                cursor.execute(NORMALIZE_SQL)
+                cursor.execute(
+                    f"DELETE a FROM {ATRIBUICOES_TABLE} a "
+                    f"INNER JOIN #normalizados s ON s.CNS = a.CNS;"
+                )
+                if atribuicoes:
+                    cursor.executemany(
+                        f"INSERT INTO {ATRIBUICOES_TABLE} (CNS, Atribuicao) "
+                        f"VALUES (?, ?)",
+                        atribuicoes,
+                    )
+                cursor.execute("DROP TABLE #normalizados")
+            conn.commit()
+        return len(rows)
+
+    def database_now(self):
+        """Hora atual do servidor, o mesmo relógio do GETDATE() das gravações."""
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT GETDATE()")
+                return cursor.fetchone()[0]
+
+    def status_counts(self):
+        """Quantidade de linhas por Status."""
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT Status, COUNT(*) FROM {TABLE_NAME} GROUP BY Status"
+                )
+                return {status: count for status, count in cursor.fetchall()}
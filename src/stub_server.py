@@ -0,0 +1,243 @@
+import argparse
+import html
+import os
+import random
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# --- Configurações ---
+DEFAULT_PORT = 8765
+PAGE_PATH = "/CartorioNacional/CartorioNacional.aspx"
+INITIAL_PAGE_FILE = "pagina_inicial.html"
+CNS_INPUT_NAME = "txtListaCartoriosCNS"
+NOT_FOUND_RESPONSE = "<script>alert('CNS não cadastrado');</script>"
+SYNTHETIC_UFS = ["SP", "RJ", "MG", "PR", "RS", "BA", "PE", "SC", "GO", "DF"]
+
+# Página sintética: mesmo formulário, ScriptManager e painel do site real.
+# No navegador, digitar os 6 dígitos do CNS dispara o postback completo,
+# como o AutoPostBack do campo original.
+SYNTHETIC_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Cartório Nacional (stub)</title></head>
+<body><form method="post" action="{page_path}" id="form1">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{viewstate}" />
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="stub" />
+<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />
+<input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="" />
+<script type="text/javascript">
+function __doPostBack(target, argument) {{
+    var form = document.getElementById('form1');
+    form.__EVENTTARGET.value = target;
+    form.__EVENTARGUMENT.value = argument;
+    form.submit();
+}}
+if (window.Sys) {{ Sys.WebForms.PageRequestManager._initialize('ScriptManager1', 'form1', ['tUpdatePanel1','UpdatePanel1'], [], [], 90, ''); }}
+</script>
+<input name="{input_name}" type="text" id="{input_name}"
+    onkeyup="if (this.value.replace(/\\D/g, '').length >= 6) __doPostBack('{input_name}', '')" />
+<div id="UpdatePanel1">{panel}</div>
+{script}
+</form></body></html>
+"""
+
+SYNTHETIC_PANEL = """<div id="panelDadosCartorio"><div><ul>\
+<li><span id="lblRazao">{nome}</span></li>\
+<li><span id="lblResponsavel">TABELIÃO {numero}</span></li>\
+<li><span id="lblLogradouro">RUA DOS CARTÓRIOS</span> <span id="lblNumero">{numero}</span>\
+<span id="lblComplemento"></span><span id="lblBairro">CENTRO</span></li>\
+<li><span id="lblCep">{cep}</span></li>\
+<li><span id="lblDDDTelefone">11</span><span id="lblTelefone">3000-{numero}</span>\
+<span id="lblEmail">cartorio{cns}@exemplo.com.br</span></li>\
+<li><b>Site:</b> www.cartorio{cns}.com.br</li>\
+<li><b>Serviços ativados ao cartório:</b> Certidão Digital / e-Protocolo</li>\
+</ul></div></div>"""
+
+
+def _cns_fraction(cns):
+    """Número em [0, 1) derivado do CNS, estável entre execuções."""
+    return (zlib.crc32(cns.encode("utf-8")) % 10_000) / 10_000
+
+
+def synthetic_panel(cns):
+    """Painel de resultados determinístico para um CNS qualquer."""
+    index = zlib.crc32(cns.encode("utf-8"))
+    uf = SYNTHETIC_UFS[index % len(SYNTHETIC_UFS)]
+    numero = cns[-4:]
+    return SYNTHETIC_PANEL.format(
+        nome=f"{int(cns) % 30 + 1}º TABELIONATO DE NOTAS - {uf}",
+        numero=numero,
+        cep=f"{index % 100_000:05d}-{index % 1000:03d}",
+        cns=html.escape(cns),
+    )
+
+
+def async_delta(*entries):
+    """Monta uma resposta parcial do ASP.NET AJAX a partir de (tipo, id, conteúdo)."""
+    return "".join(f"{len(c)}|{t}|{i}|{c}|" for t, i, c in entries)
+
+
+def make_handler(
+    pages_dir=None,
+    latency_ms=0,
+    jitter_ms=0,
+    error_rate=0.0,
+    not_found_rate=0.0,
+):
+    """
+    Cria o handler do stub.
+
+    Com `pages_dir`, serve as páginas gravadas pelo `HttpEngine(record_dir=...)`:
+    GET devolve `pagina_inicial.html`; POST devolve `<CNS>.html` de acordo com
+    o valor de `txtListaCartoriosCNS`, ou o alerta de "CNS não cadastrado".
+
+    Sem `pages_dir`, gera páginas sintéticas para qualquer CNS, tanto no
+    formato de página inteira (Selenium) quanto no de resposta parcial do
+    UpdatePanel (motores HTTP). Uma fração fixa dos CNS (`not_found_rate`)
+    recebe o alerta de "CNS não cadastrado".
+
+    Toda requisição espera `latency_ms` ± `jitter_ms`, e uma fração
+    `error_rate` delas falha com HTTP 500, para simular o site sob carga.
+    """
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _read_page(self, filename):
+            path = os.path.join(pages_dir, filename)
+            if not os.path.exists(path):
+                return None
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+
+        def _inject_faults(self):
+            """Aplica a latência configurada; retorna True se deve simular erro."""
+            delay = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+            if delay > 0:
+                time.sleep(delay / 1000)
+            if error_rate and random.random() < error_rate:
+                self._send(500, "Erro simulado pelo stub")
+                return True
+            return False
+
+        def _synthetic_page(self, panel="", script=""):
+            return SYNTHETIC_PAGE.format(
+                page_path=PAGE_PATH,
+                viewstate=f"stub{random.randrange(10**9)}",
+                input_name=CNS_INPUT_NAME,
+                panel=panel,
+                script=script,
+            )
+
+        def do_GET(self):
+            if self.path.split("?")[0] != PAGE_PATH:
+                self._send(404, "Not Found")
+                return
+            if self._inject_faults():
+                return
+            if pages_dir is None:
+                self._send(200, self._synthetic_page())
+                return
+            page = self._read_page(INITIAL_PAGE_FILE)
+            if page is None:
+                self._send(500, f"{INITIAL_PAGE_FILE} não encontrado em {pages_dir}")
+                return
+            self._send(200, page)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            form = parse_qs(self.rfile.read(length).decode("utf-8"))
+            cns = form.get(CNS_INPUT_NAME, [""])[0].strip()
+            if self._inject_faults():
+                return
+            if pages_dir is not None:
+                page = self._read_page(f"{cns}.html") if cns else None
+                self._send(200, page if page is not None else NOT_FOUND_RESPONSE)
+                return
+
+            digits = "".join(ch for ch in cns if ch.isdigit())
+            found = bool(digits) and _cns_fraction(digits) >= not_found_rate
+            partial = self.headers.get("X-MicrosoftAjax") == "Delta=true"
+            viewstate = f"stub{random.randrange(10**9)}"
+            if partial and found:
+                body = async_delta(
+                    ("updatePanel", "UpdatePanel1", synthetic_panel(digits)),
+                    ("hiddenField", "__VIEWSTATE", viewstate),
+                )
+            elif partial:
+                body = async_delta(
+                    ("updatePanel", "UpdatePanel1", ""),
+                    ("hiddenField", "__VIEWSTATE", viewstate),
+                    ("scriptStartupBlock", "ScriptContentNoTags", NOT_FOUND_RESPONSE),
+                )
+            elif found:
+                body = self._synthetic_page(panel=synthetic_panel(digits))
+            else:
+                body = self._synthetic_page(script=NOT_FOUND_RESPONSE)
+            self._send(200, body)
+
+        def log_message(self, format, *args):
+            pass  # Mantém o console limpo durante os testes.
+
+    return StubHandler
+
+
+def serve(pages_dir=None, port=DEFAULT_PORT, **faults):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(pages_dir, **faults))
+    server.daemon_threads = True
+    print(f"Stub do CartorioNacional em http://127.0.0.1:{port}{PAGE_PATH}")
+    if pages_dir:
+        print(f"Servindo páginas gravadas de: {pages_dir}")
+    else:
+        print("Servindo páginas sintéticas para qualquer CNS.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Servidor local que imita o CartorioNacional.aspx."
+    )
+    parser.add_argument(
+        "pages_dir",
+        nargs="?",
+        help="Pasta com as páginas gravadas. Sem ela, gera páginas sintéticas.",
+    )
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--latency-ms", type=float, default=0, help="Latência por requisição."
+    )
+    parser.add_argument(
+        "--jitter-ms", type=float, default=0, help="Variação aleatória da latência."
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fração das requisições que falha com HTTP 500.",
+    )
+    parser.add_argument(
+        "--not-found-rate",
+        type=float,
+        default=0.0,
+        help="Fração dos CNS sintéticos tratados como não cadastrados.",
+    )
+    args = parser.parse_args()
+    serve(
+        args.pages_dir,
+        args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        not_found_rate=args.not_found_rate,
+    )
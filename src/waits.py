@@ -0,0 +1,188 @@
+import threading
+import time
+from collections import deque
+
+from selenium.common.exceptions import (
+    StaleElementReferenceException,
+    TimeoutException,
+    UnexpectedAlertPresentException,
+    WebDriverException,
+)
+
+from extraction import CNS_NOT_FOUND_ALERT, CnsNaoCadastradoError
+
+# Esperas guiadas pela própria página, no lugar do WebDriverWait.
+#
+# O WebDriverWait consulta o navegador a cada 500 ms, o que soma em média um
+# quarto de segundo ocioso por espera. Aqui um único `execute_async_script`
+# injeta um MutationObserver que reavalia a condição a cada mudança no DOM e
+# devolve o resultado no mesmo instante. O `window.alert` da página é trocado
+# durante a espera, então o "CNS não cadastrado" também chega na hora, sem
+# deixar um alerta aberto no navegador.
+#
+# Os limites de tempo se ajustam às latências observadas (AdaptiveTimeout).
+
+# --- Configurações ---
+SCRIPT_TIMEOUT_MARGIN = 2  # segundos a mais no script timeout do WebDriver
+NAVIGATION_RETRY_SECONDS = 0.05  # pausa ao reinjetar o observer após uma navegação
+ADAPTIVE_WINDOW = 200  # latências guardadas por tipo de espera
+ADAPTIVE_MIN_SAMPLES = 20  # antes disso vale o limite inicial
+ADAPTIVE_QUANTILE = 0.99
+ADAPTIVE_FACTOR = 3  # limite = p99 observado x fator
+# Mensagens do ChromeDriver quando o documento é trocado durante o script (em
+# geral como JavascriptException). Só esses erros fazem a espera reinjetar o
+# observer; sessão perdida, janela fechada ou erro no script sobem na hora.
+NAVIGATION_ERRORS = (
+    "document unloaded",
+    "execution context was destroyed",
+    "cannot find context with specified id",
+)
+
+# `check()` é o corpo da condição: devolve o resultado ou null. Os argumentos
+# da espera ficam em `args`; os dois últimos são o limite (ms) e o callback.
+OBSERVER_TEMPLATE = """
+var done = arguments[arguments.length - 1];
+var timeoutMs = arguments[arguments.length - 2];
+var args = Array.prototype.slice.call(arguments, 0, arguments.length - 2);
+function check() { /*CHECK*/ }
+var first = check();
+if (first !== null && first !== undefined) { done({value: first}); return; }
+var finished = false, originalAlert = window.alert, observer, timer;
+function finish(result) {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    clearTimeout(timer);
+    window.alert = originalAlert;
+    done(result);
+}
+window.alert = function (message) { finish({alert: String(message)}); };
+observer = new MutationObserver(function () {
+    var value = check();
+    if (value !== null && value !== undefined) finish({value: value});
+});
+observer.observe(document.documentElement, {
+    childList: true, subtree: true, attributes: true, characterData: true
+});
+timer = setTimeout(function () { finish(null); }, timeoutMs);
+"""
+
+
+def observer_script(check_body):
+    """Monta o script de espera para a condição `check_body` (corpo de função JS)."""
+    return OBSERVER_TEMPLATE.replace("/*CHECK*/", check_body)
+
+
+class AdaptiveTimeout:
+    """
+    Limite de espera que acompanha a distribuição de latências observada.
+
+    Até ter `min_samples` medições vale `initial`; depois, o limite é o p99
+    das últimas `window` esperas vezes `factor`, entre `floor` e `ceiling`.
+    Uma espera que estoura entra na conta com o próprio limite, então um site
+    que ficou lento faz o limite crescer em vez de gerar timeouts em série.
+    """
+
+    def __init__(
+        self,
+        initial,
+        floor,
+        ceiling,
+        window=ADAPTIVE_WINDOW,
+        min_samples=ADAPTIVE_MIN_SAMPLES,
+        factor=ADAPTIVE_FACTOR,
+    ):
+        self.initial = initial
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.factor = factor
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.initial
+            ordered = sorted(self._samples)
+        index = int(ADAPTIVE_QUANTILE * (len(ordered) - 1))
+        return min(self.ceiling, max(self.floor, ordered[index] * self.factor))
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+
+# Um limite por tipo de espera, compartilhado por todos os workers do processo.
+INPUT_TIMEOUT = AdaptiveTimeout(initial=10, floor=2, ceiling=20)
+PANEL_TIMEOUT = AdaptiveTimeout(initial=15, floor=3, ceiling=30)
+
+
+def raise_for_alert(message):
+    """Converte um alerta capturado na exceção que o scraper já trata."""
+    if CNS_NOT_FOUND_ALERT in message:
+        raise CnsNaoCadastradoError(message)
+    raise UnexpectedAlertPresentException(
+        f"Alerta inesperado: {message}", alert_text=message
+    )
+
+
+def is_navigation_error(error):
+    """Se o erro do WebDriver só indica que a página navegou durante o script."""
+    if isinstance(error, StaleElementReferenceException):
+        return True
+    message = (error.msg or "").lower()
+    return any(text in message for text in NAVIGATION_ERRORS)
+
+
+def wait_until(driver, script, *args, timeout=PANEL_TIMEOUT):
+    """
+    Executa o `script` de `observer_script` até a condição devolver um valor.
+
+    Retorna esse valor. Levanta TimeoutException quando o limite estoura,
+    CnsNaoCadastradoError ou UnexpectedAlertPresentException se a página
+    abrir um alerta. Se a página navegar no meio da espera (um postback
+    completo), o observer é injetado de novo no documento novo; qualquer
+    outro erro do WebDriver é repassado ao chamador.
+    """
+    limit = timeout.current()
+    start = time.monotonic()
+    deadline = start + limit
+    driver.set_script_timeout(limit + SCRIPT_TIMEOUT_MARGIN)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            result = driver.execute_async_script(script, *args, int(remaining * 1000))
+        except UnexpectedAlertPresentException:
+            raise  # Alerta aberto antes do observer (na carga de uma página nova).
+        except TimeoutException:
+            break  # Script timeout do WebDriver: conta como a espera estourada.
+        except WebDriverException as e:
+            if not is_navigation_error(e):
+                raise
+            # Documento descarregado durante a espera: a página navegou.
+            time.sleep(NAVIGATION_RETRY_SECONDS)
+            continue
+        if result is None:
+            break
+        if "alert" in result:
+            timeout.record(time.monotonic() - start)
+            raise_for_alert(result["alert"])
+        timeout.record(time.monotonic() - start)
+        return result["value"]
+
+    timeout.record(limit)
+    raise TimeoutException(f"Condição não atendida em {limit:.1f}s.")
+
+
+# Condições usadas pelo scraper.
+ELEMENT_PRESENT_JS = observer_script(
+    "return document.getElementById(args[0]) ? true : null;"
+)
+
+
+def wait_for_element(driver, element_id, timeout=INPUT_TIMEOUT):
+    """Espera um elemento com o id `element_id` existir no documento."""
+    return wait_until(driver, ELEMENT_PRESENT_JS, element_id, timeout=timeout)
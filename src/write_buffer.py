@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from log_setup import fields
+from metrics import METRICS
+from storage import get_storage
+
+# --- Configurações ---
+FLUSH_MAX_ROWS = 200  # Descarrega quando o buffer atinge este tamanho...
+FLUSH_MAX_SECONDS = 5.0  # ...ou quando a linha mais antiga espera este tempo.
+
+
+def write_batch(rows):
+    """
+    Grava um lote de (cns, data) em uma única transação.
+
+    Cada backend usa o caminho mais barato que tem: no SQL Server, uma tabela
+    temporária preenchida via `fast_executemany` e um único UPDATE ... FROM.
+    Linhas com o mesmo conteúdo já gravado só têm LastVerifiedAt atualizado.
+    Retorna quantos CNS do lote mudaram.
+    """
+    return get_storage().write_batch(rows)
+
+
+class WriteBehindBuffer:
+    """
+    Acumula resultados do scraping e os grava no banco em lotes.
+
+    Uma thread de fundo descarrega o buffer quando ele atinge `max_rows`
+    linhas ou quando a linha mais antiga espera `max_seconds`.
+
+    Uma linha só é considerada confirmada depois do COMMIT do lote que a
+    contém; nesse momento `on_commit(lista_de_cns)` é chamado. Se o processo
+    cair antes disso, a linha continua pendente no banco e será raspada de
+    novo, mas nunca se perde uma linha já confirmada. Lotes que falham voltam
+    para o buffer e são tentados de novo na próxima descarga.
+
+    Com um `journal` (CheckpointJournal), cada resultado é escrito nele ao
+    entrar no buffer e sincronizado em disco antes do lote ir para o banco;
+    se o processo cair, o resultado é regravado pelo replay, sem novo scraping.
+    O buffer guarda o número de sequência do journal junto com cada linha,
+    para confirmar exatamente o resultado que foi gravado.
+    """
+
+    def __init__(
+        self,
+        max_rows=FLUSH_MAX_ROWS,
+        max_seconds=FLUSH_MAX_SECONDS,
+        on_commit=None,
+        journal=None,
+    ):
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.on_commit = on_commit
+        self.journal = journal
+        self._rows = OrderedDict()
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="write-behind", daemon=True
+        )
+        self._thread.start()
+
+    def add(self, cns, data):
+        """Enfileira um resultado. Não bloqueia: a gravação ocorre em segundo plano."""
+        with self._lock:
+            # Sob o lock, a ordem do journal é a mesma do buffer.
+            seq = self.journal.append(cns, data) if self.journal is not None else None
+            # Um CNS repetido no mesmo lote fica apenas com o resultado mais novo.
+            self._rows.pop(cns, None)
+            self._rows[cns] = (data, seq)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._rows) >= self.max_rows
+        if full:
+            self._wakeup.set()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rows)
+
+    def flush(self):
+        """Grava tudo o que está no buffer. Retorna False se o lote falhar."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._rows:
+                    return True
+                rows = list(self._rows.items())
+                self._rows.clear()
+                self._oldest = None
+
+            start = time.monotonic()
+            try:
+                if self.journal is not None:
+                    self.journal.sync()
+                changed = write_batch([(cns, data) for cns, (data, _) in rows])
+            except Exception as e:
+                METRICS.inc("db_write_failures")
+                logging.error(
+                    f"Falha ao gravar lote de {len(rows)} CNS: {e}. O lote será reenviado.",
+                    extra=fields(
+                        stage="db_write_failed", duration=time.monotonic() - start
+                    ),
+                )
+                with self._lock:
+                    # Devolve o lote à frente do buffer sem sobrescrever
+                    # resultados mais novos que chegaram nesse meio-tempo.
+                    for cns, entry in reversed(rows):
+                        if cns not in self._rows:
+                            self._rows[cns] = entry
+                            self._rows.move_to_end(cns, last=False)
+                    if self._oldest is None:
+                        self._oldest = start
+                return False
+
+            elapsed = time.monotonic() - start
+            METRICS.observe("db_write", elapsed)
+            METRICS.inc("rows_changed", changed)
+            METRICS.inc("rows_unchanged", len(rows) - changed)
+            logging.info(
+                f"Lote de {len(rows)} CNS gravado no banco em {elapsed:.2f}s "
+                f"({changed} com alteração).",
+                extra=fields(stage="db_write", duration=elapsed),
+            )
+            if self.journal is not None:
+                self.journal.mark_committed([(cns, seq) for cns, (_, seq) in rows])
+            if self.on_commit:
+                self.on_commit([cns for cns, _ in rows])
+            return True
+
+    def _due(self):
+        with self._lock:
+            if not self._rows:
+                return False
+            if len(self._rows) >= self.max_rows:
+                return True
+            return time.monotonic() - self._oldest >= self.max_seconds
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(timeout=self.max_seconds / 2)
+            self._wakeup.clear()
+            if self._due() and not self.flush():
+                # Banco indisponível: espera um pouco antes de tentar de novo.
+                time.sleep(self.max_seconds)
+
+    def close(self):
+        """Para a thread de fundo e grava o que restou no buffer."""
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        if not self.flush():
+            if self.journal is not None:
+                logging.critical(
+                    f"{len(self)} CNS não puderam ser gravados agora; ficam no journal "
+                    f"'{self.journal.path}' e serão regravados sem novo scraping."
+                )
+            else:
+                logging.critical(
+                    f"{len(self)} CNS não puderam ser gravados e continuam pendentes no banco."
+                )
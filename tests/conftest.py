@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos ficam soltos em src/ e são importados pelo nome, como nos scripts.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@pytest.fixture
+def fixture_text():
+    """Lê um arquivo de tests/fixtures sem converter as quebras de linha."""
+
+    def read(name):
+        with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8", newline="") as f:
+            return f.read()
+
+    return read
@@ -0,0 +1,103 @@
+import pytest
+
+from extraction import (
+    DEFAULT_NOT_FOUND_TEXT,
+    FIELD_SELECTORS,
+    build_cartorio_data,
+    parse_panel_html,
+)
+
+PAINEL_COMPLETO = {
+    "NomeCartorio": (
+        "1º TABELIÃO DE NOTAS E DE PROTESTO DE LETRAS E TÍTULOS DE CAMPINAS - SP"
+    ),
+    "Tabeliao": "MARIA DA SILVA",
+    "Endereco": "RUA BARÃO DE JAGUARA, 1000, SALA 12, CENTRO",
+    "CEP": "13015-001",
+    "Telefone": "(19) 3231-0000",
+    "Email": "contato@1tabeliaocampinas.com.br",
+    "Site": "www.1tabeliaocampinas.com.br",
+    "Atribuicoes": "Certidão Digital / e-Protocolo",
+    "UF": "SP",
+}
+
+
+def raw_fields(**overrides):
+    """Campos brutos com todos os elementos ausentes, exceto `overrides`."""
+    raw = dict.fromkeys(FIELD_SELECTORS, DEFAULT_NOT_FOUND_TEXT)
+    raw.update(overrides)
+    return raw
+
+
+def test_parse_panel_html_full_page(fixture_text):
+    assert parse_panel_html(fixture_text("painel_completo.html")) == PAINEL_COMPLETO
+
+
+def test_parse_panel_html_missing_fields(fixture_text):
+    data = parse_panel_html(fixture_text("painel_campos_ausentes.html"))
+
+    assert data == {
+        "NomeCartorio": "CARTÓRIO DE REGISTRO CIVIL DO DISTRITO DE JOAQUIM EGÍDIO",
+        "Tabeliao": DEFAULT_NOT_FOUND_TEXT,
+        "Endereco": "AVENIDA PRINCIPAL, S/N",
+        "CEP": "13108-000",
+        "Telefone": DEFAULT_NOT_FOUND_TEXT,
+        "Email": DEFAULT_NOT_FOUND_TEXT,
+        "Site": DEFAULT_NOT_FOUND_TEXT,
+        "Atribuicoes": DEFAULT_NOT_FOUND_TEXT,
+        "UF": "",
+    }
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        "<html><body><p>Nenhum resultado</p></body></html>",
+        '<div id="panelDadosCartorio"></div>',
+    ],
+)
+def test_parse_panel_html_without_panel(html):
+    with pytest.raises(ValueError):
+        parse_panel_html(html)
+
+
+def test_build_cartorio_data_all_missing():
+    data = build_cartorio_data(raw_fields())
+
+    assert data["Endereco"] == DEFAULT_NOT_FOUND_TEXT
+    assert data["Telefone"] == DEFAULT_NOT_FOUND_TEXT
+    assert data["Site"] == DEFAULT_NOT_FOUND_TEXT
+    assert data["UF"] == ""
+
+
+def test_build_cartorio_data_phone_needs_ddd_and_number():
+    only_ddd = build_cartorio_data(raw_fields(DDD="11"))
+    both = build_cartorio_data(raw_fields(DDD="11", Telefone="3000-1234"))
+
+    assert only_ddd["Telefone"] == DEFAULT_NOT_FOUND_TEXT
+    assert both["Telefone"] == "(11) 3000-1234"
+
+
+def test_build_cartorio_data_strips_labels():
+    data = build_cartorio_data(
+        raw_fields(
+            Site="Site: www.cartorio.com.br",
+            Atribuicoes="Serviços ativados ao cartório: Certidão Digital",
+        )
+    )
+
+    assert data["Site"] == "www.cartorio.com.br"
+    assert data["Atribuicoes"] == "Certidão Digital"
+
+
+@pytest.mark.parametrize(
+    "nome, uf",
+    [
+        ("2º TABELIÃO DE NOTAS DE SANTANA DE PARNAÍBA - SP", "SP"),
+        ("OFICIAL DE REGISTRO CIVIL DE NITERÓI-rj", "RJ"),
+        ("CARTÓRIO DO 1º OFÍCIO DE BRASÍLIA", ""),
+        ("TABELIONATO DE NOTAS - XX", ""),
+    ],
+)
+def test_build_cartorio_data_uf_from_name(nome, uf):
+    assert build_cartorio_data(raw_fields(NomeCartorio=nome))["UF"] == uf
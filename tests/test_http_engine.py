@@ -0,0 +1,90 @@
+import pytest
+
+from extraction import CnsNaoCadastradoError, parse_panel_html
+from http_engine import (
+    HttpEngineError,
+    extract_panel_html,
+    interpret_response,
+    parse_async_delta,
+)
+from test_extraction import PAINEL_COMPLETO
+
+CNS = "123456"
+
+
+def test_parse_async_delta_content_with_separator(fixture_text):
+    entries = parse_async_delta(fixture_text("delta_painel.txt"))
+
+    assert [(kind, entry_id) for kind, entry_id, _ in entries] == [
+        ("updatePanel", "UpdatePanel1"),
+        ("hiddenField", "__VIEWSTATE"),
+        ("hiddenField", "__EVENTVALIDATION"),
+    ]
+    # O tamanho do bloco manda: o '|' dentro do conteúdo não corta o valor.
+    assert entries[1][2] == "vs-novo|com-barra"
+
+
+def test_parse_async_delta_malformed():
+    with pytest.raises(HttpEngineError):
+        parse_async_delta("10|updatePanel")
+
+
+def test_extract_panel_html_from_delta(fixture_text):
+    hidden_fields = {"__VIEWSTATE": "vs-antigo", "__EVENTTARGET": ""}
+
+    panel_html = extract_panel_html(
+        fixture_text("delta_painel.txt"), CNS, hidden_fields
+    )
+
+    assert parse_panel_html(panel_html) == PAINEL_COMPLETO
+    assert hidden_fields == {
+        "__VIEWSTATE": "vs-novo|com-barra",
+        "__EVENTVALIDATION": "ev-novo",
+        "__EVENTTARGET": "",
+    }
+
+
+def test_extract_panel_html_from_full_page(fixture_text):
+    hidden_fields = {"__VIEWSTATE": "vs-antigo", "campo": "x"}
+
+    panel_html = extract_panel_html(
+        fixture_text("painel_completo.html"), CNS, hidden_fields
+    )
+
+    assert parse_panel_html(panel_html) == PAINEL_COMPLETO
+    assert hidden_fields == {
+        "__VIEWSTATE": "vs-pagina",
+        "__EVENTVALIDATION": "ev-pagina",
+    }
+
+
+def test_extract_panel_html_not_found_alert(fixture_text):
+    with pytest.raises(CnsNaoCadastradoError):
+        extract_panel_html(fixture_text("delta_nao_cadastrado.txt"), CNS, {})
+
+
+def test_extract_panel_html_not_found_full_page():
+    page = "<html><script>alert('CNS não cadastrado');</script></html>"
+
+    with pytest.raises(CnsNaoCadastradoError):
+        extract_panel_html(page, CNS, {})
+
+
+@pytest.mark.parametrize("name", ["delta_erro.txt", "delta_redirect.txt"])
+def test_extract_panel_html_error_clears_state(fixture_text, name):
+    hidden_fields = {"__VIEWSTATE": "vs-antigo"}
+
+    with pytest.raises(HttpEngineError):
+        extract_panel_html(fixture_text(name), CNS, hidden_fields)
+    # Sem VIEWSTATE, a próxima consulta recarrega a página.
+    assert hidden_fields == {}
+
+
+def test_extract_panel_html_delta_without_panel():
+    with pytest.raises(HttpEngineError):
+        extract_panel_html("7|hiddenField|__VIEWSTATE|vs-novo|", CNS, {})
+
+
+def test_interpret_response_missing_panel():
+    with pytest.raises(HttpEngineError):
+        interpret_response("<html><body></body></html>", CNS, {})
@@ -0,0 +1,60 @@
+import json
+
+from journal import CheckpointJournal, read_entries, read_pending
+
+
+def test_newer_result_survives_commit_of_older_batch(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = CheckpointJournal(path)
+    first = journal.append("123456", {"Email": "antigo@cartorio.com.br"})
+    journal.append("654321", {"Email": "outro@cartorio.com.br"})
+    # O mesmo CNS é raspado de novo enquanto o primeiro lote grava.
+    second = journal.append("123456", {"Email": "novo@cartorio.com.br"})
+
+    journal.mark_committed([("123456", first), ("654321", 2)])
+
+    assert len(journal) == 1
+    assert read_pending(path) == {"123456": {"Email": "novo@cartorio.com.br"}}
+
+    journal.mark_committed([("123456", second)])
+
+    assert len(journal) == 0
+    assert read_pending(path) == {}
+    journal.close()
+
+
+def test_commit_of_newest_result_covers_older_ones(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = CheckpointJournal(path)
+    journal.append("123456", {"Email": "antigo@cartorio.com.br"})
+    newest = journal.append("123456", {"Email": "novo@cartorio.com.br"})
+
+    journal.mark_committed([("123456", newest)])
+
+    assert len(journal) == 0
+    journal.close()
+
+
+def test_reopen_continues_sequence(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = CheckpointJournal(path)
+    seq = journal.append("123456", {"Email": "a@cartorio.com.br"})
+    journal.close()
+
+    reopened = CheckpointJournal(path)
+
+    assert len(reopened) == 1
+    assert reopened.append("654321", {}) > seq
+    reopened.close()
+
+
+def test_legacy_commit_lines_without_seq(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    lines = [
+        {"cns": "123456", "data": {"Email": "a@cartorio.com.br"}, "ts": 0},
+        {"cns": "654321", "data": {"Email": "b@cartorio.com.br"}, "ts": 0},
+        {"commit": ["123456"]},
+    ]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines) + '{"cns": ')
+
+    assert read_entries(str(path)) == {"654321": (0, {"Email": "b@cartorio.com.br"})}